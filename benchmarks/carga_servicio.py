@@ -0,0 +1,139 @@
+import argparse
+import http.client
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Generador de carga para simulaciones/servicio.py: `--concurrencia` clientes con
+# conexiones persistentes envían `--pedidos` pedidos en total y se informan los pedidos
+# por segundo, la latencia vista por los clientes y las métricas del servicio (aciertos de
+# cache, pedidos coalescidos, tamaño medio de lote, espera en cola).
+#
+#   python benchmarks/carga_servicio.py                                   # levanta el servicio en un puerto libre
+#   python benchmarks/carga_servicio.py --url http://127.0.0.1:8765 --pedidos 5000 --concurrencia 32
+#   python benchmarks/carga_servicio.py --servidor="--max-lote 1" --repetidos 0   # sin micro-lotes ni cache
+#
+# Una fracción `--repetidos` de los pedidos sale de un conjunto chico de `--calientes`
+# escenarios (lo que pide un tablero que se refresca); el resto son ganancias al azar en
+# la grilla de los sliders, casi todas distintas.
+
+RAIZ = Path(__file__).resolve().parent
+sys.path.insert(0, str(RAIZ.parent / "simulaciones"))
+
+from tiempo_real import Histograma
+
+# Kp, Ki, Kd (pid) o Kp_c, HR_ref (humedad) en la grilla de los sliders
+def escenario_al_azar(simulador, azar):
+    if simulador == "pid":
+        return dict(Kp=round(azar.randint(0, 100) * 0.1, 1), Ki=round(azar.randint(0, 100) * 0.1, 1),
+                    Kd=round(azar.randint(0, 20) * 0.1, 1), fl_perturbacion=True)
+    return dict(Kp_c=round(azar.randint(0, 100) * 0.1, 1), HR_ref=float(azar.randint(40, 60)),
+                fl_perturbacion=True, fl_ajustar_controlador=True)
+
+def generar_pedidos(cantidad, simulador, repetidos, calientes, puntos, semilla):
+    azar = random.Random(semilla)
+    conjunto = [escenario_al_azar(simulador, azar) for _ in range(calientes)]
+    pedidos = []
+    for _ in range(cantidad):
+        parametros = azar.choice(conjunto) if azar.random() < repetidos else escenario_al_azar(simulador, azar)
+        pedido = dict(simulador=simulador, parametros=parametros)
+        if puntos:
+            pedido["puntos"] = puntos
+        pedidos.append(json.dumps(pedido).encode("utf-8"))
+    return pedidos
+
+# Levanta servicio.py en un puerto libre y devuelve (proceso, anfitrión, puerto)
+def levantar_servicio(argumentos=()):
+    proceso = subprocess.Popen([sys.executable, str(RAIZ.parent / "simulaciones" / "servicio.py"), "--puerto", "0", *argumentos],
+                               stdout=subprocess.PIPE, text=True, cwd=RAIZ.parent / "simulaciones")
+    linea = proceso.stdout.readline()
+    if not linea.startswith("Escuchando en http://"):
+        proceso.kill()
+        raise RuntimeError(f"El servicio no arrancó: {linea!r}")
+    anfitrion, puerto = linea.strip().rsplit("/", 1)[1].split(":")
+    return proceso, anfitrion, int(puerto)
+
+def _pedir(conexion, metodo, ruta, cuerpo=None):
+    encabezados = {"Content-Type": "application/json"} if cuerpo is not None else {}
+    conexion.request(metodo, ruta, body=cuerpo, headers=encabezados)
+    respuesta = conexion.getresponse()
+    return respuesta.status, respuesta.read()
+
+# Reparte los pedidos entre `concurrencia` hilos con una conexión cada uno. Devuelve la
+# duración total, el histograma de latencias y la cantidad de respuestas con error.
+def correr_carga(anfitrion, puerto, pedidos, concurrencia):
+    latencia = Histograma()
+    errores = [0]
+    lock = threading.Lock()
+    siguiente = iter(pedidos)
+
+    def cliente():
+        conexion = http.client.HTTPConnection(anfitrion, puerto, timeout=60)
+        while True:
+            with lock:
+                cuerpo = next(siguiente, None)
+            if cuerpo is None:
+                break
+            inicio = time.perf_counter()
+            estado, _ = _pedir(conexion, "POST", "/simular", cuerpo)
+            duracion = time.perf_counter() - inicio
+            with lock:
+                latencia.registrar(duracion)
+                errores[0] += estado != 200
+        conexion.close()
+
+    hilos = [threading.Thread(target=cliente) for _ in range(concurrencia)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return time.perf_counter() - inicio, latencia, errores[0]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide pedidos por segundo del servicio de simulación.")
+    parser.add_argument("--url", default=None, help="servicio ya levantado (por defecto se levanta uno local)")
+    parser.add_argument("--servidor", default="", help="argumentos extra para servicio.py al levantarlo")
+    parser.add_argument("--simulador", choices=("pid", "humedad"), default="pid")
+    parser.add_argument("--pedidos", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--repetidos", type=float, default=0.5, help="fracción de pedidos del conjunto caliente")
+    parser.add_argument("--calientes", type=int, default=50, help="escenarios del conjunto caliente")
+    parser.add_argument("--puntos", type=int, default=None, help="submuestrear las respuestas a esta cantidad de puntos")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    proceso = None
+    if args.url is None:
+        proceso, anfitrion, puerto = levantar_servicio(args.servidor.split())
+    else:
+        anfitrion, puerto = args.url.split("//", 1)[-1].rstrip("/").split(":")
+        puerto = int(puerto)
+    try:
+        pedidos = generar_pedidos(args.pedidos, args.simulador, args.repetidos, args.calientes, args.puntos, args.semilla)
+        duracion, latencia, errores = correr_carga(anfitrion, puerto, pedidos, args.concurrencia)
+        conexion = http.client.HTTPConnection(anfitrion, puerto, timeout=60)
+        metricas = json.loads(_pedir(conexion, "GET", "/metricas")[1])
+        conexion.close()
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+
+    l = latencia.resumen()
+    m = metricas["simuladores"][args.simulador]
+    print(f"{len(pedidos)} pedidos con {args.concurrencia} clientes en {duracion:.2f} s: {len(pedidos) / duracion:.0f} pedidos/s, "
+          f"{errores} errores")
+    print(f"latencia cliente p50/p90/p99/máx: {l['p50_ms']:.1f}/{l['p90_ms']:.1f}/{l['p99_ms']:.1f}/{l['max_ms']:.1f} ms")
+    print(f"desde cache: {metricas['origenes']['cache'] / max(metricas['pedidos'], 1):.1%}  coalescidos: {m['coalescidos']}  "
+          f"lotes: {m['lotes']} (medio {m['lote_medio']:.1f}, máx {m['lote_max']:.0f})  "
+          f"espera en cola p99: {m['espera_cola'].get('p99_ms', float('nan')):.1f} ms  "
+          f"lote p50: {m['tiempo_lote'].get('p50_ms', float('nan')):.1f} ms")
+    return 1 if errores else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,364 @@
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+# Benchmarks de los simuladores, de la detección de franjas de falla y de la construcción
+# de las figuras, con historial en JSON, umbrales de regresión y verificación de que los
+# caminos rápidos siguen dando los mismos resultados.
+#
+#   python benchmarks/rendimiento.py                       # corre todo y lo agrega al historial
+#   python benchmarks/rendimiento.py --filtro "simulate_pid/*" --sin-historial
+#   python benchmarks/rendimiento.py --actualizar-referencias
+#
+# Termina con código 1 si algún caso es más lento que su referencia por encima del umbral
+# o si alguna verificación numérica falla.
+
+RAIZ = Path(__file__).resolve().parent
+sys.path.insert(0, str(RAIZ.parent / "simulaciones"))
+os.environ.setdefault("PLOTLY_RENDERER", "json")
+
+import nucleo
+from nucleo import simulate_pid, simulate_pid_batch, SimuladorPID
+from nucleo import simulate_proportional_humidity, simulate_proportional_humidity_batch, SimuladorHumedad
+from metricas import fuera_de_banda, intervalos_fuera_de_banda, franjas_fuera_de_banda
+
+# Escenarios por defecto de las interfaces (sin la transformación de T_amb_perturb)
+ESCENARIO_PID = (2.0, 5.0, 1.0, 22.0, 30, 50, 15.0, True, 20.0)
+ESCENARIO_HUMEDAD = (2.0, 50.0, 46.0, 30, 50, 75.0, True, True, 5)
+
+# Misma grilla que nucleo: paso de 0.1 s y n muestras
+def _grilla(n):
+    nucleo.configurar_tiempo(0.1 * (n - 1), n)
+
+def _grilla_original():
+    nucleo.configurar_tiempo(100, 1000)
+
+# --- Medición ---
+# Mide funcion() como timeit.autorange: agrupa tantas llamadas como hagan falta para
+# superar tiempo_min y toma `repeticiones` tandas, sin pasar de tiempo_max en total
+# (los casos lentos se miden menos veces). Devuelve segundos por llamada.
+def medir(funcion, repeticiones=5, tiempo_min=0.2, tiempo_max=30.0):
+    inicio = time.perf_counter()
+    funcion()
+    primera = time.perf_counter() - inicio
+    llamadas = max(1, int(np.ceil(tiempo_min / max(primera, 1e-9))))
+    repeticiones = max(1, min(repeticiones, int(tiempo_max / max(primera * llamadas, 1e-9))))
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            funcion()
+        tiempos.append((time.perf_counter() - inicio) / llamadas)
+    return dict(mediana=float(np.median(tiempos)), minimo=float(min(tiempos)), llamadas=llamadas, repeticiones=repeticiones)
+
+# --- Casos ---
+# Cada caso es (nombre, muestras, preparar): preparar() se llama antes de medir
+# (fija la grilla de nucleo, arma los datos) y devuelve la función a medir. `muestras`
+# es la cantidad de pasos por llamada, para informar el rendimiento en muestras/s.
+def _en_grilla(n, funcion, *args, **kwargs):
+    def preparar():
+        _grilla(n)
+        return lambda: funcion(*args, **kwargs)
+    return preparar
+
+def _casos_simuladores(horizontes):
+    # El método lti de humedad no admite el ajuste de Kp
+    sin_ajuste = ESCENARIO_HUMEDAD[:7] + (False,) + ESCENARIO_HUMEDAD[8:]
+    casos = []
+    for n in horizontes:
+        casos += [
+            (f"simulate_pid/euler/{n:.0e}", n, _en_grilla(n, simulate_pid, *ESCENARIO_PID)),
+            (f"simulate_pid/lti/{n:.0e}", n, _en_grilla(n, simulate_pid, *ESCENARIO_PID, metodo="lti")),
+            (f"simulate_proportional_humidity/euler/{n:.0e}", n, _en_grilla(n, simulate_proportional_humidity, *ESCENARIO_HUMEDAD)),
+            (f"simulate_proportional_humidity/lti/{n:.0e}", n, _en_grilla(n, simulate_proportional_humidity, *sin_ajuste, metodo="lti")),
+        ]
+    return casos
+
+def _casos_lotes(n, lotes):
+    casos = []
+    for lote in lotes:
+        Kp = np.linspace(0.5, 4.0, lote)
+        casos += [
+            (f"simulate_pid_batch/{n:.0e}/lote={lote}", n * lote, _en_grilla(n, simulate_pid_batch, Kp, *ESCENARIO_PID[1:])),
+            (f"simulate_proportional_humidity_batch/{n:.0e}/lote={lote}", n * lote,
+             _en_grilla(n, simulate_proportional_humidity_batch, Kp, *ESCENARIO_HUMEDAD[1:])),
+        ]
+    return casos
+
+# Señal con muchas entradas y salidas de la banda (peor caso para las franjas)
+def _senal_bandas(n):
+    t = np.arange(n) * 0.1
+    return t, 22 + 5 * np.sin(t / 7) + np.random.default_rng(0).normal(0, 0.5, n)
+
+def _casos_bandas(horizontes):
+    def preparar(n, funcion):
+        t, y = _senal_bandas(n)
+        return lambda: funcion(t, y)
+
+    casos = []
+    for n in horizontes:
+        for nombre, funcion in (("fuera_de_banda", lambda t, y: fuera_de_banda(y, 18, 26)),
+                                ("intervalos_fuera_de_banda", lambda t, y: intervalos_fuera_de_banda(y, 18, 26)),
+                                ("franjas_fuera_de_banda", lambda t, y: franjas_fuera_de_banda(t, y, 18, 26))):
+            casos.append((f"bandas/{nombre}/{n:.0e}", n, lambda n=n, funcion=funcion: preparar(n, funcion)))
+    return casos
+
+# Importa una interfaz sin mostrar nada: display() escribe en stdout fuera del notebook
+def _importar_interfaz(nombre):
+    _grilla_original()
+    with contextlib.redirect_stdout(io.StringIO()):
+        modulo = __import__(nombre)
+    modulo.precargar_vecinos = False
+    return modulo
+
+# Construcción de las figuras sin fig.show(): figura nueva (modo_render = "figura"), carga
+# de datos en el FigureWidget persistente y update_plot completo con la cache vaciada,
+# que es lo que cuesta un movimiento de slider.
+def _casos_figuras():
+    casos = []
+    for interfaz, argumentos in (("temperatura", (2, 5, 1, 22, 30, 50, 15, True, 20, 4)),
+                                 ("humedad", (2, 50, 46, 30, 50, 75, True, 5, True))):
+        def preparar_figura(interfaz=interfaz, argumentos=argumentos):
+            ui = _importar_interfaz(f"simulacion_{interfaz}")
+            datos = _datos_figura(ui, interfaz, argumentos)
+
+            def figura():
+                fig = ui.construir_figura()
+                ui.actualizar_figura(fig, *datos)
+            return figura
+
+        def preparar_widget(interfaz=interfaz, argumentos=argumentos):
+            ui = _importar_interfaz(f"simulacion_{interfaz}")
+            datos = _datos_figura(ui, interfaz, argumentos)
+            return lambda: ui.actualizar_figura(ui.figura_widget, *datos)
+
+        def preparar_update_plot(interfaz=interfaz, argumentos=argumentos):
+            ui = _importar_interfaz(f"simulacion_{interfaz}")
+            cache = ui.cache_pid if interfaz == "temperatura" else ui.cache_humedad
+
+            def actualizar():
+                cache.limpiar()
+                ui.update_plot(*argumentos)
+            return actualizar
+
+        n = 1000   # grilla original de nucleo, la que usan las interfaces
+        casos.append((f"figura/{interfaz}/nueva", n, preparar_figura))
+        casos.append((f"figura/{interfaz}/widget", n, preparar_widget))
+        casos.append((f"update_plot/{interfaz}/widget", n, preparar_update_plot))
+    return casos
+
+# Argumentos de actualizar_figura tal como los arma update_plot
+def _datos_figura(ui, interfaz, argumentos):
+    if interfaz == "temperatura":
+        *valores, rango = argumentos
+        T, P_term, I_term, D_term, output, _, e = ui.simulate_pid(*ui._argumentos_simulacion(*valores))
+        T_ref = valores[3]
+        franjas = franjas_fuera_de_banda(nucleo.t, T, T_ref - rango, T_ref + rango)
+        return T, P_term, I_term, D_term, output, e, T_ref, T_ref - rango, T_ref + rango, franjas
+    HR_ref, rango = argumentos[1], argumentos[7]
+    HR, _, output, _, e, Kp_ajustado = ui.simulate_proportional_humidity(*ui._argumentos_simulacion(*argumentos))
+    franjas = franjas_fuera_de_banda(nucleo.t, HR, HR_ref - rango, HR_ref + rango)
+    return HR, output, e, Kp_ajustado, HR_ref, HR_ref - rango, HR_ref + rango, franjas
+
+def casos(configuracion, largo=False):
+    horizontes = configuracion["horizontes"] + (configuracion["horizontes_largos"] if largo else [])
+    return (_casos_simuladores(horizontes)
+            + _casos_lotes(configuracion["horizonte_lotes"], configuracion["lotes"])
+            + _casos_bandas(horizontes)
+            + _casos_figuras())
+
+# --- Verificación numérica ---
+# Salidas de referencia guardadas en referencias.npz (grilla original de nucleo) y
+# comparaciones entre caminos que deben coincidir: lote contra simulación individual,
+# simulador paso a paso contra simulación completa, método lti contra Euler y franjas
+# vectorizadas contra un recorrido muestra a muestra.
+def _salidas_referencia():
+    _grilla_original()
+    programa = nucleo.ProgramaGanancias.desde_cota(3)
+    salidas = {
+        "pid": simulate_pid(*ESCENARIO_PID),
+        "pid_sin_perturbacion": simulate_pid(*ESCENARIO_PID[:7], False, ESCENARIO_PID[8]),
+        "pid_ganancias_nulas": simulate_pid(0, 0, 0, *ESCENARIO_PID[3:]),
+        "pid_programa": simulate_pid(*ESCENARIO_PID, programa=programa),
+        "humedad": simulate_proportional_humidity(*ESCENARIO_HUMEDAD),
+        "humedad_sin_ajuste": simulate_proportional_humidity(*ESCENARIO_HUMEDAD[:7], False, ESCENARIO_HUMEDAD[8]),
+        "humedad_programa": simulate_proportional_humidity(*ESCENARIO_HUMEDAD, programa=programa),
+    }
+    return {nombre: np.array(senales) for nombre, senales in salidas.items()}
+
+def _franjas_por_recorrido(t, y, y_min, y_max):
+    franjas, inicio = [], None
+    for i, valor in enumerate(y):
+        fuera = not (y_min <= valor <= y_max)
+        if fuera and inicio is None:
+            inicio = i
+        elif not fuera and inicio is not None:
+            franjas.append((t[inicio], t[i]))
+            inicio = None
+    if inicio is not None:
+        franjas.append((t[inicio], t[-1]))
+    return np.array(franjas, dtype=float).reshape(-1, 2)
+
+def _comparar(nombre, obtenido, esperado, rtol, atol):
+    obtenido, esperado = np.asarray(obtenido, dtype=float), np.asarray(esperado, dtype=float)
+    if obtenido.shape != esperado.shape:
+        return dict(nombre=nombre, ok=False, diferencia=None, detalle=f"forma {obtenido.shape} != {esperado.shape}")
+    diferencia = float(np.max(np.abs(obtenido - esperado), initial=0.0))
+    ok = bool(np.allclose(obtenido, esperado, rtol=rtol, atol=atol, equal_nan=True))
+    return dict(nombre=nombre, ok=ok, diferencia=diferencia)
+
+def verificar(tolerancias, ruta_referencias):
+    resultados = []
+    actuales = _salidas_referencia()
+    if ruta_referencias.exists():
+        guardadas = np.load(ruta_referencias)
+        for nombre, senales in actuales.items():
+            if nombre not in guardadas:
+                resultados.append(dict(nombre=f"referencia/{nombre}", ok=False, diferencia=None, detalle="sin referencia"))
+                continue
+            resultados.append(_comparar(f"referencia/{nombre}", senales, guardadas[nombre], **tolerancias["referencias"]))
+    else:
+        resultados.append(dict(nombre="referencia", ok=False, diferencia=None, detalle=f"no existe {ruta_referencias.name}"))
+
+    caminos = tolerancias["caminos"]
+    pid, humedad = actuales["pid"], actuales["humedad"]
+    Kp = np.array([ESCENARIO_PID[0], 1.0])
+    resultados.append(_comparar("caminos/simulate_pid_batch", np.array(simulate_pid_batch(Kp, *ESCENARIO_PID[1:]))[:, 0], pid, **caminos))
+    sim = SimuladorPID(*ESCENARIO_PID[:4], ESCENARIO_PID[8])
+    resultados.append(_comparar("caminos/SimuladorPID", sim.bloque(len(nucleo.t), pid[5]), pid, **caminos))
+    resultados.append(_comparar("caminos/simulate_pid_lti", simulate_pid(*ESCENARIO_PID, metodo="lti"), pid, **tolerancias["lti"]))
+
+    Kp_c = np.array([ESCENARIO_HUMEDAD[0], 3.0])
+    resultados.append(_comparar("caminos/simulate_proportional_humidity_batch",
+                                np.array(simulate_proportional_humidity_batch(Kp_c, *ESCENARIO_HUMEDAD[1:]))[:, 0], humedad, **caminos))
+    sim = SimuladorHumedad(*ESCENARIO_HUMEDAD[:3], fl_ajustar_controlador=True, cota_error=ESCENARIO_HUMEDAD[8])
+    resultados.append(_comparar("caminos/SimuladorHumedad", sim.bloque(len(nucleo.t), humedad[3]), humedad, **caminos))
+    sin_ajuste = ESCENARIO_HUMEDAD[:7] + (False,) + ESCENARIO_HUMEDAD[8:]
+    resultados.append(_comparar("caminos/simulate_proportional_humidity_lti", simulate_proportional_humidity(*sin_ajuste, metodo="lti"),
+                                actuales["humedad_sin_ajuste"], **tolerancias["lti"]))
+
+    t, y = _senal_bandas(20000)
+    resultados.append(_comparar("caminos/franjas_fuera_de_banda", np.array(franjas_fuera_de_banda(t, y, 18, 26)).reshape(-1, 2),
+                                _franjas_por_recorrido(t, y, 18, 26), rtol=0, atol=0))
+    return resultados
+
+# --- Historial y umbrales ---
+# Cada corrida se agrega como una línea JSON a historial.jsonl (local de cada máquina, está
+# en .gitignore). Un caso es una regresión si su mediana supera umbral × la mejor mediana
+# del mismo caso en las últimas `ventana_historial` corridas de la misma máquina. El
+# umbral es el del primer patrón de umbrales["casos"] que coincide con el nombre
+# (fnmatch) o umbrales["por_defecto"].
+def _maquina():
+    return dict(nodo=platform.node(), procesador=platform.processor() or platform.machine(),
+                python=platform.python_version(), numpy=np.__version__)
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def leer_historial(ruta):
+    if not ruta.exists():
+        return []
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+def umbral(umbrales, nombre):
+    for patron, valor in umbrales.get("casos", {}).items():
+        if fnmatch.fnmatch(nombre, patron):
+            return valor
+    return umbrales["por_defecto"]
+
+def comparar_con_historial(resultados, historial, umbrales, ventana):
+    maquina = _maquina()
+    previas = [corrida for corrida in historial if corrida.get("maquina") == maquina][-ventana:]
+    for nombre, resultado in resultados.items():
+        anteriores = [c["casos"][nombre]["mediana"] for c in previas if nombre in c.get("casos", {})]
+        if not anteriores:
+            resultado["relacion"], resultado["regresion"] = None, False
+            continue
+        resultado["relacion"] = resultado["mediana"] / min(anteriores)
+        resultado["regresion"] = resultado["relacion"] > umbral(umbrales, nombre)
+    return resultados
+
+# --- Ejecución ---
+def _formato_tiempo(segundos):
+    for unidad, escala in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if segundos >= escala:
+            return f"{segundos / escala:8.2f} {unidad}"
+    return f"{segundos / 1e-9:8.2f} ns"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de simuladores, franjas de falla y figuras")
+    parser.add_argument("--configuracion", type=Path, default=RAIZ / "configuracion.json")
+    parser.add_argument("--historial", type=Path, default=RAIZ / "historial.jsonl")
+    parser.add_argument("--referencias", type=Path, default=RAIZ / "referencias.npz")
+    parser.add_argument("--filtro", action="append", help="Patrón fnmatch de los casos a correr (se puede repetir)")
+    parser.add_argument("--largo", action="store_true", help="Agrega los horizontes largos (1e7 pasos)")
+    parser.add_argument("--umbral", type=float, help="Reemplaza el umbral por defecto de la configuración")
+    parser.add_argument("--sin-historial", action="store_true", help="No agrega la corrida al historial")
+    parser.add_argument("--actualizar-referencias", action="store_true", help="Guarda las salidas actuales como referencia y termina")
+    args = parser.parse_args(argv)
+
+    with open(args.configuracion, encoding="utf-8") as f:
+        configuracion = json.load(f)
+    if args.umbral is not None:
+        configuracion["umbrales"]["por_defecto"] = args.umbral
+
+    if args.actualizar_referencias:
+        np.savez_compressed(args.referencias, **_salidas_referencia())
+        print(f"Referencias guardadas en {args.referencias}")
+        return 0
+
+    verificaciones = verificar(configuracion["tolerancias"], args.referencias)
+    for v in verificaciones:
+        detalle = v.get("detalle") or f"dif. máx. {v['diferencia']:.3g}"
+        print(f"{'ok   ' if v['ok'] else 'FALLA'} {v['nombre']:<50} {detalle}")
+
+    resultados = {}
+    for nombre, muestras, preparar in casos(configuracion, args.largo):
+        if args.filtro and not any(fnmatch.fnmatch(nombre, patron) for patron in args.filtro):
+            continue
+        funcion = preparar()
+        resultado = medir(funcion, configuracion["repeticiones"], configuracion["tiempo_min"], configuracion["tiempo_max"])
+        resultado["muestras_por_segundo"] = muestras / resultado["mediana"]
+        resultados[nombre] = resultado
+    _grilla_original()
+
+    historial = leer_historial(args.historial)
+    comparar_con_historial(resultados, historial, configuracion["umbrales"], configuracion["ventana_historial"])
+    print()
+    print(f"{'caso':<50} {'mediana':>11} {'muestras/s':>12} {'vs. historial':>14}")
+    for nombre, r in resultados.items():
+        relacion = "" if r["relacion"] is None else f"{r['relacion']:.2f}x" + ("  REGRESIÓN" if r["regresion"] else "")
+        print(f"{nombre:<50} {_formato_tiempo(r['mediana'])} {r['muestras_por_segundo']:12.3g} {relacion:>14}")
+
+    if not args.sin_historial:
+        corrida = dict(fecha=datetime.now(timezone.utc).isoformat(timespec="seconds"), commit=_commit(), maquina=_maquina(),
+                       casos={nombre: {k: v for k, v in r.items() if k not in ("relacion", "regresion")} for nombre, r in resultados.items()},
+                       verificaciones=verificaciones)
+        with open(args.historial, "a", encoding="utf-8") as f:
+            f.write(json.dumps(corrida, ensure_ascii=False) + "\n")
+
+    fallas = [v["nombre"] for v in verificaciones if not v["ok"]]
+    regresiones = [nombre for nombre, r in resultados.items() if r["regresion"]]
+    if fallas or regresiones:
+        print(f"\n{len(fallas)} verificaciones fallidas, {len(regresiones)} regresiones")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
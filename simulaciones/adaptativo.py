@@ -0,0 +1,200 @@
+import numpy as np
+
+import nucleo
+from nucleo import ProgramaGanancias
+
+# Integración de paso variable de los lazos en tiempo continuo. En lugar de avanzar en la
+# grilla fija de nucleo.t, cada tramo entre eventos (bordes de la perturbación y cambios
+# de referencia) se integra con Dormand–Prince 5(4) y control de error: los pasos caen
+# exactamente sobre los eventos y se alargan en los períodos de régimen, pero no sin
+# límite. En régimen el paso lo acota la región de estabilidad del método explícito (no
+# la estimación del error) en unas 2,5–3 constantes de tiempo del modo más rápido del lazo
+# cerrado (1/|λ|): con las ganancias de la interfaz (Kp=2, Ki=5, Kd=1) son ~4 s por paso,
+# unos 230 000 pasos para 1e6 s. Lo que se ahorra frente a nucleo.t (paso 0,1 s) es ese
+# factor, no más. El resultado se remuestrea en la grilla de salida pedida con
+# interpolación de Hermite cúbica.
+
+# --- Coeficientes de Dormand–Prince 5(4) ---
+_A = np.zeros((7, 7))
+_A[1, :1] = [1 / 5]
+_A[2, :2] = [3 / 40, 9 / 40]
+_A[3, :3] = [44 / 45, -56 / 15, 32 / 9]
+_A[4, :4] = [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729]
+_A[5, :5] = [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656]
+_A[6, :6] = [35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84]
+_B = np.array([35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0.0])
+# Diferencia entre la solución de orden 5 y la de orden 4 (estimación del error)
+_E = _B - np.array([5179 / 57600, 0.0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40])
+
+# --- Integrador por tramos ---
+# `f(y, entradas)` da dy/dt con las entradas constantes de cada tramo. `tramos` es una
+# lista de (inicio, fin, entradas) contiguos. Devuelve los pasos aceptados como arreglos
+# (t0, t1, y0, y1, f0, f1), uno por paso, más un diccionario con la cantidad de pasos
+# aceptados, rechazados y evaluaciones de f.
+def integrar_por_tramos(f, y0, tramos, rtol=1e-6, atol=1e-8, paso_max=np.inf):
+    y = np.array(y0, dtype=float)
+    k = np.empty((7, y.size))
+    t0s, t1s, y0s, y1s, f0s, f1s = [], [], [], [], [], []
+    rechazados = 0
+    evaluaciones = 0
+    h = None
+
+    for inicio, fin, entradas in tramos:
+        tiempo = inicio
+        k_primera = f(y, entradas)
+        evaluaciones += 1
+        # Paso inicial: el que cambia y en ~1% de su escala (se reinicia en cada evento)
+        escala = atol + rtol * np.abs(y)
+        d0, d1 = np.sqrt(np.mean((y / escala) ** 2)), np.sqrt(np.mean((k_primera / escala) ** 2))
+        h = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+        h = min(h, paso_max, fin - inicio)
+        norma_previa = 1e-4
+
+        while tiempo < fin:
+            ultimo = tiempo + h >= fin * (1 - 1e-12)
+            if ultimo:
+                h = fin - tiempo
+            k[0] = k_primera
+            for j in range(1, 7):
+                k[j] = f(y + h * (_A[j, :j] @ k[:j]), entradas)
+            evaluaciones += 6
+            y_nueva = y + h * (_B @ k)
+            error = h * (_E @ k)
+            escala = atol + rtol * np.maximum(np.abs(y), np.abs(y_nueva))
+            norma = np.sqrt(np.mean((error / escala) ** 2))
+
+            if norma <= 1:
+                t_nuevo = fin if ultimo else tiempo + h
+                t0s.append(tiempo)
+                t1s.append(t_nuevo)
+                y0s.append(y)
+                y1s.append(y_nueva)
+                f0s.append(k_primera)
+                f1s.append(k[6].copy())   # FSAL: la última etapa es f en el punto nuevo
+                tiempo, y, k_primera = t_nuevo, y_nueva, f1s[-1]
+                # Control PI del paso: amortigua las oscilaciones cuando el paso queda
+                # limitado por la estabilidad del método (régimen permanente)
+                norma = max(norma, 1e-10)
+                crecimiento = min(5.0, max(0.2, 0.9 * norma ** -0.14 * norma_previa ** 0.08))
+                norma_previa = norma
+            else:
+                rechazados += 1
+                crecimiento = max(0.2, 0.9 * norma ** -0.2)
+            h = min(h * crecimiento, paso_max)
+
+    pasos = tuple(np.array(x) for x in (t0s, t1s, y0s, y1s, f0s, f1s))
+    return pasos, dict(pasos=len(t0s), rechazados=rechazados, evaluaciones=evaluaciones)
+
+# Evalúa la solución en los instantes `t_salida` con el polinomio de Hermite cúbico de
+# cada paso (valores y derivadas en sus extremos). Devuelve (len(t_salida), dim). Sin
+# pasos (horizonte nulo) la solución es la condición inicial `y_inicial`.
+def remuestrear(pasos, t_salida, y_inicial=None):
+    t0, t1, y0, y1, f0, f1 = pasos
+    t_salida = np.asarray(t_salida, dtype=float)
+    if len(t0) == 0:
+        return np.tile(np.asarray(y_inicial, dtype=float), (len(t_salida), 1))
+    indice = np.clip(np.searchsorted(t1, t_salida, side="left"), 0, len(t0) - 1)
+    h = (t1 - t0)[indice][:, None]
+    s = ((t_salida - t0[indice])[:, None] / h)
+    h00, h10 = 2 * s**3 - 3 * s**2 + 1, s**3 - 2 * s**2 + s
+    h01, h11 = -2 * s**3 + 3 * s**2, s**3 - s**2
+    return h00 * y0[indice] + h10 * h * f0[indice] + h01 * y1[indice] + h11 * h * f1[indice]
+
+# Tramos de entradas constantes entre 0 y t_final. `senales` es una lista de funciones
+# t -> valor y `eventos` los instantes donde alguna cambia. Las entradas de cada tramo se
+# evalúan en su punto medio, así que un borde exacto no queda del lado equivocado.
+# Con t_final <= 0 no hay tramos.
+def _tramos(t_final, eventos, senales):
+    if t_final <= 0:
+        return []
+    bordes = sorted({0.0, float(t_final)} | {float(e) for e in eventos if 0 < e < t_final})
+    return [(a, b, tuple(s((a + b) / 2) for s in senales)) for a, b in zip(bordes[:-1], bordes[1:])]
+
+# Referencia por tramos: valor inicial y cambios [(instante, valor), ...]
+def _referencia(inicial, cambios):
+    tiempos = np.array([c[0] for c in cambios], dtype=float)
+    valores = np.array([inicial] + [c[1] for c in cambios], dtype=float)
+    orden = np.argsort(tiempos, kind="stable")
+    tiempos, valores[1:] = tiempos[orden], valores[1:][orden]
+    return lambda tiempo: valores[np.searchsorted(tiempos, tiempo, side="right")]
+
+# --- PID de temperatura con paso variable ---
+# Mismo lazo que simulate_pid en tiempo continuo (T, integral del error). El derivativo
+# se toma sobre la medición (-dT/dt), que coincide con el del error mientras T_ref no
+# cambia y evita el impulso en los cambios de referencia y el salto del primer paso de
+# la versión de paso fijo. `cambios_ref` es una lista [(instante, T_ref), ...].
+# t_salida es la grilla de salida (por defecto nucleo.t) y el horizonte llega hasta su
+# último valor. Devuelve las señales de simulate_pid en t_salida y un diccionario con
+# la cantidad de pasos, rechazos, evaluaciones y los instantes de los pasos.
+def simulate_pid_adaptativo(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial,
+                            t_salida=None, cambios_ref=(), rtol=1e-6, atol=1e-8, paso_max=np.inf, programa=None):
+    t_salida = nucleo.t if t_salida is None else np.asarray(t_salida, dtype=float)
+    K, tau = nucleo.K, nucleo.tau
+    if Kp == Ki == Kd == 0:
+        T_ref, cambios_ref = T_initial, ()
+    if not fl_perturbacion:
+        T_amb_perturb, perturbation_start, perturbation_end = T_initial, 0, 0
+    referencia = _referencia(T_ref, cambios_ref)
+    ambiente = lambda tiempo: np.where((perturbation_start <= tiempo) & (tiempo <= perturbation_end), T_amb_perturb, T_initial)
+    eventos = [perturbation_start, perturbation_end] + [c[0] for c in cambios_ref]
+    tramos = _tramos(t_salida[-1] if len(t_salida) else 0.0, eventos, [referencia, ambiente])
+
+    # tau dT/dt = K (Kp' e + Ki I - Kd dT/dt) - (T - T_amb),  dI/dt = e = T_ref - T
+    def ganancia(e):
+        return Kp if programa is None else Kp * programa.factor_escalar(e)
+
+    def f(y, entradas):
+        ref, amb = entradas
+        e = ref - y[0]
+        return np.array([(K * (ganancia(e) * e + Ki * y[1]) - (y[0] - amb)) / (tau + K * Kd), e])
+
+    pasos, info = integrar_por_tramos(f, (T_initial, 0.0), tramos, rtol, atol, paso_max)
+    Y = remuestrear(pasos, t_salida, (T_initial, 0.0))
+    T, integral = Y[:, 0], Y[:, 1]
+    ref, T_amb_values = referencia(t_salida), ambiente(t_salida).astype(float)
+    e = ref - T
+    P_term = Kp * e if programa is None else Kp * programa.factor(e) * e
+    I_term = Ki * integral
+    dTdt = (K * (P_term + I_term) - (T - T_amb_values)) / (tau + K * Kd)
+    D_term = -Kd * dTdt
+    output = P_term + I_term + D_term
+    info["t_pasos"] = np.append(pasos[0], pasos[1][-1:])
+    return (T, P_term, I_term, D_term, output, T_amb_values, e), info
+
+# --- Control P de humedad con paso variable ---
+# Mismo lazo que simulate_proportional_humidity en tiempo continuo, con el ajuste de Kp
+# (por `programa` o ProgramaGanancias.desde_cota(cota_error)) si fl_ajustar_controlador.
+# Cuando el ajuste cambia de escalón el control de error achica el paso alrededor del
+# cambio. Devuelve las señales de simulate_proportional_humidity en t_salida y el
+# diccionario de pasos como simulate_pid_adaptativo.
+def simulate_proportional_humidity_adaptativo(Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb,
+                                              fl_perturbacion, fl_ajustar_controlador, cota_error, t_salida=None,
+                                              cambios_ref=(), rtol=1e-6, atol=1e-8, paso_max=np.inf, programa=None):
+    t_salida = nucleo.t if t_salida is None else np.asarray(t_salida, dtype=float)
+    K_hum, tau_hum = nucleo.K_hum, nucleo.tau_hum
+    if Kp_c == 0:
+        HR_ref, cambios_ref = HR_inicial, ()
+    if not fl_perturbacion:
+        HR_amb_perturb, perturbation_start, perturbation_end = HR_inicial, 0, 0
+    ajustar = fl_ajustar_controlador and Kp_c != 0
+    if ajustar and programa is None:
+        programa = ProgramaGanancias.desde_cota(cota_error)
+    referencia = _referencia(HR_ref, cambios_ref)
+    ambiente = lambda tiempo: np.where((perturbation_start <= tiempo) & (tiempo <= perturbation_end), HR_amb_perturb, HR_inicial)
+    eventos = [perturbation_start, perturbation_end] + [c[0] for c in cambios_ref]
+    tramos = _tramos(t_salida[-1] if len(t_salida) else 0.0, eventos, [referencia, ambiente])
+
+    def f(y, entradas):
+        ref, amb = entradas
+        e = ref - y[0]
+        Kp = Kp_c * programa.factor_escalar(e) if ajustar else Kp_c
+        return np.array([(K_hum * Kp * e - (y[0] - amb)) / tau_hum])
+
+    pasos, info = integrar_por_tramos(f, (HR_inicial,), tramos, rtol, atol, paso_max)
+    HR = remuestrear(pasos, t_salida, (HR_inicial,))[:, 0]
+    HR_amb_values = ambiente(t_salida).astype(float)
+    e = referencia(t_salida) - HR
+    Kp_ajustado = Kp_c * programa.factor(e) if ajustar else np.full_like(HR, Kp_c)
+    P_term = Kp_ajustado * e
+    info["t_pasos"] = np.append(pasos[0], pasos[1][-1:])
+    return (HR, P_term, P_term.copy(), HR_amb_values, e, Kp_ajustado), info
@@ -0,0 +1,112 @@
+import threading
+import queue
+from collections import OrderedDict
+
+# --- Cache LRU de resultados de simulación ---
+# Envuelve una función de simulación y guarda sus resultados según los argumentos.
+# `normalizar(*args)` devuelve la clave: debe redondear los valores al paso de los sliders
+# y unificar combinaciones equivalentes (por ejemplo, parámetros de una perturbación
+# deshabilitada), de modo que dos estados de la interfaz con el mismo resultado compartan
+# la entrada. La cache se limita por memoria (bytes de los arreglos guardados) y descarta
+# primero la entrada usada hace más tiempo. Los arreglos guardados son de solo lectura.
+class CacheLRU:
+    def __init__(self, funcion, normalizar, max_bytes=64 * 2**20):
+        self.funcion = funcion
+        self.normalizar = normalizar
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.precargados = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self._pendientes = queue.Queue()
+        self._hilo = None
+
+    def __call__(self, *args):
+        clave = self.normalizar(*args)
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+            self.fallos += 1
+        return self._guardar(clave, self.funcion(*clave))
+
+    def __contains__(self, args):
+        return self.normalizar(*args) in self._datos
+
+    def __len__(self):
+        return len(self._datos)
+
+    def _guardar(self, clave, resultado):
+        for arreglo in resultado:
+            arreglo.flags.writeable = False
+        tamanio = sum(arreglo.nbytes for arreglo in resultado)
+        with self._lock:
+            if clave not in self._datos:
+                self._datos[clave] = resultado
+                self.bytes += tamanio
+                while self.bytes > self.max_bytes and len(self._datos) > 1:
+                    _, descartado = self._datos.popitem(last=False)
+                    self.bytes -= sum(arreglo.nbytes for arreglo in descartado)
+            return self._datos[clave]
+
+    # Calcula en segundo plano los argumentos indicados que todavía no están en la cache.
+    # Cada llamada reemplaza lo que quedaba pendiente de la anterior, así que solo se
+    # precargan los vecinos de la posición más reciente de los sliders.
+    def precargar(self, lista_args):
+        while True:
+            try:
+                self._pendientes.get_nowait()
+            except queue.Empty:
+                break
+        for args in lista_args:
+            self._pendientes.put(self.normalizar(*args))
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._precarga, daemon=True)
+            self._hilo.start()
+
+    def _precarga(self):
+        while True:
+            try:
+                clave = self._pendientes.get(timeout=1.0)
+            except queue.Empty:
+                return
+            if clave not in self._datos:
+                self._guardar(clave, self.funcion(*clave))
+                self.precargados += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self._datos),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+            "precargados": self.precargados,
+        }
+
+# Redondea un valor al paso de un slider (sirve para armar las claves de la cache)
+def cuantizar(valor, paso):
+    return round(round(float(valor) / paso) * paso, 10)
+
+# Posiciones vecinas (± un paso) de cada slider, respetando sus límites.
+# `valores` es un diccionario parámetro -> valor y `sliders` parámetro -> widget.
+def vecinos_sliders(valores, sliders):
+    vecinos = []
+    for nombre, slider in sliders.items():
+        if getattr(slider, "disabled", False):
+            continue
+        for signo in (-1, 1):
+            nuevo = valores[nombre] + signo * slider.step
+            if slider.min <= nuevo <= slider.max:
+                vecinos.append(dict(valores, **{nombre: cuantizar(nuevo, slider.step)}))
+    return vecinos
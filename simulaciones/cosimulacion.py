@@ -0,0 +1,141 @@
+import math
+
+import numpy as np
+
+import nucleo
+from nucleo import ProgramaGanancias
+from metricas import fuera_de_banda
+
+# --- Conversión psicrométrica ---
+# Presión de saturación del vapor de agua (hPa) con la fórmula de Magnus
+# (coeficientes de Sonntag, válida entre -45 y 60 °C).
+def presion_saturacion(T):
+    return 6.112 * np.exp(17.62 * T / (243.12 + T))
+
+# Presión parcial de vapor (hPa) del aire con humedad relativa HR (%) a la temperatura T (°C)
+def presion_vapor(HR, T):
+    return HR / 100 * presion_saturacion(T)
+
+# presion_saturacion para un escalar, con math.exp (mucho más rápido que np.exp por
+# muestra). Una corrida que diverge puede pasar por T cerca de -243 °C, donde math.exp
+# desborda o el denominador se anula: ahí se calcula con NumPy para obtener inf o NaN
+# como en el resto de los simuladores en lugar de una excepción.
+def _presion_saturacion_escalar(T):
+    try:
+        return 6.112 * math.exp(17.62 * T / (243.12 + T))
+    except (OverflowError, ZeroDivisionError):
+        with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+            return float(presion_saturacion(np.float64(T)))
+
+# Humedad relativa (%) del aire con presión de vapor pv (hPa) a la temperatura T (°C)
+def humedad_relativa(pv, T):
+    return 100 * pv / presion_saturacion(T)
+
+# Humedad absoluta (g/m³) del aire con humedad relativa HR (%) a la temperatura T (°C)
+def humedad_absoluta(HR, T):
+    return 216.7 * presion_vapor(HR, T) / (273.15 + T)
+
+# --- Co-simulación temperatura–humedad ---
+# Campos del resultado de cosimular: un solo arreglo estructurado con la base de tiempo
+# y un sub-registro por lazo, con los mismos nombres que devuelven simulate_pid y
+# simulate_proportional_humidity (más pv, la presión de vapor de la sala en hPa).
+campos_temperatura = ("T", "P_term", "I_term", "D_term", "output", "T_amb_values", "e")
+campos_humedad = ("HR", "P_term", "output", "HR_amb_values", "e", "Kp_ajustado", "pv")
+tipo_cosimulacion = np.dtype([
+    ("t", float),
+    ("temperatura", [(nombre, float) for nombre in campos_temperatura]),
+    ("humedad", [(nombre, float) for nombre in campos_humedad]),
+])
+
+# Avanza el lazo PID de temperatura y el lazo P de humedad en el mismo bucle. El estado de
+# humedad es la presión de vapor: el controlador mide HR a la temperatura actual y su
+# salida (en % de HR) agrega vapor a la tasa de la planta de humedad a esa temperatura; el
+# aire exterior aporta HR_amb a la temperatura T_amb. Así, si la temperatura sube, la HR
+# baja aunque no cambie la cantidad de agua en el aire.
+# Los parámetros son los de simulate_pid seguidos de los de simulate_proportional_humidity
+# (cada lazo con su propia perturbación, y `programa` para el ajuste de Kp de humedad) y
+# se aplican las mismas reglas (ganancias nulas, perturbación deshabilitada). Con T constante (T_ref = T_initial y sin perturbación de
+# temperatura) la humedad coincide con simulate_proportional_humidity hasta el redondeo.
+# Devuelve un arreglo estructurado de tipo tipo_cosimulacion y longitud len(t):
+#   r["t"], r["temperatura"]["T"], r["humedad"]["HR"], ...
+def cosimular(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial,
+              Kp_c, HR_ref, HR_inicial, perturbation_start_hum, perturbation_end_hum, HR_amb_perturb, fl_perturbacion_hum,
+              fl_ajustar_controlador, cota_error, programa=None):
+    t, dt = nucleo.t, nucleo.dt
+    K, tau, K_hum, tau_hum = nucleo.K, nucleo.tau, nucleo.K_hum, nucleo.tau_hum
+    n = len(t)
+
+    resultado = np.zeros(n, dtype=tipo_cosimulacion)
+    resultado["t"] = t
+    temp, hum = resultado["temperatura"], resultado["humedad"]
+    T, P_T, I_T, D_T, output_T, T_amb_values, e_T = (temp[nombre] for nombre in campos_temperatura)
+    HR, P_HR, output_HR, HR_amb_values, e_HR, Kp_ajustado, pv = (hum[nombre] for nombre in campos_humedad)
+
+    # Mismas reglas que simulate_pid y simulate_proportional_humidity
+    T_amb_base = T_initial
+    if Kp == Ki == Kd == 0:
+        T_ref = T_initial
+    if not fl_perturbacion:
+        T_amb_perturb, perturbation_start, perturbation_end = T_amb_base, 0, 0
+    HR_amb_base = HR_inicial
+    if Kp_c == 0:
+        HR_ref = HR_inicial
+    if not fl_perturbacion_hum:
+        HR_amb_perturb, perturbation_start_hum, perturbation_end_hum = HR_amb_base, 0, 0
+    ajustar = fl_ajustar_controlador and Kp_c != 0
+    programa = ProgramaGanancias.desde_cota(cota_error) if programa is None else programa
+
+    T_amb_values[:] = np.where((perturbation_start <= t) & (t <= perturbation_end), T_amb_perturb, T_amb_base)
+    HR_amb_values[:] = np.where((perturbation_start_hum <= t) & (t <= perturbation_end_hum), HR_amb_perturb, HR_amb_base)
+    # El vapor que aporta el aire exterior y la escala % HR -> hPa en cada instante
+    pv_amb = presion_vapor(HR_amb_values, T_amb_values).tolist()
+    T_amb_lista = T_amb_values.tolist()
+
+    T_act, integral, prev_error = float(T_initial), 0.0, 0.0
+    psat_act = float(presion_saturacion(T_act))
+    pv_act = HR_inicial / 100 * psat_act
+    T[0], pv[0], HR[0] = T_act, pv_act, HR_inicial
+    e_T[0], e_HR[0] = T_ref - T_act, HR_ref - HR_inicial
+    HR_act = float(HR_inicial)
+
+    for i in range(1, n):
+        # Lazo de temperatura (igual que simulate_pid)
+        e = T_ref - T_act
+        e_T[i] = e
+        P = Kp * e
+        integral += e * dt
+        I = Ki * integral
+        D = Kd * ((e - prev_error) / dt)
+        u = P + I + D
+        P_T[i], I_T[i], D_T[i], output_T[i] = P, I, D, u
+        prev_error = e
+
+        # Lazo de humedad: error medido como HR a la temperatura del paso anterior
+        e = HR_ref - HR_act
+        e_HR[i] = e
+        Kp_h = Kp_c
+        if ajustar:
+            Kp_h = Kp_c * programa.factor_escalar(e)
+        u_h = Kp_h * e
+        Kp_ajustado[i], P_HR[i], output_HR[i] = Kp_h, u_h, u_h
+        escala = psat_act / 100
+        pv_act = pv_act + (K_hum * u_h * escala - (pv_act - pv_amb[i])) / tau_hum * dt
+
+        T_act = T_act + (K * u - (T_act - T_amb_lista[i])) / tau * dt
+        psat_act = _presion_saturacion_escalar(T_act)
+        if psat_act:
+            HR_act = 100 * pv_act / psat_act
+        else:
+            # psat se anula (exp subdesborda) en una corrida divergente
+            with np.errstate(divide="ignore", invalid="ignore"):
+                HR_act = float(np.float64(100 * pv_act) / psat_act)
+        T[i], pv[i], HR[i] = T_act, pv_act, HR_act
+
+    return resultado
+
+# Máscara de los instantes en que T o HR están fuera de su banda y fracción del tiempo
+# en que ambas están dentro (NaN cuenta como fuera, como en metricas.fuera_de_banda).
+def cumplimiento(resultado, T_min, T_max, HR_min, HR_max):
+    fuera = (fuera_de_banda(resultado["temperatura"]["T"], T_min, T_max)
+             | fuera_de_banda(resultado["humedad"]["HR"], HR_min, HR_max))
+    return fuera, 1 - fuera.mean()
@@ -0,0 +1,264 @@
+import numpy as np
+
+import nucleo
+
+# Análisis de estabilidad de los lazos discretos de simulate_pid y
+# simulate_proportional_humidity, vectorizado sobre grillas de ganancias. Con el paso de
+# Euler los lazos son lineales (sin programa de ganancia), así que los polos de lazo
+# cerrado, los márgenes de ganancia y de fase, el ancho de banda y el diagrama de Bode
+# salen del modelo discreto sin simular. Un barrido o una sintonización pueden descartar
+# con filtrar_pid los candidatos inestables o con poco margen antes de simularlos.
+#
+# Lazo discreto (c = paso / tau): T[i] = (1 - c) T[i-1] + c K u[i] + c T_amb, y u[i] se
+# calcula con e[i] = T_ref - T[i-1]. El lazo abierto desde e hasta la medición es
+#   L(z) = z^-1 · c K / (1 - (1 - c) z^-1) · C(z),
+#   C(z) = Kp + Ki paso / (1 - z^-1) + Kd (1 - z^-1) / paso    (PID)
+#   C(z) = Kp                                                   (P)
+# Los parámetros de planta y el paso son por defecto los de nucleo (K, tau, dt o K_hum,
+# tau_hum) leídos al llamar. Todas las ganancias se combinan por broadcasting.
+
+def _planta(K_planta, tau_planta, paso, humedad=False):
+    K_defecto, tau_defecto = (nucleo.K_hum, nucleo.tau_hum) if humedad else (nucleo.K, nucleo.tau)
+    K_planta = K_defecto if K_planta is None else K_planta
+    tau_planta = tau_defecto if tau_planta is None else tau_planta
+    paso = nucleo.dt if paso is None else paso
+    return np.asarray(K_planta, dtype=float), np.asarray(tau_planta, dtype=float), float(paso)
+
+def _ganancias(*ganancias):
+    return [np.array(g, dtype=float).reshape(-1) for g in np.broadcast_arrays(*ganancias)]
+
+# --- Polos de lazo cerrado ---
+# Estado (T, integral, error previo) de _propagar_lazo_pid. Su polinomio característico es
+# z^3 + a2 z^2 + a1 z + a0 con a = 1 - c - c K g, g = Kp + Ki paso + Kd / paso y
+#   a2 = -(1 + a),  a1 = a + c K Ki paso - c K Kd / paso,  a0 = c K Kd / paso.
+# Con Ki = 0 el polinomio es (z - 1)(z^2 - a z + d): el polo en 1 es el de la integral,
+# que no influye en T, así que se reemplaza por un polo en 0 (z^3 - a z^2 + d z).
+def _coeficientes_pid(Kp, Ki, Kd, K_planta, tau_planta, paso):
+    c = paso / tau_planta
+    a = 1 - c - c * K_planta * (Kp + Ki * paso + Kd / paso)
+    d = -c * K_planta * Kd / paso
+    sin_integral = Ki == 0
+    return (np.where(sin_integral, -a, -(1 + a)), np.where(sin_integral, d, a + c * K_planta * Ki * paso + d),
+            np.where(sin_integral, 0.0, -d))
+
+# Polos (candidatos, 3) del lazo PID
+def polos_pid(Kp, Ki, Kd, K_planta=None, tau_planta=None, paso=None):
+    K_planta, tau_planta, paso = _planta(K_planta, tau_planta, paso)
+    Kp, Ki, Kd, K_planta, tau_planta = _ganancias(Kp, Ki, Kd, K_planta, tau_planta)
+    a2, a1, a0 = _coeficientes_pid(Kp, Ki, Kd, K_planta, tau_planta, paso)
+    # Matriz compañera de cada candidato
+    companera = np.zeros((len(Kp), 3, 3))
+    companera[:, 0, :] = -np.stack([a2, a1, a0], axis=1)
+    companera[:, 1, 0] = companera[:, 2, 1] = 1.0
+    return np.linalg.eigvals(companera)
+
+# Estabilidad del lazo PID con el criterio de Jury (sin calcular raíces, mucho más rápido
+# que polos_pid para grillas grandes)
+def estable_pid(Kp, Ki, Kd, K_planta=None, tau_planta=None, paso=None):
+    K_planta, tau_planta, paso = _planta(K_planta, tau_planta, paso)
+    Kp, Ki, Kd, K_planta, tau_planta = _ganancias(Kp, Ki, Kd, K_planta, tau_planta)
+    a2, a1, a0 = _coeficientes_pid(Kp, Ki, Kd, K_planta, tau_planta, paso)
+    return ((1 + a2 + a1 + a0 > 0) & (1 - a2 + a1 - a0 > 0) & (np.abs(a0) < 1)
+            & (np.abs(a0**2 - 1) > np.abs(a0 * a2 - a1)))
+
+# Polo (candidatos, 1) del lazo P: HR[i] = (1 - c - c K Kp) HR[i-1] + ...
+def polos_proporcional(Kp, K_planta=None, tau_planta=None, paso=None):
+    K_planta, tau_planta, paso = _planta(K_planta, tau_planta, paso, humedad=True)
+    Kp, K_planta, tau_planta = _ganancias(Kp, K_planta, tau_planta)
+    c = paso / tau_planta
+    return (1 - c - c * K_planta * Kp)[:, None].astype(complex)
+
+# --- Respuesta en frecuencia del lazo abierto ---
+# Frecuencias (rad/s) espaciadas logarítmicamente desde 1e-3/tau hasta Nyquist (pi/paso)
+def frecuencias(n=256, tau_planta=None, paso=None, humedad=False):
+    _, tau_planta, paso = _planta(None, tau_planta, paso, humedad)
+    return np.logspace(np.log10(1e-3 / np.min(tau_planta)), np.log10(np.pi / paso), n)
+
+# L(e^{jw paso}) con forma (candidatos, len(w))
+def lazo_abierto_pid(Kp, Ki, Kd, w, K_planta=None, tau_planta=None, paso=None):
+    K_planta, tau_planta, paso = _planta(K_planta, tau_planta, paso)
+    Kp, Ki, Kd, K_planta, tau_planta = (g[:, None] for g in _ganancias(Kp, Ki, Kd, K_planta, tau_planta))
+    z_1 = np.exp(-1j * np.asarray(w) * paso)
+    c = paso / tau_planta
+    C = Kp + Ki * paso / (1 - z_1) + Kd * (1 - z_1) / paso
+    return z_1 * c * K_planta / (1 - (1 - c) * z_1) * C
+
+def lazo_abierto_proporcional(Kp, w, K_planta=None, tau_planta=None, paso=None):
+    K_planta, tau_planta, paso = _planta(K_planta, tau_planta, paso, humedad=True)
+    Kp, K_planta, tau_planta = (g[:, None] for g in _ganancias(Kp, K_planta, tau_planta))
+    z_1 = np.exp(-1j * np.asarray(w) * paso)
+    c = paso / tau_planta
+    return z_1 * c * K_planta / (1 - (1 - c) * z_1) * Kp
+
+# Magnitud (dB) y fase (grados, continua en w) del lazo abierto
+def bode_pid(Kp, Ki, Kd, w=None, K_planta=None, tau_planta=None, paso=None):
+    w = frecuencias(tau_planta=tau_planta, paso=paso) if w is None else np.asarray(w)
+    L = lazo_abierto_pid(Kp, Ki, Kd, w, K_planta, tau_planta, paso)
+    return w, 20 * np.log10(np.abs(L)), np.degrees(np.unwrap(np.angle(L), axis=1))
+
+def bode_proporcional(Kp, w=None, K_planta=None, tau_planta=None, paso=None):
+    w = frecuencias(tau_planta=tau_planta, paso=paso, humedad=True) if w is None else np.asarray(w)
+    L = lazo_abierto_proporcional(Kp, w, K_planta, tau_planta, paso)
+    return w, 20 * np.log10(np.abs(L)), np.degrees(np.unwrap(np.angle(L), axis=1))
+
+# --- Márgenes exactos ---
+# Con q = z^-1 = e^{-jθ} (θ = w paso) el lazo abierto es L = n(q) / d(q), con
+#   n(q) = c K q [(Kp + Ki paso + Kd / paso) - (Kp + 2 Kd / paso) q + (Kd / paso) q^2]
+#   d(q) = (1 - q) (1 - (1 - c) q)
+# (el lazo P es el caso Ki = Kd = 0). Con x = cos θ, tanto |n|^2 - |d|^2 como la parte
+# imaginaria de n(q) conj(d(q)) dividida por sen θ son polinomios de grado 2 en x, así que
+# los cruces de ganancia (|L| = 1) y de fase (L real; además θ = pi) salen de fórmulas
+# cerradas, sin muestrear frecuencias:
+#   margen de ganancia: 1/|L| donde L es real negativo (el menor; inf si no hay),
+#   margen de fase: 180° + fase de L donde |L| = 1 (el menor; inf si no hay).
+def _polinomios_pid(Kp, Ki, Kd, K_planta, tau_planta, paso):
+    c = paso / tau_planta
+    g = c * K_planta
+    cero = np.zeros_like(Kp)
+    n = np.stack([cero, g * (Kp + Ki * paso + Kd / paso), -g * (Kp + 2 * Kd / paso), g * Kd / paso], axis=1)
+    d = np.stack([cero + 1, cero - (2 - c), cero + (1 - c), cero], axis=1)
+    return n, d
+
+# r_m = sum_k p_k p_(k+m), con |p(e^{-jθ})|^2 = r_0 + 2 sum_m r_m cos(mθ)
+def _autocorrelacion(p, m):
+    return (p[:, :p.shape[1] - m] * p[:, m:]).sum(axis=1)
+
+# s_m = sum_l n_(l+m) d_l, con n(q) conj(d(q)) = sum_m s_m q^m
+def _correlacion(n, d, m):
+    if m >= 0:
+        return (n[:, m:] * d[:, :d.shape[1] - m]).sum(axis=1)
+    return (n[:, :n.shape[1] + m] * d[:, -m:]).sum(axis=1)
+
+# Raíces reales de A x^2 + B x + C dentro de [-1, 1], forma (candidatos, 2) con NaN
+# donde no hay raíz
+def _raices(A, B, C):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        raiz = np.sqrt(B**2 - 4 * A * C)
+        q = -(B + np.where(B >= 0, 1.0, -1.0) * raiz) / 2
+        lineal = np.abs(A) <= 1e-12 * (np.abs(B) + np.abs(C))
+        x = np.stack([np.where(lineal, -C / B, q / A), np.where(lineal, np.nan, C / q)], axis=1)
+    dentro = (x >= -1 - 1e-12) & (x <= 1 + 1e-12)
+    return np.where(dentro, np.clip(x, -1, 1), np.nan)
+
+def _evaluar(p, q):
+    return sum(p[:, k:k + 1] * q**k for k in range(p.shape[1]))
+
+# Márgenes de ganancia (factor) y de fase (grados) y sus frecuencias (rad/s)
+def margenes_pid(Kp, Ki, Kd, K_planta=None, tau_planta=None, paso=None):
+    K_planta, tau_planta, paso = _planta(K_planta, tau_planta, paso)
+    Kp, Ki, Kd, K_planta, tau_planta = _ganancias(Kp, Ki, Kd, K_planta, tau_planta)
+    return _margenes(*_polinomios_pid(Kp, Ki, Kd, K_planta, tau_planta, paso), paso)
+
+def _margenes(n, d, paso):
+    # Cruces de fase: raíces de V(x) = sum_m (s_m - s_-m) U_(m-1)(x) y θ = pi
+    v1, v2, v3 = (_correlacion(n, d, m) - _correlacion(n, d, -m) for m in (1, 2, 3))
+    x_fase = np.concatenate([_raices(4 * v3, 2 * v2, v1 - v3), -np.ones((len(n), 1))], axis=1)
+    # Cruces de ganancia: raíces de |n|^2 - |d|^2 = D0 + 2 D1 x + 2 D2 (2x^2 - 1); x = 1
+    # (θ = 0) se descarta, es el factor (1 - q) común cuando Ki = 0
+    D0, D1, D2 = (_autocorrelacion(n, m) - _autocorrelacion(d, m) for m in (0, 1, 2))
+    x_ganancia = _raices(4 * D2, 2 * D1, D0 - 2 * D2)
+    x_ganancia[x_ganancia >= 1 - 1e-9] = np.nan
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        theta_fase, theta_ganancia = np.arccos(x_fase), np.arccos(x_ganancia)
+        L_fase = _evaluar(n, np.exp(-1j * theta_fase)) / _evaluar(d, np.exp(-1j * theta_fase))
+        L_ganancia = _evaluar(n, np.exp(-1j * theta_ganancia)) / _evaluar(d, np.exp(-1j * theta_ganancia))
+        validos = (L_fase.real < 0) & (theta_fase > 0)
+        margen_ganancia = np.where(validos, -1 / np.where(validos, L_fase.real, -1.0), np.inf)
+        margen_fase = np.where(np.isfinite(L_ganancia), np.degrees(np.angle(-L_ganancia)), np.inf)
+    filas = np.arange(len(n))
+    i_fase, i_ganancia = np.argmin(margen_ganancia, axis=1), np.argmin(margen_fase, axis=1)
+    margen_ganancia, margen_fase = margen_ganancia[filas, i_fase], margen_fase[filas, i_ganancia]
+    w_fase = np.where(np.isfinite(margen_ganancia), theta_fase[filas, i_fase] / paso, np.nan)
+    w_ganancia = np.where(np.isfinite(margen_fase), theta_ganancia[filas, i_ganancia] / paso, np.nan)
+    return dict(margen_ganancia=margen_ganancia, margen_fase=margen_fase,
+                frecuencia_cruce_fase=w_fase, frecuencia_cruce_ganancia=w_ganancia)
+
+# --- Análisis completo ---
+# Primera w donde |L / (1 + L)| cae 3 dB debajo de su valor en la menor frecuencia (inf si
+# no cae antes de Nyquist), muestreando w de a tam_bloque candidatos
+def _ancho_banda(lazo, n, w, tam_bloque):
+    ancho_banda = np.empty(n)
+    for inicio in range(0, n, tam_bloque):
+        bloque = slice(inicio, min(inicio + tam_bloque, n))
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            L = lazo(bloque)
+            cerrado = np.abs(L / (1 + L))
+        debajo = cerrado < cerrado[:, :1] / np.sqrt(2)
+        ancho_banda[bloque] = np.where(debajo.any(axis=1), w[np.argmax(debajo, axis=1)], np.inf)
+    return ancho_banda
+
+# Polos, radio espectral, estable, márgenes (ganancia como factor y en dB, fase en
+# grados), frecuencias de cruce y, con ancho_banda=True, ancho de banda de lazo cerrado
+# (rad/s, sobre la grilla w) de cada candidato PID
+def analizar_pid(Kp, Ki, Kd, K_planta=None, tau_planta=None, paso=None, ancho_banda=True, w=None, tam_bloque=4096):
+    K_planta, tau_planta, paso = _planta(K_planta, tau_planta, paso)
+    Kp, Ki, Kd, K_planta, tau_planta = _ganancias(Kp, Ki, Kd, K_planta, tau_planta)
+    polos = polos_pid(Kp, Ki, Kd, K_planta, tau_planta, paso)
+    resultado = dict(polos=polos, radio=np.abs(polos).max(axis=1))
+    resultado["estable"] = resultado["radio"] < 1
+    resultado.update(_margenes(*_polinomios_pid(Kp, Ki, Kd, K_planta, tau_planta, paso), paso))
+    with np.errstate(divide="ignore"):
+        resultado["margen_ganancia_db"] = 20 * np.log10(resultado["margen_ganancia"])
+    if ancho_banda:
+        w = frecuencias(tau_planta=tau_planta, paso=paso) if w is None else np.asarray(w)
+        lazo = lambda b: lazo_abierto_pid(Kp[b], Ki[b], Kd[b], w, K_planta[b], tau_planta[b], paso)
+        resultado["ancho_banda"] = _ancho_banda(lazo, len(Kp), w, tam_bloque)
+    return resultado
+
+# Lo mismo para el lazo P de humedad (el PID con Ki = Kd = 0 sobre la planta de humedad).
+# Con fl_ajustar_controlador la ganancia efectiva es Kp_c por el factor del programa (por
+# defecto desde_cota(cota_error)) y se analiza el mayor factor: en este lazo los márgenes
+# bajan al aumentar Kp y la inestabilidad aparece con la mayor ganancia (peor caso).
+def analizar_proporcional(Kp_c, fl_ajustar_controlador=False, cota_error=5, programa=None, K_planta=None,
+                          tau_planta=None, paso=None, ancho_banda=True, w=None, tam_bloque=4096):
+    K_planta, tau_planta, paso = _planta(K_planta, tau_planta, paso, humedad=True)
+    factor = 1.0
+    if fl_ajustar_controlador:
+        programa = nucleo.ProgramaGanancias.desde_cota(cota_error) if programa is None else programa
+        factor = programa.factores.max()
+    if w is None and ancho_banda:
+        w = frecuencias(tau_planta=tau_planta, paso=paso, humedad=True)
+    resultado = analizar_pid(np.multiply(Kp_c, factor), 0.0, 0.0, K_planta, tau_planta, paso, ancho_banda, w, tam_bloque)
+    resultado["polos"] = polos_proporcional(np.multiply(Kp_c, factor), K_planta, tau_planta, paso)
+    return resultado
+
+# --- Prefiltro de candidatos ---
+# Un candidato pasa si es estable, su radio espectral es menor que radio_max y sus
+# márgenes no bajan de margen_ganancia_min (factor) y margen_fase_min (grados); los
+# criterios en None no se miran. La estabilidad sale del criterio de Jury y los márgenes
+# de las fórmulas cerradas, así que filtrar cuesta mucho menos que simular (los polos
+# solo se calculan con radio_max < 1).
+# criterios_estabilidad, el prefiltro por defecto de sintonizar_pid y de simular_lote.py
+# --prefiltro, solo descarta los lazos inestables. criterios_margenes pide además margen
+# de ganancia 2 (6 dB) y de fase 30°, y hay que elegirlo explícitamente: descarta
+# ganancias que se usan en la práctica, como las iniciales de la interfaz (Kp=2, Ki=5,
+# Kd=1, margen de fase 25°).
+criterios_estabilidad = dict(radio_max=1.0)
+criterios_margenes = dict(radio_max=1.0, margen_ganancia_min=2.0, margen_fase_min=30.0)
+
+def filtrar_pid(Kp, Ki, Kd, radio_max=1.0, margen_ganancia_min=None, margen_fase_min=None, K_planta=None, tau_planta=None,
+                paso=None):
+    K_planta, tau_planta, paso = _planta(K_planta, tau_planta, paso)
+    Kp, Ki, Kd, K_planta, tau_planta = _ganancias(Kp, Ki, Kd, K_planta, tau_planta)
+    pasa = estable_pid(Kp, Ki, Kd, K_planta, tau_planta, paso)
+    if radio_max is not None and radio_max < 1:
+        pasa &= np.abs(polos_pid(Kp, Ki, Kd, K_planta, tau_planta, paso)).max(axis=1) < radio_max
+    if margen_ganancia_min is not None or margen_fase_min is not None:
+        margenes = _margenes(*_polinomios_pid(Kp, Ki, Kd, K_planta, tau_planta, paso), paso)
+        if margen_ganancia_min is not None:
+            pasa &= margenes["margen_ganancia"] >= margen_ganancia_min
+        if margen_fase_min is not None:
+            pasa &= margenes["margen_fase"] >= margen_fase_min
+    return pasa
+
+# Lazo P de humedad con el mismo criterio del peor caso que analizar_proporcional
+def filtrar_proporcional(Kp_c, fl_ajustar_controlador=False, cota_error=5, programa=None, radio_max=1.0,
+                         margen_ganancia_min=None, margen_fase_min=None, K_planta=None, tau_planta=None, paso=None):
+    K_planta, tau_planta, paso = _planta(K_planta, tau_planta, paso, humedad=True)
+    factor = 1.0
+    if fl_ajustar_controlador:
+        programa = nucleo.ProgramaGanancias.desde_cota(cota_error) if programa is None else programa
+        factor = programa.factores.max()
+    return filtrar_pid(np.multiply(Kp_c, factor), 0.0, 0.0, radio_max, margen_ganancia_min, margen_fase_min,
+                       K_planta, tau_planta, paso)
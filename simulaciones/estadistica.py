@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+
+# --- Acumulador de envolventes por histograma ---
+# Resume muchas trayectorias (lote, tiempo) sin guardarlas: para cada instante lleva un
+# histograma de valores con bins fijos en `rango`, más las cuentas de muestras fuera de
+# la banda aceptable. La memoria depende de len(t) * bins y no de la cantidad de corridas.
+# Los percentiles se interpolan dentro del bin, así que su resolución es el ancho del bin;
+# los valores fuera de `rango` (o no finitos) se acumulan en el primer o último bin.
+class AcumuladorEnvolvente:
+    def __init__(self, n_tiempos, rango, bins=400):
+        self.rango = (float(rango[0]), float(rango[1]))
+        self.bins = bins
+        self.ancho = (self.rango[1] - self.rango[0]) / bins
+        self.cuentas = np.zeros((n_tiempos, bins), dtype=np.int64)
+        self.fuera_por_tiempo = np.zeros(n_tiempos, dtype=np.int64)
+        self.suma = np.zeros(n_tiempos)
+        self.corridas = 0
+        self.corridas_fuera = 0
+
+    # Agrega un bloque de trayectorias Y (lote, tiempo) y su máscara fuera de banda
+    def agregar(self, Y, fuera):
+        n_tiempos = self.cuentas.shape[0]
+        Y = np.nan_to_num(Y, nan=self.rango[1], posinf=self.rango[1], neginf=self.rango[0])
+        idx = np.clip(((Y - self.rango[0]) / self.ancho).astype(np.int64), 0, self.bins - 1)
+        idx += np.arange(n_tiempos) * self.bins
+        self.cuentas += np.bincount(idx.ravel(), minlength=n_tiempos * self.bins).reshape(n_tiempos, self.bins)
+        self.fuera_por_tiempo += fuera.sum(axis=0)
+        self.suma += Y.sum(axis=0)
+        self.corridas += len(Y)
+        self.corridas_fuera += int(fuera.any(axis=1).sum())
+
+    # Suma otro acumulador con la misma configuración (por ejemplo, el de otro proceso)
+    def combinar(self, otro):
+        self.cuentas += otro.cuentas
+        self.fuera_por_tiempo += otro.fuera_por_tiempo
+        self.suma += otro.suma
+        self.corridas += otro.corridas
+        self.corridas_fuera += otro.corridas_fuera
+
+    # Percentiles (0-100) por instante; devuelve un arreglo (len(percentiles), tiempo)
+    def percentiles(self, percentiles):
+        acumuladas = np.cumsum(self.cuentas, axis=1)
+        resultado = np.empty((len(percentiles), self.cuentas.shape[0]))
+        filas = np.arange(self.cuentas.shape[0])
+        for k, p in enumerate(percentiles):
+            objetivo = p / 100 * self.corridas
+            b = np.minimum((acumuladas < objetivo).sum(axis=1), self.bins - 1)
+            previas = np.where(b > 0, acumuladas[filas, np.maximum(b - 1, 0)], 0)
+            en_bin = np.maximum(self.cuentas[filas, b], 1)
+            fraccion = np.clip((objetivo - previas) / en_bin, 0.0, 1.0)
+            resultado[k] = self.rango[0] + (b + fraccion) * self.ancho
+        return resultado
+
+    def media(self):
+        return self.suma / max(self.corridas, 1)
+
+    # Probabilidad de estar fuera de banda en cada instante
+    def prob_fuera_por_tiempo(self):
+        return self.fuera_por_tiempo / max(self.corridas, 1)
+
+    # Probabilidad de que una corrida salga de la banda en algún momento
+    def prob_fuera(self):
+        return self.corridas_fuera / max(self.corridas, 1)
+
+# --- Muestreo de parámetros inciertos ---
+# Cada distribución es un número (valor fijo) o una tupla:
+#   ("uniforme", minimo, maximo) | ("normal", media, desvio) | ("lognormal", mu, sigma)
+def muestrear(rng, distribucion, n):
+    if np.isscalar(distribucion):
+        return np.full(n, float(distribucion))
+    tipo, a, b = distribucion
+    if tipo == "uniforme":
+        return rng.uniform(a, b, n)
+    if tipo == "normal":
+        return rng.normal(a, b, n)
+    if tipo == "lognormal":
+        return rng.lognormal(a, b, n)
+    raise ValueError(f"Distribución desconocida: {tipo}")
+
+# --- Ejecución por bloques de una simulación Monte Carlo ---
+# `evaluar_bloque(semilla, n)` simula n corridas con su propio generador y devuelve un
+# AcumuladorEnvolvente. Cada bloque recibe una semilla derivada de `semilla` con
+# SeedSequence y los resultados se combinan en el orden de los bloques, así que el
+# resultado no depende de la cantidad de procesos ni del orden en que terminan (las sumas
+# en coma flotante se hacen siempre en el mismo orden). Como mucho hay 2 bloques por
+# proceso entre los que están en vuelo y los que esperan su turno, por lo que la memoria
+# no crece con n_muestras. Se usa "fork"
+# cuando existe (los hijos heredan lo definido en el notebook y nucleo.t); si no, el
+# método por defecto, que requiere que evaluar_bloque viva en un módulo importable.
+# procesos=None usa todos los núcleos (os.cpu_count()) y procesos=1 corre en serie, sin
+# pool; con un solo bloque tampoco se arma el pool.
+def ejecutar_por_bloques(evaluar_bloque, n_muestras, semilla, tam_bloque, procesos=None):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    tamanios = [min(tam_bloque, n_muestras - i) for i in range(0, n_muestras, tam_bloque)]
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanios))
+
+    if procesos is None:
+        procesos = os.cpu_count() or 1
+    procesos = min(procesos, len(tamanios))
+    if procesos <= 1:
+        total = None
+        for s, n in zip(semillas, tamanios):
+            parcial = evaluar_bloque(s, n)
+            if total is None:
+                total = parcial
+            else:
+                total.combinar(parcial)
+        return total
+
+    total = None
+    pendientes = {}     # Futuro -> índice del bloque
+    terminados = {}     # Índice -> acumulador que espera a los bloques anteriores
+    siguiente = 0
+    trabajos = iter(enumerate(zip(semillas, tamanios)))
+    contexto = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+    with ProcessPoolExecutor(procesos, mp_context=contexto) as pool:
+        while True:
+            while len(pendientes) + len(terminados) < 2 * procesos:
+                trabajo = next(trabajos, None)
+                if trabajo is None:
+                    break
+                indice, (s, n) = trabajo
+                pendientes[pool.submit(evaluar_bloque, s, n)] = indice
+            if not pendientes:
+                break
+            listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                terminados[pendientes.pop(futuro)] = futuro.result()
+            while siguiente in terminados:
+                parcial = terminados.pop(siguiente)
+                if total is None:
+                    total = parcial
+                else:
+                    total.combinar(parcial)
+                siguiente += 1
+    return total
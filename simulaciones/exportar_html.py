@@ -0,0 +1,308 @@
+import argparse
+import base64
+import json
+import zlib
+
+import numpy as np
+
+import nucleo
+from interfaz import controles, interfaces, valores_control, valor_inicial, a_valor, leer_valores
+
+# Exporta una página HTML autónoma con la simulación precalculada sobre una grilla de
+# valores de los controles (por defecto Kp × Ki × Kd con los pasos de los sliders). En la
+# página, los sliders eligen el escenario ya calculado y el gráfico se redibuja en el
+# navegador, sin kernel de Python ni ida y vuelta al servidor.
+#
+#   python exportar_html.py pid.html                                   # Kp × Ki × Kd
+#   python exportar_html.py pid.html --grilla Kp=0:10:0.1 --grilla Kd=0:2:0.5 --fijo fl_perturbacion=true
+#   python exportar_html.py humedad.html --simulador humedad --presupuesto 4
+#
+# Los datos se guardan una sola vez por escenario sobre un eje de tiempo común reducido a
+# `puntos` muestras, comprimidos con deflate. Con codificacion="delta" cada señal se
+# cuantiza a `resolucion` (en sus unidades) y se guardan las diferencias entre muestras
+# como int32, que comprimen mucho mejor; con "float32" se guardan los valores en float32.
+# Antes de comprimir, los bytes de cada escenario se agrupan por posición (todos los
+# primeros bytes, después los segundos, ...), como el filtro shuffle de HDF5: así deflate
+# encuentra las largas rachas de ceros de los bytes altos.
+# Si la grilla no entra en el presupuesto (bytes comprimidos y memoria descomprimida en el
+# navegador) se va salteando valores del control con más valores hasta que entre.
+
+# --- Grilla ---
+# Saltea valores (cada `reduccion[nombre]`) del control con más valores hasta que la
+# grilla tenga como mucho max_escenarios combinaciones
+def reducir_grilla(grilla, max_escenarios, reduccion=None):
+    reduccion = {nombre: int((reduccion or {}).get(nombre, 1)) for nombre in grilla}
+    tamano = lambda nombre: len(grilla[nombre][::reduccion[nombre]])
+    while np.prod([tamano(nombre) for nombre in grilla]) > max_escenarios:
+        nombre = max(grilla, key=tamano)
+        if tamano(nombre) == 1:
+            break
+        reduccion[nombre] += 1
+    return {nombre: valores[::reduccion[nombre]] for nombre, valores in grilla.items()}, reduccion
+
+# --- Codificación ---
+# Señales de un bloque (dict de arreglos (escenarios, len(t))) en el orden
+# [escenario, señal, tiempo], reducidas a las muestras `indices`, con los 4 bytes de cada
+# valor separados en planos por escenario
+def _codificar(senales, nombres, indices, codificacion, resolucion):
+    Y = np.stack([senales[nombre][:, indices] for nombre in nombres], axis=1)
+    if codificacion == "float32":
+        valores = Y.astype("<f4")
+    else:
+        # Los lazos que divergen (inf/nan) quedan saturados en el valor representable más grande
+        limite = 2**30 - 1
+        with np.errstate(invalid="ignore", over="ignore"):
+            enteros = np.clip(np.nan_to_num(np.round(Y / resolucion), nan=limite, posinf=limite, neginf=-limite), -limite, limite)
+        valores = np.diff(enteros.astype(np.int64), axis=2, prepend=0).astype("<i4")
+    return np.ascontiguousarray(valores).view(np.uint8).reshape(len(Y), -1, 4).transpose(0, 2, 1).tobytes()
+
+def _simular_bloque(interfaz, grilla, fijos, indices_escenarios):
+    forma = tuple(len(v) for v in grilla.values())
+    posiciones = np.unravel_index(indices_escenarios, forma)
+    valores = {nombre: np.asarray(grilla[nombre])[p] for nombre, p in zip(grilla, posiciones)}
+    valores.update({nombre: np.full(len(indices_escenarios), valor) for nombre, valor in fijos.items()})
+    with np.errstate(over="ignore", invalid="ignore"):
+        return interfaz["simular"](valores)
+
+# --- Página ---
+def _plotlyjs(modo):
+    from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+    if modo == "cdn":
+        return f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+    return f"<script>{get_plotlyjs()}</script>"
+
+_PLANTILLA = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>__TITULO__</title>
+__PLOTLYJS__
+<style>
+body { font-family: sans-serif; margin: 16px; }
+.control { display: inline-block; margin: 4px 18px 4px 0; }
+.control input { vertical-align: middle; }
+#estado { color: #777; font-size: 0.9em; }
+</style>
+</head>
+<body>
+<h3>__TITULO__</h3>
+<div id="controles"></div>
+<div id="estado">Descomprimiendo datos…</div>
+<div id="grafico" style="height: 1000px"></div>
+<script id="meta" type="application/json">__META__</script>
+<script id="datos" type="application/octet-stream">__DATOS__</script>
+<script>
+(async function () {
+  const meta = JSON.parse(document.getElementById("meta").textContent);
+  const texto = atob(document.getElementById("datos").textContent.trim());
+  const comprimido = new Uint8Array(texto.length);
+  for (let i = 0; i < texto.length; i++) comprimido[i] = texto.charCodeAt(i);
+  const flujo = new Blob([comprimido]).stream().pipeThrough(new DecompressionStream("deflate"));
+  const buffer = await new Response(flujo).arrayBuffer();
+  const bytes = new Uint8Array(buffer);
+  const S = meta.senales.length, P = meta.t.length, N = S * P;
+  const seleccion = meta.parametros.map(p => p.inicial);
+  let rango = meta.rango.valor;
+
+  // Señal s del escenario: arma cada valor con sus 4 planos de bytes y, en "delta",
+  // hace la suma acumulada de las diferencias
+  const valor32 = new DataView(new ArrayBuffer(4));
+  function senal(escenario, s) {
+    const base = escenario * N * 4 + s * P, y = new Float64Array(P);
+    let acumulado = 0;
+    for (let k = 0; k < P; k++) {
+      for (let b = 0; b < 4; b++) valor32.setUint8(b, bytes[base + k + b * N]);
+      if (meta.codificacion === "delta") { acumulado += valor32.getInt32(0, true); y[k] = acumulado * meta.resolucion; }
+      else y[k] = valor32.getFloat32(0, true);
+    }
+    return y;
+  }
+
+  function valor(nombre) {
+    const i = meta.parametros.findIndex(p => p.nombre === nombre);
+    return i >= 0 ? meta.parametros[i].valores[seleccion[i]] : meta.fijos[nombre];
+  }
+
+  // Franjas fuera de [minimo, maximo], como metricas.franjas_fuera_de_banda
+  function franjas(y, minimo, maximo) {
+    const salida = [];
+    let inicio = -1;
+    for (let k = 0; k < y.length; k++) {
+      const fuera = !(y[k] >= minimo && y[k] <= maximo);
+      if (fuera && inicio < 0) inicio = k;
+      if (!fuera && inicio >= 0) { salida.push([meta.t[inicio], meta.t[k]]); inicio = -1; }
+    }
+    if (inicio >= 0) salida.push([meta.t[inicio], meta.t[meta.t.length - 1]]);
+    return salida;
+  }
+
+  function dibujar() {
+    let escenario = 0;
+    meta.parametros.forEach((p, i) => { escenario = escenario * p.valores.length + seleccion[i]; });
+    const ref = valor(meta.referencia);
+    const r = meta.rango.parametro ? valor(meta.rango.parametro) : rango;
+    const trazas = [];
+    const layout = { grid: { rows: meta.paneles.length, columns: 1, pattern: "coupled" }, showlegend: true,
+                     margin: { t: 20 }, xaxis: { title: { text: "Tiempo (s)" } } };
+    meta.paneles.forEach((panel, j) => {
+      const eje = j ? "y" + (j + 1) : "y";
+      layout["yaxis" + (j ? j + 1 : "")] = { title: { text: panel.titulo } };
+      panel.senales.forEach(nombre => trazas.push({ x: meta.t, y: senal(escenario, meta.senales.indexOf(nombre)),
+                                                    name: nombre, mode: "lines", xaxis: "x", yaxis: eje }));
+    });
+    const t0 = meta.t[0], t1 = meta.t[meta.t.length - 1];
+    const linea = (y, color) => ({ type: "line", xref: "x", yref: "y", x0: t0, x1: t1, y0: y, y1: y, line: { color: color, dash: "dash", width: 1 } });
+    layout.shapes = [linea(ref, "gray"), linea(ref - r, "red"), linea(ref + r, "red")].concat(
+      franjas(trazas[0].y, ref - r, ref + r).map(([a, b]) => ({ type: "rect", xref: "x", yref: "y domain", x0: a, x1: b, y0: 0, y1: 1,
+                                                               fillcolor: "rgba(255, 0, 0, 0.2)", line: { width: 0 }, layer: "below" })));
+    Plotly.react("grafico", trazas, layout);
+  }
+
+  function agregarControl(etiqueta, crear) {
+    const caja = document.createElement("label");
+    caja.className = "control";
+    caja.append(etiqueta + " ");
+    const [entrada, texto] = crear();
+    caja.append(entrada, " ", texto);
+    document.getElementById("controles").append(caja);
+  }
+
+  meta.parametros.forEach((p, i) => agregarControl(p.nombre, () => {
+    const texto = document.createElement("span");
+    const entrada = document.createElement("input");
+    if (p.valores.length === 2 && p.valores[0] === false && p.valores[1] === true) {
+      entrada.type = "checkbox";
+      entrada.checked = seleccion[i] === 1;
+      entrada.addEventListener("input", () => { seleccion[i] = entrada.checked ? 1 : 0; dibujar(); });
+    } else {
+      Object.assign(entrada, { type: "range", min: 0, max: p.valores.length - 1, step: 1, value: seleccion[i] });
+      texto.textContent = p.valores[seleccion[i]];
+      entrada.addEventListener("input", () => { seleccion[i] = +entrada.value; texto.textContent = p.valores[seleccion[i]]; dibujar(); });
+    }
+    return [entrada, texto];
+  }));
+  if (!meta.rango.parametro) agregarControl("Rango Error (+/-)", () => {
+    const texto = document.createElement("span");
+    const entrada = document.createElement("input");
+    Object.assign(entrada, { type: "range", min: meta.rango.minimo, max: meta.rango.maximo, step: meta.rango.paso, value: rango });
+    texto.textContent = rango;
+    entrada.addEventListener("input", () => { rango = +entrada.value; texto.textContent = rango; dibujar(); });
+    return [entrada, texto];
+  });
+
+  document.getElementById("estado").textContent =
+    meta.escenarios + " escenarios precalculados; fijos: " + JSON.stringify(meta.fijos);
+  dibujar();
+})();
+</script>
+</body>
+</html>
+"""
+
+# --- Exportación ---
+# `grilla` es un diccionario control -> valores (por defecto los controles de
+# interfaces[simulador]["grilla"] con todos los valores de su slider) y `fijos` los
+# valores de los demás controles (por defecto los iniciales de la interfaz).
+# presupuesto y memoria_max son bytes: el primero limita los datos comprimidos embebidos
+# en la página y el segundo los datos descomprimidos en el navegador. `reduccion` fija
+# de entrada cada cuántos valores se toma uno por control.
+# Devuelve un diccionario con la grilla final, la reducción aplicada y los tamaños.
+def exportar_html(ruta, simulador="pid", grilla=None, fijos=None, reduccion=None, presupuesto=8e6, memoria_max=256e6,
+                  puntos=300, codificacion="delta", resolucion=1e-3, plotlyjs="inline", tam_bloque=2048, titulo=None):
+    if codificacion not in ("delta", "float32"):
+        raise ValueError(f"Codificación desconocida: {codificacion}")
+    interfaz, definiciones = interfaces[simulador], controles[simulador]
+    if grilla is None:
+        grilla = {nombre: valores_control(definiciones[nombre]) for nombre in interfaz["grilla"]}
+    grilla = {nombre: np.asarray(valores) for nombre, valores in grilla.items()}
+    desconocidos = (set(grilla) | set(fijos or {})) - set(definiciones)
+    if desconocidos:
+        raise ValueError(f"Controles desconocidos para {simulador}: {sorted(desconocidos)}")
+    fijos = {nombre: (fijos or {}).get(nombre, valor_inicial(definicion))
+             for nombre, definicion in definiciones.items() if nombre not in grilla}
+
+    nombres = [nombre for _, senales in interfaz["paneles"] for nombre in senales]
+    n = len(nucleo.t)
+    indices = np.unique(np.round(np.linspace(0, n - 1, min(puntos, n))).astype(int))
+    muestras_por_escenario = len(nombres) * len(indices)
+
+    # Tamaño comprimido por escenario estimado con una muestra al azar de la grilla completa
+    total = int(np.prod([len(v) for v in grilla.values()]))
+    muestra = np.random.default_rng(0).choice(total, size=min(64, total), replace=False)
+    bloque = _codificar(_simular_bloque(interfaz, grilla, fijos, muestra), nombres, indices, codificacion, resolucion)
+    por_escenario = len(zlib.compress(bloque, 6)) / len(muestra)
+    max_escenarios = max(1, int(min(presupuesto / por_escenario, memoria_max / (4 * muestras_por_escenario))))
+
+    while True:
+        final, reduccion_final = reducir_grilla(grilla, max_escenarios, reduccion)
+        escenarios = int(np.prod([len(v) for v in final.values()]))
+        compresor = zlib.compressobj(6)
+        partes = []
+        for inicio in range(0, escenarios, tam_bloque):
+            bloque = _simular_bloque(interfaz, final, fijos, np.arange(inicio, min(inicio + tam_bloque, escenarios)))
+            partes.append(compresor.compress(_codificar(bloque, nombres, indices, codificacion, resolucion)))
+        partes.append(compresor.flush())
+        datos = b"".join(partes)
+        # La estimación puede quedarse corta: se achica la grilla y se vuelve a intentar
+        if len(datos) <= presupuesto or escenarios == 1:
+            break
+        max_escenarios = max(1, int(escenarios * presupuesto / len(datos) * 0.95))
+
+    inicial = lambda nombre: valor_inicial(definiciones[nombre])
+    meta = dict(
+        simulador=simulador, escenarios=escenarios, codificacion=codificacion, resolucion=resolucion,
+        t=np.round(nucleo.t[indices], 6).tolist(), senales=nombres,
+        paneles=[dict(titulo=titulo_panel, senales=senales) for titulo_panel, senales in interfaz["paneles"]],
+        parametros=[dict(nombre=nombre, valores=valores.tolist(),
+                         inicial=int(np.argmin(np.abs(valores.astype(float) - float(inicial(nombre))))))
+                    for nombre, valores in final.items()],
+        fijos={nombre: (valor.item() if isinstance(valor, np.generic) else valor) for nombre, valor in fijos.items()},
+        referencia=interfaz["referencia"], rango=interfaz["rango"],
+    )
+    titulo = titulo or f"Simulación {simulador} precalculada"
+    pagina = (_PLANTILLA.replace("__PLOTLYJS__", _plotlyjs(plotlyjs)).replace("__TITULO__", titulo)
+              .replace("__META__", json.dumps(meta, ensure_ascii=False).replace("</", "<\\/"))
+              .replace("__DATOS__", base64.b64encode(datos).decode("ascii")))
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(pagina)
+    return dict(grilla={nombre: len(valores) for nombre, valores in final.items()}, reduccion=reduccion_final,
+                escenarios=escenarios, bytes_datos=len(datos), bytes_pagina=len(pagina.encode("utf-8")))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta una página HTML autónoma con escenarios precalculados.")
+    parser.add_argument("salida", help="archivo .html")
+    parser.add_argument("--simulador", choices=sorted(interfaces), default="pid")
+    parser.add_argument("--grilla", action="append", default=[], metavar="CONTROL=VALORES",
+                        help="control de la grilla con 'min:max:paso' o 'a,b,c' (reemplaza la grilla por defecto)")
+    parser.add_argument("--fijo", action="append", default=[], metavar="CONTROL=VALOR", help="valor de un control fuera de la grilla")
+    parser.add_argument("--reduccion", action="append", default=[], metavar="CONTROL=N", help="tomar uno de cada N valores del control")
+    parser.add_argument("--presupuesto", type=float, default=8.0, help="MB de datos comprimidos (por defecto 8)")
+    parser.add_argument("--memoria-max", type=float, default=256.0, help="MB de datos descomprimidos en el navegador")
+    parser.add_argument("--puntos", type=int, default=300, help="muestras de tiempo por señal")
+    parser.add_argument("--codificacion", choices=("delta", "float32"), default="delta")
+    parser.add_argument("--resolucion", type=float, default=1e-3, help="resolución de la codificación delta")
+    parser.add_argument("--plotlyjs", choices=("inline", "cdn"), default="inline", help="incluir plotly.js en la página o cargarlo del CDN")
+    args = parser.parse_args(argv)
+
+    def pares(lista):
+        try:
+            return dict(item.split("=", 1) for item in lista)
+        except ValueError:
+            parser.error(f"se esperaba CONTROL=VALOR: {lista}")
+
+    grilla = {nombre: leer_valores(texto) for nombre, texto in pares(args.grilla).items()} or None
+    fijos = {nombre: a_valor(texto) for nombre, texto in pares(args.fijo).items()}
+    reduccion = {nombre: int(texto) for nombre, texto in pares(args.reduccion).items()}
+    try:
+        info = exportar_html(args.salida, args.simulador, grilla, fijos, reduccion, args.presupuesto * 1e6, args.memoria_max * 1e6,
+                             args.puntos, args.codificacion, args.resolucion, args.plotlyjs)
+    except ValueError as error:
+        parser.error(str(error))
+    grilla_texto = " × ".join(f"{nombre} {cantidad}" for nombre, cantidad in info["grilla"].items())
+    print(f"{info['escenarios']} escenarios ({grilla_texto}), datos {info['bytes_datos'] / 1e6:.2f} MB, "
+          f"página {info['bytes_pagina'] / 1e6:.2f} MB -> {args.salida}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
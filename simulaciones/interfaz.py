@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import threading
+import time
+
+import numpy as np
+
+from nucleo import simulate_pid_batch, simulate_proportional_humidity_batch
+from submuestreo import submuestrear
+
+_log = logging.getLogger(__name__)
+
+# --- Controles de cada interfaz ---
+# (mínimo, máximo, paso, valor inicial) de los sliders de simulacion_temperatura.py y
+# simulacion_humedad.py; las casillas se indican con su valor inicial (bool).
+controles = {
+    "pid": {
+        "Kp": (0.0, 10.0, 0.1, 2.0), "Ki": (0.0, 10.0, 0.1, 5.0), "Kd": (0.0, 9.0, 0.1, 1.0),
+        "T_ref": (15.0, 30.0, 0.5, 22.0), "perturbation_start": (0, 100, 1, 30), "perturbation_end": (0, 100, 1, 50),
+        "T_amb_perturb": (10.0, 35.0, 0.5, 15.0), "fl_perturbacion": False, "T_initial": (10.0, 30.0, 0.5, 20.0),
+    },
+    "humedad": {
+        "Kp": (0.0, 10.0, 0.1, 2.0), "HR_ref": (30.0, 70.0, 1.0, 50.0), "HR_inicial": (30.0, 70.0, 1.0, 46.0),
+        "perturbation_start": (0, 100, 1, 30), "perturbation_end": (0, 100, 1, 50), "HR_amb_perturb": (10.0, 90.0, 1.0, 75.0),
+        "fl_perturbacion": False, "rango_error": (0, 20, 1, 5), "fl_ajustar_controlador": False,
+    },
+}
+
+# Todos los valores de un control: los del slider o False/True para una casilla
+def valores_control(definicion):
+    if isinstance(definicion, bool):
+        return np.array([False, True])
+    minimo, maximo, paso, _ = definicion
+    return np.round(np.arange(minimo, maximo + paso / 2, paso), 10)
+
+def valor_inicial(definicion):
+    return definicion if isinstance(definicion, bool) else definicion[3]
+
+# Valor de un control desde texto: un número o una casilla (true/false, sí/no)
+def a_valor(texto):
+    texto = texto.strip()
+    if texto.lower() in ("true", "verdadero", "si", "sí"):
+        return True
+    if texto.lower() in ("false", "falso", "no"):
+        return False
+    return float(texto)
+
+# Valores de la grilla desde texto: "min:max:paso", "a,b,c" o un único valor
+def leer_valores(texto):
+    if ":" in texto:
+        minimo, maximo, paso = (float(x) for x in texto.split(":"))
+        return np.round(np.arange(minimo, maximo + paso / 2, paso), 10)
+    return np.array([a_valor(x) for x in texto.split(",")])
+
+# Simulación de un bloque de escenarios a partir de los valores de los controles (arreglos
+# de igual longitud), con las mismas reglas que _argumentos_simulacion de cada interfaz
+def _simular_pid(v):
+    ganancias_nulas = (v["Kp"] == 0) & (v["Ki"] == 0) & (v["Kd"] == 0)
+    T_div = np.where(ganancias_nulas, v["T_initial"], v["T_ref"])
+    n = np.where(ganancias_nulas, 1, 3)
+    T_amb_perturb = v["T_amb_perturb"] ** n / T_div ** (n - 1)
+    fl_perturbacion = v["fl_perturbacion"] & (v["T_amb_perturb"] != v["T_ref"])
+    T, P_term, I_term, D_term, output, _, e = simulate_pid_batch(
+        v["Kp"], v["Ki"], v["Kd"], v["T_ref"], v["perturbation_start"], v["perturbation_end"], T_amb_perturb,
+        fl_perturbacion, v["T_initial"])
+    return dict(T=T, P_term=P_term, I_term=I_term, D_term=D_term, output=output, e=e)
+
+# En la interfaz de humedad el rango de error es también la cota del ajuste de Kp
+def _simular_humedad(v):
+    fl_perturbacion = v["fl_perturbacion"] & (v["HR_amb_perturb"] != v["HR_ref"])
+    HR, _, output, _, e, Kp_ajustado = simulate_proportional_humidity_batch(
+        v["Kp"], v["HR_ref"], v["HR_inicial"], v["perturbation_start"], v["perturbation_end"], v["HR_amb_perturb"],
+        fl_perturbacion, v["fl_ajustar_controlador"], v["rango_error"])
+    return dict(HR=HR, output=output, e=e, Kp_ajustado=Kp_ajustado)
+
+# Datos de cada interfaz para el mapa de sensibilidad y la página exportada: simulación
+# de un bloque, controles de la grilla por defecto, paneles del gráfico y la referencia.
+# `rango` es el control del rango de error: un parámetro de la grilla o, si no influye en
+# la simulación, un slider propio (mínimo, máximo, paso, inicial).
+interfaces = {
+    "pid": dict(
+        simular=_simular_pid,
+        grilla=("Kp", "Ki", "Kd"),
+        paneles=[("Temperatura (°C)", ["T"]), ("Componentes PID", ["P_term", "I_term", "D_term"]),
+                 ("Señal de control", ["output"]), ("Error", ["e"])],
+        referencia="T_ref",
+        rango=dict(minimo=0, maximo=10, paso=1, valor=4),
+    ),
+    "humedad": dict(
+        simular=_simular_humedad,
+        grilla=("Kp", "HR_ref", "fl_ajustar_controlador"),
+        paneles=[("Humedad (%)", ["HR"]), ("Señal de control", ["output"]), ("Error", ["e"]), ("Kp ajustado", ["Kp_ajustado"])],
+        referencia="HR_ref",
+        rango=dict(parametro="rango_error"),
+    ),
+}
+
+# --- Coalescencia de eventos de la interfaz ---
+# Los sliders con continuous_update=True disparan muchos eventos por segundo mientras se
+# arrastran. llamar() no ejecuta la función enseguida: espera `espera` segundos sin
+# eventos nuevos y ejecuta solo la última llamada pendiente. Si los eventos no se
+# detienen, igual ejecuta como mucho cada `espera_max` segundos para que el gráfico
+# acompañe el arrastre. Nunca hay dos ejecuciones simultáneas.
+# Dentro del kernel de Jupyter los eventos de los widgets llegan en su bucle asyncio: ahí
+# la ejecución se programa con call_later y corre en el mismo hilo que los demás
+# callbacks. Sin bucle en marcha (scripts) se usa un threading.Timer; por eso cada
+# ejecución toma `lock`, que también deben tomar los otros callbacks que modifican el
+# mismo estado (el zoom del gráfico). Las excepciones de la función se registran con
+# logging y se cuentan en `errores`.
+class Coalescedor:
+    def __init__(self, espera=0.05, espera_max=0.25, lock=None):
+        self.espera = espera
+        self.espera_max = espera_max
+        self.ejecuciones = 0
+        self.descartadas = 0
+        self.errores = 0
+        self.lock = threading.RLock() if lock is None else lock
+        self._pendiente = None
+        self._primero = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def llamar(self, funcion, *args):
+        with self._lock:
+            if self._pendiente is not None:
+                self.descartadas += 1
+            self._pendiente = (funcion, args)
+            ahora = time.monotonic()
+            if self._primero is None:
+                self._primero = ahora
+            if self._timer is not None:
+                self._timer.cancel()
+            demora = max(0.0, min(self.espera, self._primero + self.espera_max - ahora))
+            self._timer = self._programar(demora)
+
+    # Devuelve un objeto con cancel(): un TimerHandle del bucle o un threading.Timer
+    def _programar(self, demora):
+        try:
+            bucle = asyncio.get_running_loop()
+        except RuntimeError:
+            timer = threading.Timer(demora, self._ejecutar)
+            timer.daemon = True
+            timer.start()
+            return timer
+        return bucle.call_later(demora, self._ejecutar)
+
+    def _ejecutar(self):
+        with self.lock:
+            with self._lock:
+                pendiente, self._pendiente = self._pendiente, None
+                self._primero = None
+                self._timer = None
+            if pendiente is not None:
+                funcion, args = pendiente
+                try:
+                    funcion(*args)
+                except Exception:
+                    self.errores += 1
+                    _log.exception("Error al ejecutar %s", getattr(funcion, "__name__", funcion))
+                finally:
+                    self.ejecuciones += 1
+
+# --- Submuestreo para el gráfico ---
+# Cada traza se reduce a puntos_max puntos dentro del rango visible de su eje x, y al
+# hacer zoom sobre el FigureWidget se vuelve a submuestrear la ventana nueva desde la
+# señal completa, así que el detalle reaparece sin enviar nunca todas las muestras.
+# `nombres` son los nombres (name) de las trazas en el orden en que cargar() recibe los
+# valores. cargar() y el callback de zoom toman `lock`, que se comparte con el
+# Coalescedor que redibuja el gráfico.
+class SubmuestreoGrafico:
+    def __init__(self, nombres, puntos_max=2000, metodo="minmax", lock=None):
+        self.nombres = tuple(nombres)
+        self.puntos_max = puntos_max      # Puntos por traza enviados al navegador
+        self.metodo = metodo              # "minmax" (rápido) o "lttb" (ver submuestreo.py)
+        self.lock = threading.RLock() if lock is None else lock
+        self.t = None
+        self.senales = {}                 # Nombre de traza -> señal completa
+        self.rangos = {}                  # Eje x -> rango con el que se submuestrearon sus trazas
+
+    # Carga en las trazas de `fig` los valores sobre la grilla t; los escalares se dibujan
+    # como líneas constantes (alcanza con un segmento de dos puntos)
+    def cargar(self, fig, t, *valores):
+        with self.lock:
+            self.t = t
+            trazas = {traza.name: traza for traza in fig.data}
+            for nombre, y in zip(self.nombres, valores):
+                traza = trazas[nombre]
+                if np.ndim(y) == 0:
+                    traza.x, traza.y = (t[0], t[-1]), (y, y)
+                else:
+                    self.senales[nombre] = y
+                    rango = _rango_visible(fig, traza)
+                    self.rangos[traza.xaxis] = rango
+                    traza.x, traza.y = submuestrear(t, y, self.puntos_max, self.metodo, rango)
+
+    # Registra en el FigureWidget el callback de zoom de todos sus ejes x
+    def conectar(self, fig):
+        ejes = sorted({"xaxis" + traza.xaxis[1:] for traza in fig.data})
+        fig.layout.on_change(lambda layout, *rangos: self._al_cambiar_rango(fig),
+                             *[f"{eje}.{propiedad}" for eje in ejes for propiedad in ("range", "autorange")])
+
+    # Vuelve a submuestrear solo las trazas de los ejes cuyo rango cambió
+    def _al_cambiar_rango(self, fig):
+        with self.lock, fig.batch_update():
+            for traza in fig.data:
+                rango = _rango_visible(fig, traza)
+                if traza.name in self.senales and self.rangos.get(traza.xaxis, ()) != rango:
+                    traza.x, traza.y = submuestrear(self.t, self.senales[traza.name], self.puntos_max, self.metodo, rango)
+            for traza in fig.data:
+                self.rangos[traza.xaxis] = _rango_visible(fig, traza)
+
+# Rango x visible del subgráfico de una traza (None si el eje está en autorango)
+def _rango_visible(fig, traza):
+    eje = fig.layout["xaxis" + traza.xaxis[1:]]
+    return None if eje.range is None or eje.autorange else tuple(eje.range)
@@ -0,0 +1,84 @@
+import numpy as np
+
+# --- Detección de franjas de falla ---
+# Máscara de muestras fuera de [y_min, y_max]. Los valores no finitos (lazos que
+# divergen) cuentan como fuera de banda.
+def fuera_de_banda(y, y_min, y_max):
+    return ~((y >= y_min) & (y <= y_max))
+
+# Índices (filas, inicios, fines) de cada tramo fuera de banda en y (..., tiempo).
+# Un tramo empieza en la primera muestra fuera de banda y termina en la primera muestra
+# que vuelve a estar dentro; si llega al final, termina en la última muestra.
+def intervalos_fuera_de_banda(y, y_min, y_max):
+    fuera = np.atleast_2d(fuera_de_banda(y, y_min, y_max))
+    fuera = fuera.reshape(-1, fuera.shape[-1])
+    bordes = np.diff(fuera.astype(np.int8), axis=1, prepend=0, append=0)
+    filas, inicios = np.nonzero(bordes == 1)
+    _, fines = np.nonzero(bordes == -1)
+    return filas, inicios, np.minimum(fines, fuera.shape[1] - 1)
+
+# Lista de franjas (inicio, fin) en unidades de t para una única señal y
+def franjas_fuera_de_banda(t, y, y_min, y_max):
+    _, inicios, fines = intervalos_fuera_de_banda(y, y_min, y_max)
+    return list(zip(t[inicios].tolist(), t[fines].tolist()))
+
+# --- Métricas de calidad del control ---
+# Calcula en una sola pasada vectorizada las métricas de una o muchas corridas.
+# y es (tiempo,) o (escenarios, tiempo); ref, y_min e y_max pueden ser escalares o
+# arreglos por escenario. Si no se pasa e se usa ref - y. Con output se agregan el
+# esfuerzo (integral de |output|) y la energía de control (integral de output²).
+# El tiempo de subida va del 10% al 90% del escalón entre y[0] y ref (nan si no se
+# alcanza o si no hay escalón). El tiempo de asentamiento es el instante a partir del
+# cual y queda dentro de [y_min, y_max] hasta el final (t[-1] si termina fuera).
+# Devuelve un diccionario de arreglos con la forma de y sin el eje del tiempo.
+def metricas_control(t, y, ref, y_min, y_max, e=None, output=None):
+    y = np.asarray(y, dtype=float)
+    forma = y.shape[:-1]
+    Y = y.reshape(-1, y.shape[-1])
+    escenarios, n = Y.shape
+    paso = t[1] - t[0]
+    ref, y_min, y_max = (np.broadcast_to(np.asarray(v, dtype=float), forma).reshape(-1, 1) for v in (ref, y_min, y_max))
+    E = ref - Y if e is None else np.asarray(e, dtype=float).reshape(escenarios, n)
+
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        # Franjas fuera de banda
+        fuera = fuera_de_banda(Y, y_min, y_max)
+        filas, inicios, fines = intervalos_fuera_de_banda(Y, y_min, y_max)
+        duraciones = t[fines] - t[inicios]
+        tiempo_fuera = np.bincount(filas, weights=duraciones, minlength=escenarios)
+        excursiones = np.bincount(filas, minlength=escenarios)
+        mayor_tiempo_fuera = np.zeros(escenarios)
+        np.maximum.at(mayor_tiempo_fuera, filas, duraciones)
+
+        # Respuesta al escalón desde y[0] hacia ref
+        escalon = ref[:, 0] - Y[:, 0]
+        sentido = np.where(escalon < 0, -1.0, 1.0)[:, None]
+        sobrepico = np.maximum(np.max(sentido * (Y - ref), axis=1), 0.0)
+        avance = (Y - Y[:, :1]) / escalon[:, None]
+        llega_10 = avance >= 0.1
+        llega_90 = avance >= 0.9
+        tiempo_subida = np.where(llega_90.any(axis=1) & (escalon != 0),
+                                 t[np.argmax(llega_90, axis=1)] - t[np.argmax(llega_10, axis=1)], np.nan)
+        ultimo_fuera = np.where(fuera.any(axis=1), n - 1 - np.argmax(fuera[:, ::-1], axis=1), -1)
+        tiempo_asentamiento = t[np.minimum(ultimo_fuera + 1, n - 1)]
+
+        # Índices integrales del error
+        abs_e = np.abs(E)
+        metricas = {
+            "tiempo_fuera": tiempo_fuera,
+            "mayor_tiempo_fuera": mayor_tiempo_fuera,
+            "excursiones": excursiones,
+            "sobrepico": sobrepico,
+            "tiempo_subida": tiempo_subida,
+            "tiempo_asentamiento": tiempo_asentamiento,
+            "error_estacionario": E[:, -1],
+            "iae": abs_e.sum(axis=1) * paso,
+            "ise": (E * E).sum(axis=1) * paso,
+            "itae": (abs_e @ t) * paso,
+        }
+        if output is not None:
+            U = np.asarray(output, dtype=float).reshape(escenarios, n)
+            metricas["esfuerzo"] = np.abs(U).sum(axis=1) * paso
+            metricas["energia_control"] = (U * U).sum(axis=1) * paso
+
+    return {nombre: valor.reshape(forma) for nombre, valor in metricas.items()}
@@ -0,0 +1,97 @@
+from functools import partial
+
+import numpy as np
+
+import nucleo
+from nucleo import simulate_pid_batch, simulate_proportional_humidity_batch, fuera_de_banda
+from estadistica import AcumuladorEnvolvente, muestrear, ejecutar_por_bloques
+
+# --- Análisis Monte Carlo de robustez ---
+# Distribuciones por defecto de los parámetros inciertos (ver estadistica.muestrear).
+# La perturbación empieza en perturbation_start y dura `duracion` segundos.
+distribuciones_pid = {
+    "K": ("uniforme", 0.8, 1.2),
+    "tau": ("uniforme", 8.0, 12.0),
+    "T_initial": ("uniforme", 18.0, 24.0),
+    "perturbation_start": ("uniforme", 20.0, 40.0),
+    "duracion": ("uniforme", 10.0, 30.0),
+    "T_amb_perturb": ("uniforme", 12.0, 30.0),
+}
+
+distribuciones_humedad = {
+    "K": ("uniforme", 0.8, 1.2),
+    "tau": ("uniforme", 8.0, 12.0),
+    "HR_inicial": ("uniforme", 40.0, 60.0),
+    "perturbation_start": ("uniforme", 20.0, 40.0),
+    "duracion": ("uniforme", 10.0, 30.0),
+    "HR_amb_perturb": ("uniforme", 30.0, 90.0),
+}
+
+# Simula un bloque de n corridas con su propio generador y devuelve su acumulador
+def _bloque_montecarlo_pid(semilla, n, Kp, Ki, Kd, T_ref, rango_error, distribuciones, rango_hist, bins):
+    rng = np.random.default_rng(semilla)
+    muestras = {nombre: muestrear(rng, d, n) for nombre, d in distribuciones.items()}
+    inicio = muestras["perturbation_start"]
+    with np.errstate(over="ignore", invalid="ignore"):
+        T = simulate_pid_batch(Kp, Ki, Kd, T_ref, inicio, inicio + muestras["duracion"], muestras["T_amb_perturb"],
+                               True, muestras["T_initial"], muestras["K"], muestras["tau"])[0]
+        fuera = fuera_de_banda(T, T_ref - rango_error, T_ref + rango_error)
+    acumulador = AcumuladorEnvolvente(len(nucleo.t), rango_hist, bins)
+    acumulador.agregar(T, fuera)
+    return acumulador
+
+# Corre n_muestras simulaciones con K, tau, T_initial y la perturbación muestreados de
+# `distribuciones` (se combinan con distribuciones_pid), repartidas en todos los núcleos
+# (procesos=1 corre en serie). Con la misma semilla el resultado es el mismo para
+# cualquier valor de `procesos`. Devuelve un diccionario con las envolventes de
+# percentiles de T (percentiles, len(t)), la media, la probabilidad de estar fuera de
+# T_ref ± rango_error en cada instante y la de salir de la banda alguna vez.
+def montecarlo_pid(Kp, Ki, Kd, T_ref, rango_error, n_muestras=10000, distribuciones=None, semilla=0,
+                   percentiles=(5, 50, 95), tam_bloque=1000, procesos=None, rango_hist=(0.0, 50.0), bins=1000):
+    distribuciones = dict(distribuciones_pid, **(distribuciones or {}))
+    evaluar_bloque = partial(_bloque_montecarlo_pid, Kp=Kp, Ki=Ki, Kd=Kd, T_ref=T_ref, rango_error=rango_error,
+                             distribuciones=distribuciones, rango_hist=rango_hist, bins=bins)
+    acumulador = ejecutar_por_bloques(evaluar_bloque, n_muestras, semilla, tam_bloque, procesos)
+    return {
+        "percentiles": dict(zip(percentiles, acumulador.percentiles(percentiles))),
+        "media": acumulador.media(),
+        "prob_fuera_por_tiempo": acumulador.prob_fuera_por_tiempo(),
+        "prob_fuera": acumulador.prob_fuera(),
+        "corridas": acumulador.corridas,
+    }
+
+# Simula un bloque de n corridas con su propio generador y devuelve su acumulador
+def _bloque_montecarlo_humedad(semilla, n, Kp, HR_ref, rango_error, fl_ajustar_controlador, distribuciones, rango_hist, bins):
+    rng = np.random.default_rng(semilla)
+    muestras = {nombre: muestrear(rng, d, n) for nombre, d in distribuciones.items()}
+    inicio = muestras["perturbation_start"]
+    with np.errstate(over="ignore", invalid="ignore"):
+        HR = simulate_proportional_humidity_batch(Kp, HR_ref, muestras["HR_inicial"], inicio, inicio + muestras["duracion"],
+                                                  muestras["HR_amb_perturb"], True, fl_ajustar_controlador, rango_error,
+                                                  muestras["K"], muestras["tau"])[0]
+        fuera = fuera_de_banda(HR, HR_ref - rango_error, HR_ref + rango_error)
+    acumulador = AcumuladorEnvolvente(len(nucleo.t), rango_hist, bins)
+    acumulador.agregar(HR, fuera)
+    return acumulador
+
+# Corre n_muestras simulaciones con K_hum, tau_hum, HR_inicial y la perturbación
+# muestreados de `distribuciones` (se combinan con distribuciones_humedad), repartidas
+# en todos los núcleos (procesos=1 corre en serie). Con la misma semilla el resultado es
+# el mismo para cualquier valor de `procesos`. Devuelve un
+# diccionario con las envolventes de percentiles de HR (percentiles, len(t)), la media,
+# la probabilidad de estar fuera de HR_ref ± rango_error en cada instante y la de salir
+# de la banda alguna vez.
+def montecarlo_humedad(Kp, HR_ref, rango_error, fl_ajustar_controlador=False, n_muestras=10000, distribuciones=None, semilla=0,
+                       percentiles=(5, 50, 95), tam_bloque=1000, procesos=None, rango_hist=(0.0, 100.0), bins=1000):
+    distribuciones = dict(distribuciones_humedad, **(distribuciones or {}))
+    evaluar_bloque = partial(_bloque_montecarlo_humedad, Kp=Kp, HR_ref=HR_ref, rango_error=rango_error,
+                             fl_ajustar_controlador=fl_ajustar_controlador, distribuciones=distribuciones,
+                             rango_hist=rango_hist, bins=bins)
+    acumulador = ejecutar_por_bloques(evaluar_bloque, n_muestras, semilla, tam_bloque, procesos)
+    return {
+        "percentiles": dict(zip(percentiles, acumulador.percentiles(percentiles))),
+        "media": acumulador.media(),
+        "prob_fuera_por_tiempo": acumulador.prob_fuera_por_tiempo(),
+        "prob_fuera": acumulador.prob_fuera(),
+        "corridas": acumulador.corridas,
+    }
@@ -0,0 +1,236 @@
+import threading
+
+import numpy as np
+
+# Motor de simulación común a los lazos de temperatura y de humedad: un controlador y una
+# planta intercambiables, avanzados con un paso de Euler por muestra sobre la grilla t.
+# simulate_pid y simulate_proportional_humidity (nucleo.py) corren sobre este motor, así
+# que agregar otra ley de control solo requiere una clase con paso() y no otro bucle.
+#
+#   motor = Motor(ControladorPID(2, 5, 1, 22), PlantaPrimerOrden(20, 20, 1.0, 10.0), senales=("y", "e"))
+#   r = motor.correr(nucleo.t, 20.0, 20.0, perturbacion=(30, 50, 15.0))   # r["y"], r["e"]
+#
+# Los controladores y la planta guardan su estado en __slots__ (sin __dict__ por objeto).
+# Las señales se escriben en un EspacioTrabajo que se reutiliza entre corridas: con el
+# mismo largo de t no se vuelve a reservar memoria, y los arreglos devueltos son vistas
+# que la corrida siguiente sobrescribe (copiarlas si se van a guardar). Solo se devuelven
+# las `senales` pedidas, opcionalmente en float32 (los cálculos siempre son en float64).
+
+# Los valores por defecto (paso de la grilla, K y tau) salen de nucleo, que importa este
+# módulo; por eso se importa recién al usarlo
+def _nucleo():
+    import nucleo
+    return nucleo
+
+# --- Controladores ---
+# Las mismas leyes de simulate_pid y simulate_proportional_humidity, separadas de la
+# planta. Interfaz: paso(medicion) avanza el controlador una muestra y devuelve la tupla
+# de `senales` (la primera es siempre la salida, "output"); calcular(medicion) devuelve
+# solo la salida, para usarlo como controlador en vivo (ver tiempo_real.py). Alternando
+# calcular() con PlantaPrimerOrden.avanzar() se reproduce la simulación muestra a muestra.
+# inicial(medicion) da la tupla de la muestra 0 (condición inicial, sin actuación) y
+# reiniciar(paso) vuelve al estado inicial, opcionalmente con otro paso.
+class ControladorPID:
+    __slots__ = ("Kp", "Ki", "Kd", "T_ref", "programa", "dt", "integral", "prev_error")
+    senales = ("output", "e", "P_term", "I_term", "D_term")
+
+    # Con `programa` (ProgramaGanancias) Kp se multiplica por el factor que corresponde a |e|
+    def __init__(self, Kp, Ki, Kd, T_ref, paso=None, programa=None):
+        self.Kp, self.Ki, self.Kd = Kp, Ki, Kd
+        self.T_ref = T_ref
+        self.programa = programa
+        self.dt = _nucleo().dt if paso is None else paso
+        self.reiniciar()
+
+    def reiniciar(self, paso=None):
+        if paso is not None:
+            self.dt = paso
+        self.integral = 0.0
+        self.prev_error = 0.0
+
+    def inicial(self, medicion):
+        return 0.0, self.T_ref - medicion, 0.0, 0.0, 0.0
+
+    def paso(self, medicion):
+        e = self.T_ref - medicion
+        P = self.Kp * e if self.programa is None else self.Kp * self.programa.factor_escalar(e) * e
+        self.integral += e * self.dt
+        I = self.Ki * self.integral
+        D = self.Kd * ((e - self.prev_error) / self.dt)
+        self.prev_error = e
+        return P + I + D, e, P, I, D
+
+    def calcular(self, medicion):
+        return self.paso(medicion)[0]
+
+# Con fl_ajustar_controlador, Kp se ajusta según |e| con `programa` (por defecto
+# ProgramaGanancias.desde_cota(cota_error)), como en simulate_proportional_humidity;
+# Kp queda con la ganancia de la última muestra
+class ControladorProporcional:
+    __slots__ = ("Kp_c", "HR_ref", "ajustar", "programa", "Kp")
+    senales = ("output", "e", "P_term", "Kp_ajustado")
+
+    def __init__(self, Kp_c, HR_ref, fl_ajustar_controlador=False, cota_error=5, programa=None):
+        self.Kp_c = Kp_c
+        self.HR_ref = HR_ref
+        self.ajustar = fl_ajustar_controlador and Kp_c != 0
+        self.programa = programa
+        if self.ajustar and programa is None:
+            self.programa = _nucleo().ProgramaGanancias.desde_cota(cota_error)
+        self.reiniciar()
+
+    def reiniciar(self, paso=None):
+        self.Kp = self.Kp_c
+
+    def inicial(self, medicion):
+        return 0.0, self.HR_ref - medicion, 0.0, 0.0
+
+    def paso(self, medicion):
+        e = self.HR_ref - medicion
+        if self.ajustar:
+            self.Kp = self.Kp_c * self.programa.factor_escalar(e)
+        P = self.Kp * e
+        return P, e, P, self.Kp
+
+    def calcular(self, medicion):
+        return self.paso(medicion)[0]
+
+# --- Plantas ---
+# Interfaz: `y` es la salida actual, `ambiente` la entrada de perturbación (el motor la
+# cambia por tramos) y avanzar(u) aplica un paso con la actuación u y devuelve la nueva y.
+# Planta de primer orden tau dy/dt = K u - (y - ambiente) con un paso de Euler por muestra
+# (por defecto la planta de temperatura de nucleo)
+class PlantaPrimerOrden:
+    __slots__ = ("y", "ambiente", "K", "tau", "dt")
+
+    def __init__(self, y_inicial, ambiente, K_planta=None, tau_planta=None, paso=None):
+        nucleo = _nucleo()
+        self.y = y_inicial
+        self.ambiente = ambiente
+        self.K = nucleo.K if K_planta is None else K_planta
+        self.tau = nucleo.tau if tau_planta is None else tau_planta
+        self.dt = nucleo.dt if paso is None else paso
+
+    def reiniciar(self, y_inicial, paso=None):
+        self.y = float(y_inicial)
+        if paso is not None:
+            self.dt = paso
+
+    def avanzar(self, u):
+        self.y = self.y + (self.K * u - (self.y - self.ambiente)) / self.tau * self.dt
+        return self.y
+
+# --- Espacio de trabajo ---
+# Arreglos de salida (en `dtype`) y listas donde el motor escribe cada muestra, por
+# nombre; se reservan la primera vez y se reutilizan mientras no cambie el largo pedido.
+class EspacioTrabajo:
+    def __init__(self, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self._arreglos = {}
+        self._listas = {}
+
+    def arreglo(self, nombre, forma):
+        arreglo = self._arreglos.get(nombre)
+        if arreglo is None or arreglo.shape != forma:
+            arreglo = self._arreglos[nombre] = np.empty(forma, dtype=self.dtype)
+        return arreglo
+
+    def lista(self, nombre, n):
+        lista = self._listas.get(nombre)
+        if lista is None or len(lista) != n:
+            lista = self._listas[nombre] = [0.0] * n
+        return lista
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self._arreglos.values())
+
+# Un espacio por hilo y por nombre, para quien no pasa el suyo (los simuladores de
+# nucleo): la caché de las interfaces y el servicio simulan desde otros hilos
+_espacios = threading.local()
+
+def espacio_local(nombre):
+    espacios = _espacios.__dict__.setdefault("espacios", {})
+    if nombre not in espacios:
+        espacios[nombre] = EspacioTrabajo()
+    return espacios[nombre]
+
+# --- Motor ---
+# Señales que se pueden pedir: "y", "ambiente" y las de controlador.senales. Por defecto
+# se devuelven todas.
+class Motor:
+    def __init__(self, controlador, planta, senales=None, espacio=None):
+        self.controlador = controlador
+        self.planta = planta
+        disponibles = ("y", "ambiente") + tuple(controlador.senales)
+        self.senales = disponibles if senales is None else tuple(senales)
+        desconocidas = set(self.senales) - set(disponibles)
+        if desconocidas:
+            raise ValueError(f"Señales desconocidas: {', '.join(sorted(desconocidas))}")
+        self.espacio = EspacioTrabajo() if espacio is None else espacio
+
+    # Simula len(t) muestras desde y_inicial. El ambiente vale `ambiente` salvo en las
+    # muestras con inicio <= t <= fin de `perturbacion` = (inicio, fin, valor), donde vale
+    # `valor`. Devuelve {señal: arreglo de len(t)} con vistas al espacio de trabajo.
+    def correr(self, t, y_inicial, ambiente, perturbacion=None):
+        controlador, planta, espacio = self.controlador, self.planta, self.espacio
+        n = len(t)
+        # Los cálculos van en floats de Python: con escalares de NumPy cada operación es más lenta
+        paso = float(t[1] - t[0]) if n > 1 else None
+        controlador.reiniciar(paso)
+        planta.reiniciar(y_inicial, paso)
+
+        # Ventana de perturbación [p0, p1): las muestras con inicio <= t <= fin
+        p0 = p1 = 0
+        valor = ambiente
+        if perturbacion is not None:
+            inicio, fin, valor = perturbacion
+            p0 = int(np.searchsorted(t, inicio, side="left"))
+            p1 = max(int(np.searchsorted(t, fin, side="right")), p0)
+        # Tramos de ambiente constante a partir de la muestra 1
+        tramos = [(1, max(p0, 1), float(ambiente)), (max(p0, 1), max(p1, 1), float(valor)), (max(p1, 1), n, float(ambiente))]
+
+        # Cada muestra se escribe en listas del espacio: `y` y, si se pidió alguna señal
+        # del controlador, su tupla completa en `filas` (k valores por muestra)
+        del_controlador = [s for s in self.senales if s in controlador.senales]
+        k = len(controlador.senales)
+        Y = espacio.lista("y", n)
+        filas = espacio.lista("controlador", n * k) if del_controlador else None
+
+        # Muestra 0: condición inicial, sin actuación
+        y = planta.y
+        if n:
+            Y[0] = y
+            if filas is not None:
+                filas[:k] = controlador.inicial(y)
+
+        paso_controlador, avanzar = controlador.paso, planta.avanzar
+        j = k
+        for a, b, valor_tramo in tramos:
+            planta.ambiente = valor_tramo
+            if filas is None:
+                for i in range(a, b):
+                    y = avanzar(paso_controlador(y)[0])
+                    Y[i] = y
+            else:
+                for i in range(a, b):
+                    r = paso_controlador(y)
+                    y = avanzar(r[0])
+                    Y[i] = y
+                    filas[j:j + k] = r
+                    j += k
+
+        resultado = {}
+        if "y" in self.senales:
+            resultado["y"] = espacio.arreglo("y", (n,))
+            resultado["y"][:] = Y
+        if "ambiente" in self.senales:
+            resultado["ambiente"] = espacio.arreglo("ambiente", (n,))
+            resultado["ambiente"].fill(ambiente)
+            resultado["ambiente"][p0:p1] = valor
+        if filas is not None:
+            plano = espacio.arreglo("controlador", (n, k))
+            plano.reshape(-1)[:] = filas
+            for senal in del_controlador:
+                resultado[senal] = plano[:, controlador.senales.index(senal)]
+        return resultado
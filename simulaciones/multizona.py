@@ -0,0 +1,239 @@
+import numpy as np
+
+import nucleo
+
+# --- Planta multizona con acoplamiento disperso ---
+# Cada zona (por ejemplo la entrada de aire de un rack) sigue la misma planta de primer
+# orden que nucleo, más un intercambio de calor con sus vecinas:
+#
+#   dT_i/dt = (K_i u_i - (T_i - T_amb_i) + sum_j g_ij (T_j - T_i)) / tau_i
+#
+# El acoplamiento se guarda como una lista de aristas dirigidas (fila, columna, g): la
+# zona `fila` recibe g (T_columna - T_fila). Solo se guardan los g distintos de cero,
+# así que la memoria crece con la cantidad de acoples y no con zonas**2, y cada paso
+# cuesta O(zonas + acoples).
+
+# Aristas de una grilla de filas x columnas racks (numerados por fila) con conductancia
+# g entre vecinos horizontales y g_entre_filas entre vecinos verticales. Devuelve
+# (origen, destino, conductancia) con cada par una sola vez (ver acoplamiento()).
+def acoplamiento_grilla(filas, columnas, g, g_entre_filas=None):
+    g_entre_filas = g if g_entre_filas is None else g_entre_filas
+    indices = np.arange(filas * columnas).reshape(filas, columnas)
+    horizontales = (indices[:, :-1].ravel(), indices[:, 1:].ravel())
+    verticales = (indices[:-1, :].ravel(), indices[1:, :].ravel())
+    origen = np.concatenate([horizontales[0], verticales[0]])
+    destino = np.concatenate([horizontales[1], verticales[1]])
+    conductancia = np.concatenate([np.full(horizontales[0].size, float(g)), np.full(verticales[0].size, float(g_entre_filas))])
+    return origen, destino, conductancia
+
+# Normaliza el acoplamiento a aristas dirigidas (fila, columna, g). Acepta:
+#   None: zonas independientes
+#   (origen, destino, g): aristas no dirigidas; el calor fluye en los dos sentidos
+#   una matriz dispersa de scipy.sparse (o densa) G: la zona i recibe G[i, j] (T_j - T_i);
+#   la diagonal se ignora
+def acoplamiento(acople, n_zonas):
+    if acople is None:
+        vacio = np.zeros(0, dtype=np.intp)
+        return vacio, vacio, np.zeros(0)
+    if isinstance(acople, tuple):
+        origen, destino, g = (np.asarray(x) for x in acople)
+        g = np.broadcast_to(g, origen.shape).astype(float)
+        fila = np.concatenate([origen, destino]).astype(np.intp)
+        columna = np.concatenate([destino, origen]).astype(np.intp)
+        g = np.concatenate([g, g])
+    elif hasattr(acople, "tocoo"):
+        coo = acople.tocoo()
+        fila, columna, g = coo.row.astype(np.intp), coo.col.astype(np.intp), coo.data.astype(float)
+    else:
+        fila, columna = np.nonzero(np.asarray(acople))
+        g = np.asarray(acople, dtype=float)[fila, columna]
+    fuera_diagonal = (fila != columna) & (g != 0)
+    fila, columna, g = fila[fuera_diagonal], columna[fuera_diagonal], g[fuera_diagonal]
+    if fila.size and (fila.max() >= n_zonas or columna.max() >= n_zonas):
+        raise ValueError("El acoplamiento hace referencia a zonas inexistentes")
+    return fila, columna, g
+
+# Prepara la suma sum_j w_ij T_j de cada zona. Si los grados están parejos (el caso de
+# una sala de racks) se usa un formato ELL: una matriz (grado máximo, zonas) con los
+# índices de las vecinas, rellena con la propia zona y peso 0, que se recorre con un
+# gather y una suma sobre el eje corto. Si algún nodo concentra muchos acoples el ELL
+# desperdiciaría memoria y se usa np.bincount sobre las aristas.
+def _suma_vecinas(fila, columna, w, n_zonas):
+    if fila.size == 0:
+        return None
+    grados = np.bincount(fila, minlength=n_zonas)
+    grado_max = int(grados.max())
+    if grado_max * n_zonas > 4 * fila.size + n_zonas:
+        return lambda T: np.bincount(fila, weights=w * T[columna], minlength=n_zonas)
+
+    orden = np.argsort(fila, kind="stable")
+    fila, columna, w = fila[orden], columna[orden], w[orden]
+    posicion = np.arange(fila.size) - np.repeat(np.cumsum(grados) - grados, grados)
+    indices = np.tile(np.arange(n_zonas), (grado_max, 1))
+    pesos = np.zeros((grado_max, n_zonas))
+    indices[posicion, fila] = columna
+    pesos[posicion, fila] = w
+    return lambda T: (pesos * T[indices]).sum(axis=0)
+
+# --- Integración vectorizada sobre zonas ---
+# Núcleo común de los dos simuladores multizona. Un controlador por zona o, con `crac`
+# (arreglo zona -> unidad), uno por unidad CRAC que mide el promedio de sus zonas y
+# aplica la misma salida a todas. Con `ajustar`, Kp se multiplica por el factor de
+# `programa` (común o uno por controlador; por defecto desde_cota(cota_error), como en
+# simulate_proportional_humidity). Con horizonte/paso se simula en una grilla propia
+# (por defecto la de nucleo) y se registra una muestra cada `cada` pasos.
+def _integrar_multizona(n_zonas, Kp, Ki, Kd, ref, perturbation_start, perturbation_end, amb_perturb, fl_perturbacion,
+                        inicial, amb_base, acople, crac, K_planta, tau_planta, horizonte, paso, cada, senales,
+                        ajustar=False, cota_error=0.0, programa=None):
+    paso = nucleo.dt if paso is None else paso
+    horizonte = nucleo.t[-1] if horizonte is None else horizonte
+    n = int(round(horizonte / paso)) + 1
+
+    zonas = lambda x: np.array(np.broadcast_to(x, (n_zonas,)), dtype=float)
+    inicial = zonas(inicial)
+    amb_base = inicial if amb_base is None else zonas(amb_base)
+    fl_perturbacion = np.broadcast_to(fl_perturbacion, (n_zonas,))
+    amb_perturb = np.where(fl_perturbacion, zonas(amb_perturb), amb_base)
+    perturbation_start = np.where(fl_perturbacion, zonas(perturbation_start), 0)
+    perturbation_end = np.where(fl_perturbacion, zonas(perturbation_end), 0)
+    K_planta, tau_planta = zonas(K_planta), zonas(tau_planta)
+
+    fila, columna, g = acoplamiento(acople, n_zonas)
+
+    # Controladores: uno por zona o uno por unidad CRAC
+    if crac is None:
+        n_ctrl = n_zonas
+    else:
+        crac = np.asarray(crac, dtype=np.intp)
+        n_ctrl = int(crac.max()) + 1
+        zonas_por_crac = np.bincount(crac, minlength=n_ctrl)
+        if (zonas_por_crac == 0).any():
+            raise ValueError("Hay unidades CRAC sin zonas asignadas")
+    controles = lambda x: np.array(np.broadcast_to(x, (n_ctrl,)), dtype=float)
+    Kp, Ki, Kd, ref, cota_error = (controles(x) for x in (Kp, Ki, Kd, ref, cota_error))
+    ajustar = np.broadcast_to(ajustar, (n_ctrl,)) & (Kp != 0)
+    if ajustar.any():
+        if programa is None:
+            factor = nucleo.factor_por_cota(cota_error)
+        else:
+            factor = nucleo.factor_por_grupos(programa, n_ctrl)
+
+    def medir(T):
+        return T if crac is None else np.bincount(crac, weights=T, minlength=n_ctrl) / zonas_por_crac
+
+    # T_amb solo cambia en los bordes de la perturbación de alguna zona
+    def ambiente(tiempo):
+        return np.where((perturbation_start <= tiempo) & (tiempo <= perturbation_end), amb_perturb, amb_base)
+    # (se recalcula en un entorno de cada borde para no depender del redondeo de i * paso)
+    bordes = np.floor(np.concatenate([perturbation_start, perturbation_end])[np.tile(fl_perturbacion, 2)] / paso)
+    cambios = set((bordes[:, None] + np.arange(-1, 3)).astype(int).ravel().tolist())
+
+    n_reg = (n - 1) // cada + 1
+    tamanios = {"T": n_zonas, "T_amb_values": n_zonas, "output": n_ctrl, "e": n_ctrl}
+    desconocidas = set(senales) - set(tamanios)
+    if desconocidas:
+        raise ValueError(f"Señales desconocidas: {sorted(desconocidas)}")
+    registros = {nombre: np.empty((n_reg, tamanios[nombre])) for nombre in senales}
+
+    T = inicial.copy()
+    amb = ambiente(0.0)
+    e = ref - medir(T)
+    u = np.zeros(n_ctrl)
+    integral = np.zeros(n_ctrl)
+    prev_error = np.zeros(n_ctrl)
+    actuales = {"T": T, "T_amb_values": amb, "output": u, "e": e}
+    for nombre in senales:
+        registros[nombre][0] = actuales[nombre]
+
+    # Paso de Euler con los coeficientes agrupados:
+    #   T <- (1 - a (1 + grado)) T + b u + a T_amb + sum_j a_i g_ij T_j,  a = paso/tau, b = K a
+    a = paso / tau_planta
+    b = K_planta * a
+    retencion = 1 - a * (1 + np.bincount(fila, weights=g, minlength=n_zonas))
+    vecinas = _suma_vecinas(fila, columna, a[fila] * g, n_zonas)
+    a_amb = a * amb
+    Kd_paso = Kd / paso
+    Kp_d = Kp + Kd_paso
+    con_integral, con_derivativo = Ki.any(), Kd.any()
+
+    for i in range(1, n):
+        if i in cambios:
+            amb = ambiente(i * paso)
+            a_amb = a * amb
+
+        # Mismo orden que simulate_pid: el error usa la medición del paso anterior
+        e = ref - medir(T)
+        if ajustar.any():
+            u = (np.where(ajustar, Kp * factor(e), Kp) + Kd_paso) * e
+        else:
+            u = Kp_d * e
+        if con_integral:
+            integral += e * paso
+            u += Ki * integral
+        if con_derivativo:
+            u -= Kd_paso * prev_error
+            prev_error = e
+
+        u_zona = u if crac is None else u[crac]
+        T_nueva = retencion * T
+        T_nueva += b * u_zona
+        T_nueva += a_amb
+        if vecinas is not None:
+            T_nueva += vecinas(T)
+        T = T_nueva
+
+        if i % cada == 0:
+            actuales = {"T": T, "T_amb_values": amb, "output": u, "e": e}
+            for nombre in senales:
+                registros[nombre][i // cada] = actuales[nombre]
+
+    t_registro = np.arange(n_reg) * (cada * paso)
+    return t_registro, {nombre: valores.T for nombre, valores in registros.items()}
+
+# --- Simulación PID multizona ---
+# Mismos parámetros que simulate_pid_batch, pero cada uno es un escalar o un arreglo con
+# un valor por zona (Kp, Ki, Kd y T_ref: uno por unidad CRAC si se pasa `crac`). T_amb
+# es la temperatura ambiente base de cada zona (por defecto T_initial, como simulate_pid).
+# Devuelve (t_registro, señales), donde señales es un diccionario con arreglos de forma
+# (zonas o unidades CRAC, len(t_registro)) para cada nombre pedido en `senales`
+# ("T", "output", "e", "T_amb_values"). Con una zona y sin acoplamiento coincide con
+# simulate_pid en la misma grilla hasta el redondeo (salvo la regla de ganancias nulas
+# de la interfaz). `programa` (ProgramaGanancias, común o uno por controlador) ajusta Kp
+# según |e| como en simulate_pid.
+def simulate_pid_multizona(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial,
+                           acople=None, crac=None, n_zonas=None, T_amb=None, K_planta=None, tau_planta=None,
+                           horizonte=None, paso=None, cada=1, senales=("T", "output"), programa=None):
+    n_zonas = _cantidad_zonas(n_zonas, crac, T_initial, T_amb_perturb, perturbation_start, perturbation_end, fl_perturbacion,
+                              T_amb, K_planta, tau_planta, Kp, Ki, Kd, T_ref)
+    return _integrar_multizona(n_zonas, Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion,
+                               T_initial, T_amb, acople, crac,
+                               nucleo.K if K_planta is None else K_planta, nucleo.tau if tau_planta is None else tau_planta,
+                               horizonte, paso, cada, senales, ajustar=programa is not None, programa=programa)
+
+# --- Simulación de humedad multizona con control P ---
+# Igual que simulate_pid_multizona pero con el controlador proporcional (y el ajuste
+# opcional de Kp por cota de error o por `programa`) de simulate_proportional_humidity.
+def simulate_proportional_humidity_multizona(Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb,
+                                             fl_perturbacion, fl_ajustar_controlador, cota_error,
+                                             acople=None, crac=None, n_zonas=None, HR_amb=None, K_planta=None, tau_planta=None,
+                                             horizonte=None, paso=None, cada=1, senales=("HR", "output"), programa=None):
+    n_zonas = _cantidad_zonas(n_zonas, crac, HR_inicial, HR_amb_perturb, perturbation_start, perturbation_end, fl_perturbacion,
+                              HR_amb, K_planta, tau_planta, Kp_c, HR_ref, fl_ajustar_controlador, cota_error)
+    nombres = {"HR": "T", "HR_amb_values": "T_amb_values"}
+    t_registro, registros = _integrar_multizona(
+        n_zonas, Kp_c, 0.0, 0.0, HR_ref, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion,
+        HR_inicial, HR_amb, acople, crac,
+        nucleo.K_hum if K_planta is None else K_planta, nucleo.tau_hum if tau_planta is None else tau_planta,
+        horizonte, paso, cada, [nombres.get(s, s) for s in senales], fl_ajustar_controlador, cota_error, programa)
+    return t_registro, {s: registros[nombres.get(s, s)] for s in senales}
+
+# La cantidad de zonas sale de n_zonas, de `crac` o del primer parámetro por zona que sea arreglo
+def _cantidad_zonas(n_zonas, crac, *por_zona):
+    if n_zonas is not None:
+        return int(n_zonas)
+    if crac is not None:
+        return len(crac)
+    for valor in por_zona:
+        if np.ndim(valor):
+            return np.size(valor)
+    return 1
@@ -0,0 +1,632 @@
+from bisect import bisect_left
+
+import numpy as np
+
+from metricas import fuera_de_banda, intervalos_fuera_de_banda, franjas_fuera_de_banda, metricas_control
+from motor import Motor, EspacioTrabajo, ControladorPID, ControladorProporcional, PlantaPrimerOrden, espacio_local
+
+# Núcleo de simulación sin interfaz: solo depende de NumPy, así que se puede importar
+# desde scripts, procesos de trabajo o servicios sin cargar plotly ni ipywidgets.
+# Las interfaces interactivas (simulacion_temperatura.py y simulacion_humedad.py) se
+# construyen sobre este módulo.
+
+# --- Parámetros del sistema (modelo de planta de primer orden) ---
+K = 1.0       # Ganancia
+tau = 10.0    # Constante de tiempo del sistema
+
+# --- Parámetros del sistema (modelo de planta de primer orden para humedad) ---
+K_hum = 1.0        # Ganancia del sistema de humedad
+tau_hum = 10.0     # Constante de tiempo del sistema de humedad
+HR_amb_base = 60 # Humedad ambiente base (%)
+
+# --- Configuración inicial de la simulación ---
+t = np.linspace(0, 100, 1000)
+dt = t[1] - t[0]
+
+# Cambia el horizonte (s) y la cantidad de muestras de todas las simulaciones. Reasigna
+# t y dt, así que quien los use fuera de este módulo tiene que leerlos como nucleo.t y
+# nucleo.dt en cada uso (un `from nucleo import t` se queda con la grilla anterior).
+def configurar_tiempo(horizonte, muestras):
+    global t, dt
+    t = np.linspace(0, horizonte, muestras)
+    dt = t[1] - t[0]
+
+# Grilla de tiempo actual (inicio, fin, muestras), para agregarla a las claves de cache:
+# después de configurar_tiempo no se sirven resultados calculados con la anterior
+def grilla_actual():
+    return (float(t[0]), float(t[-1]), len(t))
+
+# --- Programación de ganancia (gain scheduling) ---
+# Tabla que da el factor por el que se multiplica Kp según |e|. Escalonada: `bordes`
+# crecientes y un factor más que bordes; el factor k se usa cuando
+# bordes[k-1] < |e| <= bordes[k]. Con interpolar=True, `factores` tiene uno por borde y
+# se interpola linealmente entre ellos (constante fuera del rango). La búsqueda es
+# binaria (np.searchsorted / bisect), sin una rama por nivel en cada paso.
+class ProgramaGanancias:
+    def __init__(self, bordes, factores, interpolar=False):
+        self.bordes = np.array(bordes, dtype=float)
+        self.factores = np.array(factores, dtype=float)
+        self.interpolar = interpolar
+        if np.any(np.diff(self.bordes) < 0):
+            raise ValueError("Los bordes del programa de ganancia deben ser crecientes")
+        if len(self.factores) != len(self.bordes) + (0 if interpolar else 1):
+            raise ValueError("Se necesita un factor por borde (interpolado) o uno más que bordes (escalonado)")
+        self._bordes = self.bordes.tolist()
+        self._factores = self.factores.tolist()
+        self._hash = hash(self._clave())
+
+    # Tabla de simulate_proportional_humidity: 6x dentro de cota_error/5, 5x dentro de
+    # 2*cota_error/5, ..., 1x fuera de cota_error
+    @classmethod
+    def desde_cota(cls, cota_error, factores=(6, 5, 4, 3, 2, 1)):
+        lvl_e = cota_error / 5
+        return cls([lvl_e * k for k in range(1, 6)], factores)
+
+    # Factor para un arreglo de errores de cualquier forma
+    def factor(self, e):
+        abs_e = np.abs(e)
+        if self.interpolar:
+            return np.interp(abs_e, self.bordes, self.factores)
+        return self.factores[np.searchsorted(self.bordes, abs_e)]
+
+    # Factor para un error escalar (más rápido que factor() dentro de un bucle de Python)
+    def factor_escalar(self, e):
+        abs_e = abs(e)
+        k = bisect_left(self._bordes, abs_e) if abs_e == abs_e else len(self._bordes)   # NaN: último tramo
+        if not self.interpolar:
+            return self._factores[k]
+        if k == 0:
+            return self._factores[0]
+        if k == len(self._bordes):
+            return self._factores[-1]
+        b0, b1 = self._bordes[k - 1], self._bordes[k]
+        f0, f1 = self._factores[k - 1], self._factores[k]
+        return f0 + (f1 - f0) * (abs_e - b0) / (b1 - b0)
+
+    def _clave(self):
+        return tuple(self._bordes), tuple(self._factores), self.interpolar
+
+    def __eq__(self, otro):
+        return isinstance(otro, ProgramaGanancias) and self._clave() == otro._clave()
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f"ProgramaGanancias({self._bordes}, {self._factores}, interpolar={self.interpolar})"
+
+# Factor de ganancia por escenario para un lote: `programas` es un ProgramaGanancias
+# (común a todos) o uno por escenario. Los escenarios con el mismo programa se agrupan
+# una vez y en cada paso se hace una búsqueda por grupo.
+def factor_por_grupos(programas, lote):
+    if isinstance(programas, ProgramaGanancias):
+        return programas.factor
+    grupos = {}
+    for i, programa in enumerate(programas):
+        grupos.setdefault(programa, []).append(i)
+    if len(grupos) == 1:
+        return next(iter(grupos)).factor
+    # Con muchas tablas escalonadas distintas (p. ej. una cota_error por escenario) se
+    # apilan los bordes y se cuenta cuántos supera cada error
+    if len(grupos) > 8 and not any(p.interpolar for p in grupos) and len({len(p._bordes) for p in grupos}) == 1:
+        bordes = np.array([p.bordes for p in programas]).T.copy()
+        factores = np.array([p.factores for p in programas])
+        filas = np.arange(lote)
+
+        def factor_apilado(e):
+            abs_e = np.abs(e)
+            superados = np.zeros(lote, dtype=np.intp)
+            for borde in bordes:
+                superados += ~(abs_e <= borde)
+            return factores[filas, superados]
+        return factor_apilado
+    grupos = [(programa, np.array(indices)) for programa, indices in grupos.items()]
+
+    def factor(e):
+        f = np.empty(lote)
+        for programa, indices in grupos:
+            f[indices] = programa.factor(e[indices])
+        return f
+    return factor
+
+# Lo mismo que factor_por_grupos con ProgramaGanancias.desde_cota(c) para cada cota del
+# lote, sin crear un programa por escenario cuando hay muchas cotas distintas.
+def factor_por_cota(cota_error):
+    cota_error = np.asarray(cota_error, dtype=float)
+    unicas = np.unique(cota_error)
+    if len(unicas) <= 8:
+        por_cota = {c: ProgramaGanancias.desde_cota(c) for c in unicas.tolist()}
+        return factor_por_grupos([por_cota[c] for c in cota_error.tolist()], len(cota_error))
+    lvl_e = cota_error / 5
+    bordes = [lvl_e * k for k in range(1, 6)]
+    factores = ProgramaGanancias.desde_cota(1.0).factores
+
+    def factor(e):
+        abs_e = np.abs(e)
+        superados = np.zeros(len(cota_error), dtype=np.intp)
+        for borde in bordes:
+            superados += ~(abs_e <= borde)
+        return factores[superados]
+    return factor
+
+# --- Propagación exacta de un sistema afín discreto ---
+# Devuelve los estados M z0, M^2 z0, ..., M^pasos z0 (z en coordenadas homogéneas).
+# Cada iteración duplica la cantidad de estados calculados, por lo que el costo en
+# Python crece con log2(pasos) y no con la cantidad de muestras.
+def _propagar_afin(M, z0, pasos):
+    Z = (M @ z0)[None, :]
+    potencia = M
+    while len(Z) < pasos:
+        Z = np.concatenate((Z, Z @ potencia.T))
+        potencia = potencia @ potencia
+    return Z[:pasos]
+
+# --- Lazo PID como sistema LTI discreto por tramos ---
+# Con el paso de Euler, el estado (T, integral, error previo) evoluciona como
+# x[i] = A x[i-1] + b, donde b solo cambia cuando cambia T_amb. Se propaga tramo a
+# tramo entre los bordes de la perturbación. Devuelve los estados de cada paso.
+def _propagar_lazo_pid(Kp, Ki, Kd, T_ref, T_amb_values, T_initial):
+    c = dt / tau
+    g = Kp + Ki * dt + Kd / dt
+    M = np.zeros((4, 4))
+    M[:3, :3] = [[1 - c - c * K * g, c * K * Ki, -c * K * Kd / dt],
+                 [-dt, 1.0, 0.0],
+                 [-1.0, 0.0, 0.0]]
+    M[3, 3] = 1.0
+
+    X = np.zeros((len(t), 3))
+    X[0] = (T_initial, 0.0, 0.0)
+
+    bordes = list(np.flatnonzero(np.diff(T_amb_values[1:])) + 2)
+    for inicio, fin in zip([1] + bordes, bordes + [len(t)]):
+        M[:3, 3] = (c * K * g * T_ref + c * T_amb_values[inicio], dt * T_ref, T_ref)
+        X[inicio:fin] = _propagar_afin(M, np.append(X[inicio - 1], 1.0), fin - inicio)[:, :3]
+    return X
+
+# --- Función de simulación PID ---
+# metodo="euler" integra paso a paso (referencia) con motor.Motor. metodo="lti" resuelve
+# el mismo lazo discreto de forma cerrada por tramos; coincide con Euler hasta el redondeo
+# (diferencia relativa < 1e-9 en lazos estables). Con `programa` (ProgramaGanancias)
+# Kp se multiplica en cada paso por el factor que corresponde a |e|; el lazo deja de
+# ser lineal y se usa Euler.
+# Con `espacio` (motor.EspacioTrabajo, por ejemplo en float32) Euler escribe en sus
+# arreglos en lugar de reservar nuevos: los resultados son vistas que la llamada siguiente
+# con el mismo espacio sobrescribe. `senales` elige qué salidas registrar por nombre
+# ("T", "P_term", "I_term", "D_term", "output", "T_amb_values", "e"); las demás vuelven
+# como None.
+_senales_pid = {"T": "y", "P_term": "P_term", "I_term": "I_term", "D_term": "D_term", "output": "output",
+                "T_amb_values": "ambiente", "e": "e"}
+
+def simulate_pid(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial, metodo="euler", programa=None,
+                 espacio=None, senales=None):
+    T_amb_base=T_initial
+
+    if Kp==Ki==Kd==0:
+        T_ref=T_initial
+
+    if not fl_perturbacion:
+        T_amb_perturb = T_amb_base
+        perturbation_start = 0
+        perturbation_end = 0        
+
+    if metodo == "lti" and programa is None:
+        T = np.zeros_like(t)
+        e = np.zeros_like(t)
+        P_term = np.zeros_like(t)
+        I_term = np.zeros_like(t)
+        D_term = np.zeros_like(t)
+        output = np.zeros_like(t)
+        T_amb_values = np.zeros_like(t)
+        T_amb_values[:] = np.where((perturbation_start <= t) & (t <= perturbation_end), T_amb_perturb, T_amb_base)
+        X = _propagar_lazo_pid(Kp, Ki, Kd, T_ref, T_amb_values, T_initial)
+        T[:] = X[:, 0]
+        e[0] = T_ref - T_initial
+        e[1:] = X[1:, 2]
+        P_term[1:] = Kp * e[1:]
+        I_term[1:] = Ki * X[1:, 1]
+        D_term[1:] = Kd * (np.diff(X[:, 2]) / dt)
+        output[1:] = P_term[1:] + I_term[1:] + D_term[1:]
+        return T, P_term, I_term, D_term, output, T_amb_values, e
+
+    return _correr_motor("pid", ControladorPID(Kp, Ki, Kd, T_ref, programa=programa), PlantaPrimerOrden(T_initial, T_amb_base, K, tau),
+                         _senales_pid, senales, espacio, (perturbation_start, perturbation_end, T_amb_perturb))
+
+# Corre el motor y devuelve las señales en el orden de `nombres` (None las no pedidas).
+# Sin `espacio` se usa el del hilo para este simulador (motor.espacio_local) y se
+# devuelven copias: la memoria de trabajo se reutiliza entre llamadas, pero los arreglos
+# devueltos son de quien llama (la caché de las interfaces los guarda).
+def _correr_motor(nombre, controlador, planta, nombres, senales, espacio, perturbacion):
+    propio = espacio is None
+    motor = Motor(controlador, planta, None if senales is None else [nombres[s] for s in senales],
+                  espacio_local(nombre) if propio else espacio)
+    resultado = motor.correr(t, planta.y, planta.ambiente, perturbacion)
+    valores = (resultado.get(s) for s in nombres.values())
+    return tuple(v.copy() if propio and v is not None else v for v in valores)
+
+# --- Función de simulación PID por lotes (vectorizada) ---
+# Recibe los mismos parámetros que simulate_pid, pero cada uno puede ser un escalar
+# o un arreglo 1D (se combinan por broadcasting). Todos los escenarios avanzan juntos
+# en el tiempo, de modo que el costo del bucle en Python se paga una vez por barrido.
+# K_planta y tau_planta permiten variar la planta por escenario (por defecto K y tau).
+# `programa` es un ProgramaGanancias común o una secuencia con uno por escenario.
+# Devuelve arreglos de forma (lote, len(t)) en el mismo orden que simulate_pid.
+def simulate_pid_batch(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial, K_planta=None, tau_planta=None, programa=None):
+    K_planta = K if K_planta is None else K_planta
+    tau_planta = tau if tau_planta is None else tau_planta
+    Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial, K_planta, tau_planta = (
+        np.array(p).reshape(-1) for p in np.broadcast_arrays(
+            Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial, K_planta, tau_planta))
+    n = len(t)
+    lote = Kp.size
+
+    # Internamente se guarda (tiempo, lote) para que cada paso escriba una fila contigua
+    T = np.zeros((n, lote))
+    e = np.zeros((n, lote))
+    output = np.zeros((n, lote))
+
+    P_term = np.zeros((n, lote))
+    I_term = np.zeros((n, lote))
+    D_term = np.zeros((n, lote))
+
+    integral = np.zeros(lote)
+    prev_error = np.zeros(lote)
+
+    T_amb_base = T_initial
+
+    # Mismas reglas que simulate_pid, aplicadas escenario por escenario
+    T_ref = np.where((Kp == 0) & (Ki == 0) & (Kd == 0), T_initial, T_ref)
+
+    T_amb_perturb = np.where(fl_perturbacion, T_amb_perturb, T_amb_base)
+    perturbation_start = np.where(fl_perturbacion, perturbation_start, 0)
+    perturbation_end = np.where(fl_perturbacion, perturbation_end, 0)
+
+    en_perturbacion = (perturbation_start <= t[:, None]) & (t[:, None] <= perturbation_end)
+    T_amb_values = np.where(en_perturbacion, T_amb_perturb, T_amb_base)
+
+    factor = None if programa is None else factor_por_grupos(programa, lote)
+
+    T[0] = T_initial
+    e[0] = T_ref - T[0]
+
+    for i in range(1, n):
+        e[i] = T_ref - T[i-1]
+
+        if factor is None:
+            P_term[i] = Kp * e[i]
+        else:
+            P_term[i] = Kp * factor(e[i]) * e[i]
+        integral += e[i] * dt
+        I_term[i] = Ki * integral
+        derivativo = (e[i] - prev_error) / dt
+        D_term[i] = Kd * derivativo
+
+        output[i] = P_term[i] + I_term[i] + D_term[i]
+
+        dTdt = (K_planta * output[i] - (T[i-1] - T_amb_values[i])) / tau_planta
+        T[i] = T[i-1] + dTdt * dt
+
+        prev_error = e[i]
+
+    return T.T, P_term.T, I_term.T, D_term.T, output.T, T_amb_values.T, e.T
+
+# --- Simulación paso a paso (memoria constante) ---
+# Guarda solo el estado del controlador y de la planta, así que sirve para horizontes
+# arbitrariamente largos o para alimentarlo con mediciones en vivo. La muestra 0 es la
+# condición inicial y cada muestra siguiente aplica un paso de Euler, igual que
+# simulate_pid. T_ref y T_amb se pueden cambiar entre pasos (o por muestra en bloque()).
+# Con `programa` (ProgramaGanancias) Kp se ajusta según |e| como en simulate_pid.
+class SimuladorPID:
+    def __init__(self, Kp, Ki, Kd, T_ref, T_initial, T_amb=None, paso=None, programa=None):
+        self.Kp, self.Ki, self.Kd = Kp, Ki, Kd
+        # Misma regla que simulate_pid: sin ganancias no hay control
+        self.T_ref = T_initial if Kp == Ki == Kd == 0 else T_ref
+        self.T_amb = T_initial if T_amb is None else T_amb
+        self.programa = programa
+        self.dt = dt if paso is None else paso
+        self.K, self.tau = K, tau
+        self.T = T_initial
+        self.integral = 0.0
+        self.prev_error = 0.0
+        self.i = 0
+
+    @property
+    def tiempo(self):
+        return self.i * self.dt
+
+    # Avanza una muestra y devuelve (T, P, I, D, output, T_amb, e) como simulate_pid
+    def paso(self):
+        e = self.T_ref - self.T
+        if self.i == 0:
+            self.i = 1
+            return self.T, 0.0, 0.0, 0.0, 0.0, self.T_amb, e
+        P = self.Kp * e if self.programa is None else self.Kp * self.programa.factor_escalar(e) * e
+        self.integral += e * self.dt
+        I = self.Ki * self.integral
+        D = self.Kd * ((e - self.prev_error) / self.dt)
+        u = P + I + D
+        self.T = self.T + (self.K * u - (self.T - self.T_amb)) / self.tau * self.dt
+        self.prev_error = e
+        self.i += 1
+        return self.T, P, I, D, u, self.T_amb, e
+
+    # Avanza n muestras y devuelve arreglos de longitud n en el orden de simulate_pid.
+    # T_amb y T_ref pueden ser arreglos de longitud n con un valor por muestra.
+    def bloque(self, n, T_amb=None, T_ref=None):
+        T_amb = np.broadcast_to(self.T_amb if T_amb is None else T_amb, (n,))
+        T_ref = np.broadcast_to(self.T_ref if T_ref is None else T_ref, (n,))
+        T, e = [0.0] * n, [0.0] * n
+        P_term, I_term, D_term, output = [0.0] * n, [0.0] * n, [0.0] * n, [0.0] * n
+
+        # El bucle corre sobre floats de Python (mismo resultado que con arreglos)
+        Kp, Ki, Kd, K_p, tau_p, paso, programa = self.Kp, self.Ki, self.Kd, self.K, self.tau, self.dt, self.programa
+        T_act, integral, prev_error = float(self.T), self.integral, self.prev_error
+        amb, ref = T_amb.tolist(), T_ref.tolist()
+        for j in range(n):
+            e_j = ref[j] - T_act
+            e[j] = e_j
+            if self.i + j == 0:
+                T[j] = T_act
+                continue
+            P = Kp * e_j if programa is None else Kp * programa.factor_escalar(e_j) * e_j
+            integral += e_j * paso
+            I = Ki * integral
+            D = Kd * ((e_j - prev_error) / paso)
+            u = P + I + D
+            P_term[j], I_term[j], D_term[j], output[j] = P, I, D, u
+            T_act = T_act + (K_p * u - (T_act - amb[j])) / tau_p * paso
+            T[j] = T_act
+            prev_error = e_j
+
+        self.T, self.integral, self.prev_error = T_act, integral, prev_error
+        self.i += n
+        if n:
+            self.T_amb, self.T_ref = float(amb[-1]), float(ref[-1])
+        return (np.array(T), np.array(P_term), np.array(I_term), np.array(D_term), np.array(output),
+                np.array(T_amb, dtype=float), np.array(e))
+
+    # Generador de bloques de tamaño fijo (sin fin)
+    def bloques(self, n):
+        while True:
+            yield self.bloque(n)
+
+    def __iter__(self):
+        while True:
+            yield self.paso()
+
+    # Estado completo para guardar y retomar la simulación
+    def estado(self):
+        return dict(Kp=self.Kp, Ki=self.Ki, Kd=self.Kd, T_ref=self.T_ref, T_amb=self.T_amb, paso=self.dt, programa=self.programa,
+                    K=self.K, tau=self.tau, T=self.T, integral=self.integral, prev_error=self.prev_error, i=self.i)
+
+    @classmethod
+    def desde_estado(cls, estado):
+        sim = cls(estado["Kp"], estado["Ki"], estado["Kd"], estado["T_ref"], estado["T"], estado["T_amb"], estado["paso"],
+                  estado.get("programa"))
+        sim.T_ref = estado["T_ref"]
+        sim.K, sim.tau = estado["K"], estado["tau"]
+        sim.integral, sim.prev_error, sim.i = estado["integral"], estado["prev_error"], estado["i"]
+        return sim
+
+# --- Lazo proporcional como sistema LTI discreto por tramos ---
+# Con Kp fijo y el paso de Euler, HR[i] = a HR[i-1] + b, donde b solo cambia cuando
+# cambia HR_amb. Se propaga tramo a tramo entre los bordes de la perturbación.
+def _propagar_lazo_proporcional(Kp, HR_ref, HR_amb_values, HR_inicial):
+    c = dt / tau_hum
+    M = np.array([[1 - c - c * K_hum * Kp, 0.0],
+                  [0.0, 1.0]])
+
+    HR = np.zeros_like(t)
+    HR[0] = HR_inicial
+
+    bordes = list(np.flatnonzero(np.diff(HR_amb_values[1:])) + 2)
+    for inicio, fin in zip([1] + bordes, bordes + [len(t)]):
+        M[0, 1] = c * K_hum * Kp * HR_ref + c * HR_amb_values[inicio]
+        HR[inicio:fin] = _propagar_afin(M, np.array([HR[inicio - 1], 1.0]), fin - inicio)[:, 0]
+    return HR
+
+# --- Función de simulación del controlador Proporcional (P) para humedad ---
+# metodo="euler" integra paso a paso (referencia) con motor.Motor. metodo="lti" resuelve
+# el mismo lazo discreto de forma cerrada por tramos; coincide con Euler hasta el redondeo
+# (diferencia relativa < 1e-9 en lazos estables). Con el ajuste del controlador
+# activo la ganancia depende del error y el lazo deja de ser lineal, así que se usa Euler.
+# El ajuste usa `programa` (ProgramaGanancias) o, si no se pasa, la tabla escalonada
+# de ProgramaGanancias.desde_cota(cota_error).
+# `espacio` y `senales` funcionan como en simulate_pid, con los nombres "HR", "P_term",
+# "output", "HR_amb_values", "e" y "Kp_ajustado".
+_senales_humedad = {"HR": "y", "P_term": "P_term", "output": "output", "HR_amb_values": "ambiente", "e": "e",
+                    "Kp_ajustado": "Kp_ajustado"}
+
+def simulate_proportional_humidity(Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion,fl_ajustar_controlador,cota_error,metodo="euler",programa=None,
+                                   espacio=None, senales=None):
+    Kp=Kp_c
+    HR_amb_base = HR_inicial
+    if Kp==0:
+        HR_ref=HR_inicial
+    
+    # Si la perturbación no está habilitada
+    if not fl_perturbacion:
+        HR_amb_perturb = HR_amb_base # La perturbación de humedad es la base
+        # Set perturbation range to effectively zero duration
+        perturbation_start = 0
+        perturbation_end = 0       
+
+    ajustar = fl_ajustar_controlador and Kp!=0
+    if ajustar and programa is None:
+        programa = ProgramaGanancias.desde_cota(cota_error)
+
+    if metodo == "lti" and not ajustar:
+        e = np.zeros_like(t)
+        P_term = np.zeros_like(t)
+        Kp_ajustado = np.zeros_like(t)
+        HR_amb_values = np.zeros_like(t)
+        HR_amb_values[:] = np.where((perturbation_start <= t) & (t <= perturbation_end), HR_amb_perturb, HR_amb_base)
+        HR = _propagar_lazo_proporcional(Kp, HR_ref, HR_amb_values, HR_inicial)
+        e[0] = HR_ref - HR[0]
+        e[1:] = HR_ref - HR[:-1]
+        Kp_ajustado[1:] = Kp
+        P_term[1:] = Kp * e[1:]
+        return HR, P_term, P_term.copy(), HR_amb_values, e, Kp_ajustado
+
+    return _correr_motor("humedad", ControladorProporcional(Kp, HR_ref, ajustar, programa=programa),
+                         PlantaPrimerOrden(HR_inicial, HR_amb_base, K_hum, tau_hum),
+                         _senales_humedad, senales, espacio, (perturbation_start, perturbation_end, HR_amb_perturb))
+
+# --- Función de simulación del controlador P por lotes (vectorizada) ---
+# Recibe los mismos parámetros que simulate_proportional_humidity, pero cada uno puede
+# ser un escalar o un arreglo 1D (se combinan por broadcasting). K_planta y tau_planta
+# permiten variar la planta por escenario (por defecto K_hum y tau_hum). `programa` es
+# un ProgramaGanancias común o uno por escenario; por defecto se arma uno por escenario
+# con desde_cota(cota_error).
+# Devuelve arreglos de forma (lote, len(t)) en el mismo orden que la versión escalar.
+def simulate_proportional_humidity_batch(Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion, fl_ajustar_controlador, cota_error, K_planta=None, tau_planta=None, programa=None):
+    K_planta = K_hum if K_planta is None else K_planta
+    tau_planta = tau_hum if tau_planta is None else tau_planta
+    Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion, fl_ajustar_controlador, cota_error, K_planta, tau_planta = (
+        np.array(p).reshape(-1) for p in np.broadcast_arrays(
+            Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion, fl_ajustar_controlador, cota_error, K_planta, tau_planta))
+    n = len(t)
+    lote = Kp_c.size
+
+    # Internamente se guarda (tiempo, lote) para que cada paso escriba una fila contigua
+    HR = np.zeros((n, lote))
+    e = np.zeros((n, lote))
+    output = np.zeros((n, lote))
+
+    P_term = np.zeros((n, lote))
+    Kp_ajustado = np.zeros((n, lote))
+    HR_amb_base = HR_inicial
+
+    # Mismas reglas que simulate_proportional_humidity, aplicadas escenario por escenario
+    HR_ref = np.where(Kp_c == 0, HR_inicial, HR_ref)
+
+    HR_amb_perturb = np.where(fl_perturbacion, HR_amb_perturb, HR_amb_base)
+    perturbation_start = np.where(fl_perturbacion, perturbation_start, 0)
+    perturbation_end = np.where(fl_perturbacion, perturbation_end, 0)
+
+    en_perturbacion = (perturbation_start <= t[:, None]) & (t[:, None] <= perturbation_end)
+    HR_amb_values = np.where(en_perturbacion, HR_amb_perturb, HR_amb_base)
+
+    ajustar = fl_ajustar_controlador & (Kp_c != 0)
+    if ajustar.any():
+        if programa is None:
+            factor = factor_por_cota(cota_error)
+        else:
+            factor = factor_por_grupos(programa, lote)
+
+    HR[0] = HR_inicial
+    e[0] = HR_ref - HR[0]
+
+    for i in range(1, n):
+        e[i] = HR_ref - HR[i-1]
+
+        # Ajuste del controlador según el programa de ganancia de cada escenario
+        if ajustar.any():
+            Kp = np.where(ajustar, Kp_c * factor(e[i]), Kp_c)
+        else:
+            Kp = Kp_c
+
+        Kp_ajustado[i] = Kp
+
+        P_term[i] = Kp * e[i]
+        output[i] = P_term[i]
+
+        dHRdt = (K_planta * output[i] - (HR[i-1] - HR_amb_values[i])) / tau_planta
+        HR[i] = HR[i-1] + dHRdt * dt
+
+    return HR.T, P_term.T, output.T, HR_amb_values.T, e.T, Kp_ajustado.T
+
+# --- Simulación paso a paso (memoria constante) ---
+# Guarda solo el estado del controlador y de la planta, así que sirve para horizontes
+# arbitrariamente largos o para alimentarlo con mediciones en vivo. La muestra 0 es la
+# condición inicial y cada muestra siguiente aplica un paso de Euler, igual que
+# simulate_proportional_humidity. HR_ref y HR_amb se pueden cambiar entre pasos (o por
+# muestra en bloque()). `programa` reemplaza la tabla de ajuste armada con cota_error.
+class SimuladorHumedad:
+    def __init__(self, Kp_c, HR_ref, HR_inicial, HR_amb=None, fl_ajustar_controlador=False, cota_error=5, paso=None, programa=None):
+        self.Kp_c = Kp_c
+        # Misma regla que simulate_proportional_humidity: sin ganancia no hay control
+        self.HR_ref = HR_inicial if Kp_c == 0 else HR_ref
+        self.HR_amb = HR_inicial if HR_amb is None else HR_amb
+        self.fl_ajustar_controlador = fl_ajustar_controlador
+        self.cota_error = cota_error
+        self.programa = ProgramaGanancias.desde_cota(cota_error) if programa is None else programa
+        self.dt = dt if paso is None else paso
+        self.K, self.tau = K_hum, tau_hum
+        self.HR = HR_inicial
+        self.Kp = Kp_c
+        self.i = 0
+
+    @property
+    def tiempo(self):
+        return self.i * self.dt
+
+    # Ganancia del controlador según el error (ver simulate_proportional_humidity)
+    def _ganancia(self, e):
+        if not (self.fl_ajustar_controlador and self.Kp_c != 0):
+            return self.Kp
+        return self.Kp_c * self.programa.factor_escalar(e)
+
+    # Avanza una muestra y devuelve (HR, P, output, HR_amb, e, Kp) como la versión por arreglos
+    def paso(self):
+        e = self.HR_ref - self.HR
+        if self.i == 0:
+            self.i = 1
+            return self.HR, 0.0, 0.0, self.HR_amb, e, 0.0
+        self.Kp = self._ganancia(e)
+        P = self.Kp * e
+        self.HR = self.HR + (self.K * P - (self.HR - self.HR_amb)) / self.tau * self.dt
+        self.i += 1
+        return self.HR, P, P, self.HR_amb, e, self.Kp
+
+    # Avanza n muestras y devuelve arreglos de longitud n en el orden de
+    # simulate_proportional_humidity. HR_amb y HR_ref pueden ser arreglos de longitud n.
+    def bloque(self, n, HR_amb=None, HR_ref=None):
+        HR_amb = np.broadcast_to(self.HR_amb if HR_amb is None else HR_amb, (n,))
+        HR_ref = np.broadcast_to(self.HR_ref if HR_ref is None else HR_ref, (n,))
+        HR, e, P_term, Kp_ajustado = [0.0] * n, [0.0] * n, [0.0] * n, [0.0] * n
+
+        K_p, tau_p, paso = self.K, self.tau, self.dt
+        HR_act = float(self.HR)
+        amb, ref = HR_amb.tolist(), HR_ref.tolist()
+        for j in range(n):
+            e_j = ref[j] - HR_act
+            e[j] = e_j
+            if self.i + j == 0:
+                HR[j] = HR_act
+                continue
+            self.Kp = self._ganancia(e_j)
+            Kp_ajustado[j] = self.Kp
+            P = self.Kp * e_j
+            P_term[j] = P
+            HR_act = HR_act + (K_p * P - (HR_act - amb[j])) / tau_p * paso
+            HR[j] = HR_act
+
+        self.HR = HR_act
+        self.i += n
+        if n:
+            self.HR_amb, self.HR_ref = float(amb[-1]), float(ref[-1])
+        P_term = np.array(P_term)
+        return np.array(HR), P_term, P_term.copy(), np.array(HR_amb, dtype=float), np.array(e), np.array(Kp_ajustado, dtype=float)
+
+    # Generador de bloques de tamaño fijo (sin fin)
+    def bloques(self, n):
+        while True:
+            yield self.bloque(n)
+
+    def __iter__(self):
+        while True:
+            yield self.paso()
+
+    # Estado completo para guardar y retomar la simulación
+    def estado(self):
+        return dict(Kp_c=self.Kp_c, HR_ref=self.HR_ref, HR_amb=self.HR_amb, fl_ajustar_controlador=self.fl_ajustar_controlador,
+                    cota_error=self.cota_error, programa=self.programa, paso=self.dt, K=self.K, tau=self.tau, HR=self.HR, Kp=self.Kp, i=self.i)
+
+    @classmethod
+    def desde_estado(cls, estado):
+        sim = cls(estado["Kp_c"], estado["HR_ref"], estado["HR"], estado["HR_amb"], estado["fl_ajustar_controlador"],
+                  estado["cota_error"], estado["paso"], estado.get("programa"))
+        sim.HR_ref = estado["HR_ref"]
+        sim.K, sim.tau = estado["K"], estado["tau"]
+        sim.Kp, sim.i = estado["Kp"], estado["i"]
+        return sim
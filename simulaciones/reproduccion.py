@@ -0,0 +1,163 @@
+import csv
+from itertools import islice
+
+import numpy as np
+
+# Reproducción de series registradas (por ejemplo los logs del BMS) como temperatura o
+# humedad ambiente y referencia de los simuladores paso a paso. Los lectores recorren el
+# archivo por bloques (memmap para .npy y binarios, lectura incremental para CSV) y
+# entregan (tiempos, valores); remuestrear() los lleva a la grilla del simulador y
+# reproducir() los pasa por SimuladorPID o SimuladorHumedad de a bloques, así que la
+# memoria depende del tamaño de bloque y no del largo del registro.
+
+# --- Lectores por bloques ---
+# Cada lector es un generador de (t, valores) con t de forma (m,) en segundos y
+# valores de forma (m, columnas). Los valores faltantes son NaN.
+
+# Recorre un arreglo 2D (posiblemente mapeado en memoria). Sin `paso`, la primera
+# columna es el tiempo; con `paso`, las muestras están equiespaciadas desde 0.
+def _bloques_de_arreglo(datos, tam_bloque, paso):
+    if datos.ndim == 1:
+        datos = datos.reshape(-1, 1)
+    for inicio in range(0, len(datos), tam_bloque):
+        bloque = np.asarray(datos[inicio:inicio + tam_bloque], dtype=float)
+        if paso is None:
+            yield bloque[:, 0], bloque[:, 1:]
+        else:
+            yield (inicio + np.arange(len(bloque))) * paso, bloque
+
+# Archivo .npy de forma (muestras,) o (muestras, columnas), abierto con mmap_mode="r"
+def leer_npy(ruta, tam_bloque=1 << 20, paso=None):
+    return _bloques_de_arreglo(np.load(ruta, mmap_mode="r"), tam_bloque, paso)
+
+# Archivo binario crudo de `columnas` valores de tipo `dtype` por muestra
+def leer_binario(ruta, dtype="<f8", columnas=2, tam_bloque=1 << 20, paso=None):
+    datos = np.memmap(ruta, dtype=dtype, mode="r")
+    return _bloques_de_arreglo(datos.reshape(-1, columnas), tam_bloque, paso)
+
+# Convierte la columna de tiempo de un bloque CSV: números en segundos o fechas ISO 8601
+# (en ese caso, segundos desde 1970-01-01)
+def _tiempos_csv(textos):
+    try:
+        return np.array(textos, dtype=float)
+    except ValueError:
+        return np.array(textos, dtype="datetime64[ms]").astype(np.int64) / 1000.0
+
+def _a_float(texto):
+    try:
+        return float(texto)
+    except ValueError:
+        return np.nan
+
+# CSV con encabezado. `columnas` son los nombres (o índices) de las series a leer y
+# `columna_tiempo` el de la columna de tiempo. Se lee de a tam_bloque filas.
+def leer_csv(ruta, columnas, columna_tiempo=0, tam_bloque=1 << 16, delimitador=","):
+    with open(ruta, newline="", encoding="utf-8") as f:
+        lector = csv.reader(f, delimiter=delimitador)
+        encabezado = next(lector)
+        indice = lambda c: c if isinstance(c, int) else encabezado.index(c)
+        i_tiempo = indice(columna_tiempo)
+        i_valores = [indice(c) for c in columnas]
+        while True:
+            filas = list(islice(lector, tam_bloque))
+            if not filas:
+                break
+            tiempos = _tiempos_csv([fila[i_tiempo] for fila in filas])
+            valores = np.array([[_a_float(fila[i]) for i in i_valores] for fila in filas])
+            yield tiempos, valores
+
+# --- Remuestreo en la grilla de simulación ---
+# Lleva los bloques (t, valores) de un lector a una grilla uniforme t_inicio + k*paso
+# (por defecto desde la primera muestra) y entrega (t_grilla, valores_grilla) por bloque.
+# metodo="lineal" interpola entre muestras (temperaturas, humedades); "anterior" mantiene
+# el último valor (referencias y consignas). Cada columna se interpola solo con sus
+# muestras válidas, así que los huecos del registro se rellenan. El resultado no depende
+# del tamaño de los bloques: los puntos de la grilla que dependen de muestras todavía no
+# leídas (con "lineal", los posteriores a la última muestra válida de alguna columna) se
+# entregan con el bloque siguiente, y se arrastran entre bloques las muestras válidas
+# que les hacen falta.
+def remuestrear(bloques, paso, metodo="lineal", t_inicio=None):
+    if metodo not in ("lineal", "anterior"):
+        raise ValueError(f"Método de remuestreo desconocido: {metodo}")
+    pendientes = None   # Por columna, (t, valores) de las muestras válidas que aún hacen falta
+    k = 0               # Índice en la grilla del primer punto sin entregar
+    t_fin = None
+
+    # Calcula los puntos de la grilla desde k hasta `limite` (inclusive)
+    def entregar(limite):
+        n = int(np.floor((limite - t_inicio) / paso + 1e-9)) + 1 - k if limite >= t_inicio else 0
+        if n <= 0:
+            return None
+        t_grilla = t_inicio + (k + np.arange(n)) * paso
+        salida = np.empty((n, len(pendientes)))
+        for j, (t_j, v_j) in enumerate(pendientes):
+            if len(t_j) == 0:
+                salida[:, j] = np.nan
+            elif metodo == "lineal":
+                salida[:, j] = np.interp(t_grilla, t_j, v_j)
+            else:
+                salida[:, j] = v_j[np.maximum(np.searchsorted(t_j, t_grilla, side="right") - 1, 0)]
+        return t_grilla, salida
+
+    for t, valores in bloques:
+        valores = np.asarray(valores, dtype=float).reshape(len(t), -1)
+        if len(t) == 0:
+            continue
+        if pendientes is None:
+            t_inicio = float(t[0]) if t_inicio is None else t_inicio
+            pendientes = [(np.empty(0), np.empty(0))] * valores.shape[1]
+        t_fin = float(t[-1])
+        # Hasta dónde la grilla ya no depende de muestras futuras
+        limite = t_fin
+        for j in range(valores.shape[1]):
+            validos = np.isfinite(valores[:, j])
+            t_j = np.concatenate([pendientes[j][0], t[validos]])
+            v_j = np.concatenate([pendientes[j][1], valores[validos, j]])
+            pendientes[j] = (t_j, v_j)
+            if len(t_j) == 0:
+                limite = -np.inf
+            elif metodo == "lineal":
+                limite = min(limite, float(t_j[-1]))
+        bloque = entregar(limite)
+        if bloque is None:
+            continue
+        k += len(bloque[0])
+        # Solo hacen falta las muestras desde la última anterior al próximo punto de la grilla
+        t_proximo = t_inicio + k * paso
+        for j, (t_j, v_j) in enumerate(pendientes):
+            desde = max(int(np.searchsorted(t_j, t_proximo, side="right")) - 1, 0)
+            pendientes[j] = (t_j[desde:], v_j[desde:])
+        yield bloque
+
+    # Fin del registro: los puntos que quedaban se completan con las muestras arrastradas
+    if pendientes is not None:
+        bloque = entregar(t_fin)
+        if bloque is not None:
+            yield bloque
+
+# --- Reproducción a través de un simulador paso a paso ---
+# Pasa las series remuestreadas por `simulador` (SimuladorPID o SimuladorHumedad, con
+# paso igual al de la grilla) de a tam_bloque muestras. `amb` y `ref` son los índices de
+# columna del flujo que alimentan la temperatura/humedad ambiente y la referencia (None
+# para dejar el valor actual del simulador). Entrega (t, resultados) por bloque, donde
+# resultados es la tupla que devuelve simulador.bloque().
+def reproducir(simulador, flujo, amb=0, ref=None, tam_bloque=1 << 16):
+    pendientes_t, pendientes_v, acumuladas = [], [], 0
+
+    def simular(t, v):
+        return t, simulador.bloque(len(t), None if amb is None else v[:, amb], None if ref is None else v[:, ref])
+
+    for t, valores in flujo:
+        pendientes_t.append(t)
+        pendientes_v.append(valores)
+        acumuladas += len(t)
+        if acumuladas < tam_bloque:
+            continue
+        t_todo, v_todo = np.concatenate(pendientes_t), np.concatenate(pendientes_v)
+        completos = len(t_todo) - len(t_todo) % tam_bloque
+        for inicio in range(0, completos, tam_bloque):
+            yield simular(t_todo[inicio:inicio + tam_bloque], v_todo[inicio:inicio + tam_bloque])
+        pendientes_t, pendientes_v = [t_todo[completos:]], [v_todo[completos:]]
+        acumuladas = len(t_todo) - completos
+    if acumuladas:
+        yield simular(np.concatenate(pendientes_t), np.concatenate(pendientes_v))
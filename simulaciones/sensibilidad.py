@@ -0,0 +1,279 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import nucleo
+from nucleo import metricas_control
+from estabilidad import filtrar_pid, filtrar_proporcional
+from interfaz import controles, interfaces, valores_control, valor_inicial
+
+# Mapas de sensibilidad de las métricas de control sobre dos controles de la interfaz
+# (por defecto Kp × Ki en temperatura y Kp × rango de error en humedad), con refinamiento
+# adaptativo en lugar de simular la grilla completa de los sliders (101 × 101 = 10 201
+# escenarios para Kp × Ki con paso 0.1).
+#
+#   resultado = mapa_sensibilidad("pid", fijos={"Kd": 1.0, "fl_perturbacion": True})
+#   print(describir_ahorro(resultado))
+#   figura_mapa(resultado).show()
+#
+# Se empieza con una grilla gruesa (cada `paso_inicial` valores del slider) y cada celda se
+# divide en cuatro (como un quadtree) si entre sus esquinas alguna métrica cambia más que
+# `tolerancia` veces su rango en la grilla gruesa, si cruza uno de los `umbrales`, o si
+# unas esquinas son finitas y otras no (borde de la región de estabilidad). Las celdas
+# que no se dividen se completan interpolando bilinealmente sus esquinas; `evaluado`
+# marca los puntos que sí se calcularon. Un detalle más chico que la grilla gruesa y que
+# no cambie las esquinas de su celda puede no detectarse.
+# Los puntos nuevos de cada nivel se simulan juntos con el simulador por lotes, repartidos
+# en un pool de procesos si procesos > 1. Con prefiltro=True los lazos lineales (el PID y
+# el lazo P sin ajuste del controlador) inestables según el criterio de Jury no se
+# simulan: quedan con métricas infinitas, igual que los que divergen al simular.
+
+# Señal evaluada y controles por defecto de cada mapa
+salidas = {"pid": "T", "humedad": "HR"}
+ejes_defecto = {"pid": ("Kp", "Ki"), "humedad": ("Kp", "rango_error")}
+metricas_mapa = ("tiempo_fuera", "sobrepico")
+titulos_metricas = {"tiempo_fuera": "Tiempo fuera de banda (s)", "sobrepico": "Sobrepico",
+                    "tiempo_asentamiento": "Tiempo de asentamiento (s)", "iae": "IAE", "esfuerzo": "Esfuerzo de control"}
+
+# (mínimo, máximo, paso, inicial) de un control; en temperatura el rango de error no
+# influye en la simulación y no está en interfaz.controles
+def _definicion(simulador, nombre):
+    if nombre == "rango_error" and simulador == "pid":
+        rango = interfaces["pid"]["rango"]
+        return rango["minimo"], rango["maximo"], rango["paso"], rango["valor"]
+    return controles[simulador][nombre]
+
+# --- Evaluación de un bloque de puntos ---
+# `valores` tiene un arreglo por control (los de interfaz.controles más rango_error),
+# se simula con las mismas reglas que el gráfico de cada interfaz y se devuelve la matriz
+# (puntos, métricas) respecto de ref ± rango_error. Los lazos que divergen quedan en inf.
+def _evaluar_puntos(simulador, valores, nombres_metricas):
+    with np.errstate(over="ignore", invalid="ignore"):
+        senales = interfaces[simulador]["simular"](valores)
+        y = senales[salidas[simulador]]
+        ref = valores[interfaces[simulador]["referencia"]]
+        rango = valores["rango_error"]
+        calculadas = metricas_control(nucleo.t, y, ref, ref - rango, ref + rango, e=senales["e"], output=senales["output"])
+        metricas = np.stack([calculadas[nombre] for nombre in nombres_metricas], axis=1)
+    metricas[~np.isfinite(y).all(axis=1)] = np.inf
+    return metricas
+
+# Puntos inestables según estabilidad.py. El lazo P con ajuste del controlador no es
+# lineal (la ganancia depende del error) y no se descarta nunca.
+def _inestables(simulador, valores):
+    if simulador == "pid":
+        return ~filtrar_pid(valores["Kp"], valores["Ki"], valores["Kd"])
+    lineal = ~valores["fl_ajustar_controlador"] | (valores["Kp"] == 0)
+    inestables = np.zeros(len(lineal), dtype=bool)
+    if lineal.any():
+        inestables[lineal] = ~filtrar_proporcional(valores["Kp"][lineal])
+    return inestables
+
+# --- Criterio de refinamiento ---
+# V es (celdas, esquinas, métricas); tolerancias y umbrales son por métrica (nan: sin umbral)
+def _refinar(V, tolerancias, umbrales):
+    finitos = np.isfinite(V)
+    mezcla = (finitos.any(axis=1) & ~finitos.all(axis=1)).any(axis=1)
+    mayor = np.where(finitos, V, -np.inf).max(axis=1)
+    menor = np.where(finitos, V, np.inf).min(axis=1)
+    with np.errstate(invalid="ignore"):
+        salto = (mayor - menor > tolerancias).any(axis=1)
+        cruce = ((menor < umbrales) & (mayor >= umbrales)).any(axis=1)
+    return mezcla | salto | cruce
+
+# Hijas de la celda (i0, i1, j0, j1) en índices de la grilla fina; un eje de un solo
+# intervalo no se divide
+def _dividir(i0, i1, j0, j1):
+    cortes_i = [(i0, (i0 + i1) // 2), ((i0 + i1) // 2, i1)] if i1 - i0 > 1 else [(i0, i1)]
+    cortes_j = [(j0, (j0 + j1) // 2), ((j0 + j1) // 2, j1)] if j1 - j0 > 1 else [(j0, j1)]
+    return [(a, b, c, d) for a, b in cortes_i for c, d in cortes_j]
+
+# Completa los puntos no evaluados de una hoja interpolando bilinealmente sus esquinas
+def _completar_hoja(valores, evaluado, i0, i1, j0, j1):
+    bloque = (slice(i0, i1 + 1), slice(j0, j1 + 1))
+    falta = ~evaluado[bloque]
+    if not falta.any():
+        return
+    esquinas = valores[[i0, i0, i1, i1], [j0, j1, j0, j1]]
+    if not np.isfinite(esquinas).all():
+        valores[bloque][falta] = esquinas.max(axis=0)
+        return
+    u = (np.arange(i0, i1 + 1) - i0) / (i1 - i0)
+    v = (np.arange(j0, j1 + 1) - j0) / (j1 - j0)
+    u, v = u[:, None, None], v[None, :, None]
+    interpolado = ((1 - u) * (1 - v) * esquinas[0] + (1 - u) * v * esquinas[1]
+                   + u * (1 - v) * esquinas[2] + u * v * esquinas[3])
+    valores[bloque][falta] = interpolado[falta]
+
+# --- Mapa de sensibilidad ---
+# `ejes` son dos controles de la interfaz (se recorren todos los valores de su slider) o
+# un diccionario {control: valores} con dos entradas. `fijos` da el valor del resto de
+# los controles (los que falten toman el valor inicial de la interfaz; si incluye los
+# controles de los ejes se ignoran). `umbrales` es {métrica: valor} para refinar también
+# donde la métrica lo cruza (p. ej. el tiempo fuera de banda admitido).
+# Devuelve un diccionario con los valores de los ejes, un arreglo (len(x), len(y)) por
+# métrica, las máscaras `evaluado` e `inestable`, la cantidad de simulaciones hechas y el
+# total de la grilla completa.
+def mapa_sensibilidad(simulador="pid", ejes=None, fijos=None, metricas=metricas_mapa, paso_inicial=8, tolerancia=0.05,
+                      umbrales=None, prefiltro=True, tam_lote=2000, procesos=None):
+    if simulador not in salidas:
+        raise ValueError(f"Simulador desconocido: {simulador}")
+    ejes = ejes_defecto[simulador] if ejes is None else ejes
+    if not isinstance(ejes, dict):
+        ejes = {nombre: valores_control(_definicion(simulador, nombre)) for nombre in ejes}
+    if len(ejes) != 2:
+        raise ValueError("El mapa necesita exactamente dos ejes")
+    (nombre_x, x), (nombre_y, y) = ((nombre, np.asarray(valores, dtype=float)) for nombre, valores in ejes.items())
+    if len(x) < 2 or len(y) < 2:
+        raise ValueError("Cada eje necesita al menos dos valores")
+
+    base = {nombre: valor_inicial(definicion) for nombre, definicion in controles[simulador].items()}
+    base.setdefault("rango_error", interfaces["pid"]["rango"]["valor"])
+    base.update(fijos or {})
+    for nombre in (nombre_x, nombre_y):
+        base.pop(nombre, None)
+    metricas = tuple(metricas)
+    umbrales = np.array([(umbrales or {}).get(nombre, np.nan) for nombre in metricas], dtype=float)
+
+    nx, ny = len(x), len(y)
+    valores = np.full((nx, ny, len(metricas)), np.nan)
+    evaluado = np.zeros((nx, ny), dtype=bool)
+    inestable = np.zeros((nx, ny), dtype=bool)
+    simulaciones = 0
+
+    # Con "fork" los hijos heredan nucleo.t aunque se haya cambiado con configurar_tiempo
+    pool = None
+    if procesos and procesos > 1:
+        metodo = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        pool = ProcessPoolExecutor(procesos, mp_context=multiprocessing.get_context(metodo))
+
+    def evaluar(ii, jj):
+        puntos = {nombre: np.full(len(ii), valor) for nombre, valor in base.items()}
+        puntos[nombre_x] = x[ii]
+        puntos[nombre_y] = y[jj]
+        descartar = _inestables(simulador, puntos) if prefiltro else np.zeros(len(ii), dtype=bool)
+        resultado = np.full((len(ii), len(metricas)), np.inf)
+        simular = np.flatnonzero(~descartar)
+        bloques = [{nombre: v[simular[k:k + tam_lote]] for nombre, v in puntos.items()} for k in range(0, len(simular), tam_lote)]
+        if pool is not None:
+            resultados = pool.map(_evaluar_puntos, [simulador] * len(bloques), bloques, [metricas] * len(bloques))
+        else:
+            resultados = (_evaluar_puntos(simulador, bloque, metricas) for bloque in bloques)
+        if len(simular):
+            resultado[simular] = np.concatenate(list(resultados))
+        valores[ii, jj] = resultado
+        evaluado[ii, jj] = True
+        inestable[ii, jj] = descartar
+        return len(simular)
+
+    gruesa_x = np.unique(np.r_[np.arange(0, nx - 1, paso_inicial), nx - 1])
+    gruesa_y = np.unique(np.r_[np.arange(0, ny - 1, paso_inicial), ny - 1])
+    pendientes = [(a, b, c, d) for a, b in zip(gruesa_x[:-1], gruesa_x[1:]) for c, d in zip(gruesa_y[:-1], gruesa_y[1:])]
+    hojas = []
+    tolerancias = None
+    niveles = 0
+
+    try:
+        while pendientes:
+            celdas = np.array(pendientes)
+            i0, i1, j0, j1 = celdas.T
+            esquinas_i = np.stack([i0, i0, i1, i1], axis=1)
+            esquinas_j = np.stack([j0, j1, j0, j1], axis=1)
+            nuevos = ~evaluado[esquinas_i, esquinas_j]
+            if nuevos.any():
+                puntos = np.unique(np.stack([esquinas_i[nuevos], esquinas_j[nuevos]], axis=1), axis=0)
+                simulaciones += evaluar(*puntos.T)
+
+            # Las tolerancias absolutas salen del rango de cada métrica en la grilla gruesa
+            if tolerancias is None:
+                gruesos = valores[evaluado]
+                finitos = np.isfinite(gruesos)
+                rangos = np.where(finitos, gruesos, -np.inf).max(axis=0) - np.where(finitos, gruesos, np.inf).min(axis=0)
+                tolerancias = tolerancia * np.where(np.isfinite(rangos), rangos, 0.0)
+
+            refinar = _refinar(valores[esquinas_i, esquinas_j], tolerancias, umbrales)
+            refinar &= (i1 - i0 > 1) | (j1 - j0 > 1)
+            hojas.extend(celdas[~refinar].tolist())
+            pendientes = [hija for celda in celdas[refinar].tolist() for hija in _dividir(*celda)]
+            niveles += 1
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    for hoja in hojas:
+        _completar_hoja(valores, evaluado, *hoja)
+
+    return {
+        "simulador": simulador,
+        "ejes": (nombre_x, nombre_y),
+        "x": x, "y": y,
+        "metricas": {nombre: valores[:, :, k] for k, nombre in enumerate(metricas)},
+        "evaluado": evaluado,
+        "inestable": inestable,
+        "simulaciones": simulaciones,
+        "descartados": int(inestable.sum()),
+        "total": nx * ny,
+        "niveles": niveles,
+        "hojas": len(hojas),
+        "fijos": base,
+    }
+
+# Texto con las evaluaciones hechas frente a la grilla completa
+def describir_ahorro(resultado):
+    total, simulaciones, descartados = resultado["total"], resultado["simulaciones"], resultado["descartados"]
+    texto = (f"{simulaciones} de {total} escenarios simulados ({total - simulaciones} menos que la grilla completa, "
+             f"{1 - simulaciones / total:.0%} de ahorro)")
+    if descartados:
+        texto += f"; {descartados} descartados por inestables sin simular"
+    return texto
+
+# --- Figura ---
+# Un mapa de calor por métrica. Los puntos inestables o que divergen quedan en gris, los
+# puntos simulados se pueden mostrar desde la leyenda y `actual` = (x, y) marca los
+# valores de los sliders. plotly se importa recién aquí.
+def figura_mapa(resultado, actual=None, widget=False):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    nombre_x, nombre_y = resultado["ejes"]
+    x, y = resultado["x"], resultado["y"]
+    metricas = list(resultado["metricas"])
+    fig = make_subplots(rows=1, cols=len(metricas), subplot_titles=[titulos_metricas.get(m, m) for m in metricas],
+                        horizontal_spacing=0.12)
+    if widget:
+        fig = go.FigureWidget(fig)
+
+    ancho = 1 / len(metricas)
+    for k, nombre in enumerate(metricas):
+        z = resultado["metricas"][nombre].T
+        finito = np.isfinite(z)
+        fig.add_trace(go.Heatmap(x=x, y=y, z=np.where(finito, z, np.nan), colorscale="Viridis", name=nombre,
+                                 colorbar=dict(x=ancho * (k + 1) - 0.04, len=0.9, thickness=12),
+                                 hovertemplate=f"{nombre_x}=%{{x}}<br>{nombre_y}=%{{y}}<br>{nombre}=%{{z:.3g}}<extra></extra>"),
+                      row=1, col=k + 1)
+        fig.add_trace(go.Heatmap(x=x, y=y, z=np.where(finito, np.nan, 1.0), colorscale=[[0, "#bbbbbb"], [1, "#bbbbbb"]],
+                                 showscale=False, name="inestable",
+                                 hovertemplate=f"{nombre_x}=%{{x}}<br>{nombre_y}=%{{y}}<br>inestable o diverge<extra></extra>"),
+                      row=1, col=k + 1)
+        fig.update_xaxes(title_text=nombre_x, row=1, col=k + 1)
+        fig.update_yaxes(title_text=nombre_y, row=1, col=k + 1)
+
+    ii, jj = np.nonzero(resultado["evaluado"])
+    for k in range(len(metricas)):
+        fig.add_trace(go.Scatter(x=x[ii], y=y[jj], mode="markers", marker=dict(size=3, color="white", opacity=0.6),
+                                 name="Puntos simulados", legendgroup="evaluados", showlegend=k == 0, visible="legendonly",
+                                 hoverinfo="skip"), row=1, col=k + 1)
+    for k in range(len(metricas)):
+        fig.add_trace(go.Scatter(x=[actual[0]] if actual else [], y=[actual[1]] if actual else [], mode="markers",
+                                 marker=dict(symbol="x", size=10, color="red"), name="Valores actuales",
+                                 legendgroup="actual", showlegend=k == 0), row=1, col=k + 1)
+    fig.update_layout(height=450, margin=dict(t=60, b=40, l=40, r=40),
+                      legend=dict(orientation="h", yanchor="bottom", y=-0.25, xanchor="left", x=0))
+    return fig
+
+# Mueve la marca de los valores actuales en una figura de figura_mapa
+def marcar_actual(fig, x, y):
+    for traza in fig.data:
+        if traza.name == "Valores actuales":
+            traza.x, traza.y = [x], [y]
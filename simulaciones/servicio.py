@@ -0,0 +1,354 @@
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import nucleo
+from cache import CacheLRU
+from nucleo import grilla_actual
+from simular_lote import simuladores
+from submuestreo import submuestrear
+from tiempo_real import Histograma
+
+# Servicio HTTP/JSON local para consultar los simuladores sin abrir un notebook.
+#
+#   python servicio.py --puerto 8765
+#   curl -d '{"simulador": "pid", "parametros": {"Kp": 3, "Ki": 1}}' http://127.0.0.1:8765/simular
+#
+# POST /simular recibe {"simulador": "pid" | "humedad", "parametros": {...}, "senales":
+# [...], "puntos": n}. Los parámetros son los de simular_lote.simuladores (los que faltan
+# toman los valores iniciales de la interfaz y se pasan tal cual, sin la transformación de
+# T_amb_perturb del gráfico). "senales" elige qué señales devolver (por defecto todas) y
+# "puntos" las reduce con submuestreo.minmax. Responde {"t": [...], "senales": {...},
+# "origen": "cache" | "simulada"} (con "puntos", "t" es un diccionario con los instantes
+# de cada señal). Los valores no finitos de una corrida que diverge se envían como null,
+# porque Infinity y NaN no son JSON válido. GET /metricas devuelve los contadores del
+# servicio y GET /salud, {"ok": true}.
+#
+# Cada pedido pasa por tres etapas:
+#   1. cache: CacheLRU por simulador con claves normalizadas (valores redondeados y
+#      parámetros sin efecto llevados a un valor fijo, más la grilla de tiempo actual);
+#   2. coalescencia: si ya hay un pedido en curso con la misma clave, se espera su
+#      resultado en lugar de simular otra vez;
+#   3. micro-lotes: los pedidos distintos que llegan juntos se simulan en una sola
+#      llamada a simulate_pid_batch o simulate_proportional_humidity_batch.
+# El servidor escucha solo en 127.0.0.1.
+
+# --- Normalización de parámetros ---
+# Completa los parámetros con los valores por defecto y devuelve la clave (tupla en el
+# orden de simuladores[nombre]["parametros"]) con las mismas reglas que las claves de
+# cache de las interfaces. Un parámetro desconocido o no numérico es un ValueError.
+def normalizar(nombre, parametros):
+    definicion = simuladores[nombre]["parametros"]
+    desconocidos = set(parametros) - set(definicion)
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos para {nombre}: {', '.join(sorted(desconocidos))}")
+    valores = dict(definicion, **parametros)
+    for parametro, defecto in definicion.items():
+        if isinstance(defecto, bool):
+            valores[parametro] = bool(valores[parametro])
+        else:
+            valores[parametro] = round(float(valores[parametro]), 9)
+    if not valores["fl_perturbacion"]:
+        valores["perturbation_start"] = valores["perturbation_end"] = 0.0
+    if nombre == "pid":
+        if valores["Kp"] == valores["Ki"] == valores["Kd"] == 0:
+            valores["T_ref"] = valores["T_initial"]
+        if not valores["fl_perturbacion"]:
+            valores["T_amb_perturb"] = valores["T_initial"]
+    else:
+        if valores["Kp_c"] == 0:
+            valores["HR_ref"] = valores["HR_inicial"]
+        if not valores["fl_perturbacion"]:
+            valores["HR_amb_perturb"] = valores["HR_inicial"]
+        if not valores["fl_ajustar_controlador"] or valores["Kp_c"] == 0:
+            valores["cota_error"] = definicion["cota_error"]
+    return tuple(valores[parametro] for parametro in definicion)
+
+# Lista para JSON de una señal, con los valores no finitos como None (null)
+def _lista_json(valores):
+    finitos = np.isfinite(valores)
+    if finitos.all():
+        return valores.tolist()
+    return np.where(finitos, valores, None).tolist()
+
+# --- Micro-lotes con coalescencia ---
+# Junta los pedidos que llegan mientras se arma un lote: el primero abre una ventana de
+# `espera` segundos (o hasta `max_lote` pedidos) y al cerrarse todos se simulan juntos
+# con la función por lotes. Los pedidos con una clave que ya está en la cola o simulándose
+# reciben el mismo Future. Un solo hilo de trabajo por simulador, así que nunca corren
+# dos lotes del mismo simulador a la vez. Las claves son las de normalizar() seguidas de
+# grilla_actual().
+class AgrupadorLotes:
+    def __init__(self, nombre, espera=0.002, max_lote=256):
+        self.nombre = nombre
+        self.funcion = simuladores[nombre]["funcion"]
+        self.parametros = tuple(simuladores[nombre]["parametros"])
+        self.espera = espera
+        self.max_lote = max_lote
+        self.lotes = 0
+        self.escenarios = 0
+        self.coalescidos = 0
+        self.tamanios = Histograma(minimo=1, maximo=1e5, por_decada=20)
+        self.espera_cola = Histograma()
+        self.tiempo_lote = Histograma()
+        self._en_curso = {}
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._hilo = threading.Thread(target=self._trabajar, daemon=True)
+        self._hilo.start()
+
+    # Devuelve el Future con el resultado (la tupla de señales) de la clave
+    def enviar(self, clave):
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            if futuro is not None:
+                self.coalescidos += 1
+                return futuro
+            futuro = self._en_curso[clave] = Future()
+        self._cola.put((clave, futuro, time.perf_counter()))
+        return futuro
+
+    def resolver(self, *clave):
+        return self.enviar(clave).result()
+
+    def _trabajar(self):
+        while True:
+            pendientes = [self._cola.get()]
+            limite = time.perf_counter() + self.espera
+            while len(pendientes) < self.max_lote:
+                restante = limite - time.perf_counter()
+                try:
+                    pendientes.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            inicio = time.perf_counter()
+            for _, _, encolado in pendientes:
+                self.espera_cola.registrar(inicio - encolado)
+            try:
+                columnas = zip(*(clave[:len(self.parametros)] for clave, _, _ in pendientes))
+                argumentos = {p: np.array(c, dtype=bool if p.startswith("fl_") else float)
+                              for p, c in zip(self.parametros, columnas)}
+                # Un escenario que diverge termina en inf/NaN (se envían como null)
+                with np.errstate(over="ignore", invalid="ignore"):
+                    senales = self.funcion(**argumentos)
+                # Filas contiguas: la cache cuenta los bytes de cada resultado por separado
+                resultados = [tuple(np.ascontiguousarray(s[i]) for s in senales) for i in range(len(pendientes))]
+            except Exception as error:
+                resultados, fallo = None, error
+            self.tiempo_lote.registrar(time.perf_counter() - inicio)
+            self.lotes += 1
+            self.escenarios += len(pendientes)
+            self.tamanios.registrar(len(pendientes))
+            with self._lock:
+                for clave, _, _ in pendientes:
+                    del self._en_curso[clave]
+            for i, (_, futuro, _) in enumerate(pendientes):
+                if resultados is None:
+                    futuro.set_exception(fallo)
+                else:
+                    futuro.set_result(resultados[i])
+
+    def estadisticas(self):
+        return dict(lotes=self.lotes, escenarios=self.escenarios, coalescidos=self.coalescidos,
+                    lote_medio=self.escenarios / self.lotes if self.lotes else 0.0, lote_max=self.tamanios.max,
+                    espera_cola=self.espera_cola.resumen(), tiempo_lote=self.tiempo_lote.resumen(),
+                    en_cola=self._cola.qsize())
+
+# --- Servicio ---
+# Caches y agrupadores de cada simulador más las métricas de los pedidos: cantidad por
+# resultado, latencia (desde que se leyó el pedido hasta que se armó la respuesta) y
+# pedidos por segundo desde el arranque y en los últimos `ventana` segundos.
+# Pasar a JSON las ~8000 muestras de una respuesta completa cuesta más que simularla en
+# un lote, así que además de los arreglos (3/4 de max_bytes) se guardan las respuestas
+# ya codificadas (1/4) por clave, señales y puntos.
+class ServicioSimulacion:
+    def __init__(self, espera=0.002, max_lote=256, max_bytes=256 * 2**20, ventana=10.0):
+        identidad = lambda *clave: clave
+        self.agrupadores = {nombre: AgrupadorLotes(nombre, espera, max_lote) for nombre in simuladores}
+        self.caches = {nombre: CacheLRU(agrupador.resolver, identidad, max_bytes * 3 // 4 // len(simuladores))
+                       for nombre, agrupador in self.agrupadores.items()}
+        self.max_bytes_codificadas = max_bytes // 4
+        self.bytes_codificadas = 0
+        self._codificadas = OrderedDict()
+        self._t_json = (None, None)
+        self.ventana = ventana
+        self.inicio = time.monotonic()
+        self.pedidos = 0
+        self.errores = 0
+        self.origenes = dict(cache=0, simulada=0)
+        self.latencia = Histograma()
+        self._recientes = []
+        self._lock = threading.Lock()
+
+    def simular(self, nombre, parametros):
+        clave = normalizar(nombre, parametros) + (grilla_actual(),)
+        cache = self.caches[nombre]
+        origen = "cache" if clave in cache else "simulada"
+        return cache(*clave), origen
+
+    # Devuelve (cuerpo JSON en bytes, origen) de un pedido ya decodificado
+    def responder(self, pedido):
+        nombre = pedido.get("simulador", "pid")
+        if nombre not in simuladores:
+            raise ValueError(f"Simulador desconocido: {nombre}")
+        todas = simuladores[nombre]["senales"]
+        elegidas = tuple(pedido.get("senales") or todas)
+        faltantes = set(elegidas) - set(todas)
+        if faltantes:
+            raise ValueError(f"Señales desconocidas para {nombre}: {', '.join(sorted(faltantes))}")
+        puntos = int(pedido.get("puntos") or 0)
+        clave = (nombre, normalizar(nombre, pedido.get("parametros", {})) + (grilla_actual(),), elegidas, puntos)
+        with self._lock:
+            cuerpo = self._codificadas.get(clave)
+            if cuerpo is not None:
+                self._codificadas.move_to_end(clave)
+        if cuerpo is not None:
+            origen = "cache"
+        else:
+            cache = self.caches[nombre]
+            origen = "cache" if clave[1] in cache else "simulada"
+            resultado = cache(*clave[1])
+            cuerpo = self._codificar(resultado, todas, elegidas, puntos)
+            self._guardar_codificada(clave, cuerpo)
+        return b'{"simulador": "%s", "origen": "%s", ' % (nombre.encode(), origen.encode()) + cuerpo, origen
+
+    # Cuerpo {"t": ..., "senales": ...} sin la llave de apertura. Sin puntos, t (común a
+    # todas las respuestas de la grilla actual) se codifica una sola vez.
+    def _codificar(self, resultado, todas, elegidas, puntos):
+        if not puntos:
+            t, t_json = self._t_json
+            if t is not nucleo.t:
+                t, t_json = nucleo.t, json.dumps(nucleo.t.tolist()).encode()
+                self._t_json = (t, t_json)
+            senales = json.dumps({senal: _lista_json(resultado[todas.index(senal)]) for senal in elegidas},
+                                 allow_nan=False).encode()
+            return b'"t": ' + t_json + b', "senales": ' + senales + b"}"
+        # minmax conserva instantes distintos en cada señal: t pasa a ser uno por señal
+        t, senales = {}, {}
+        for senal in elegidas:
+            x, y = submuestrear(nucleo.t, resultado[todas.index(senal)], puntos)
+            t[senal], senales[senal] = x.tolist(), _lista_json(y)
+        return json.dumps(dict(t=t, senales=senales), allow_nan=False)[1:].encode()
+
+    def _guardar_codificada(self, clave, cuerpo):
+        with self._lock:
+            if clave in self._codificadas:
+                return
+            self._codificadas[clave] = cuerpo
+            self.bytes_codificadas += len(cuerpo)
+            while self.bytes_codificadas > self.max_bytes_codificadas and len(self._codificadas) > 1:
+                _, descartado = self._codificadas.popitem(last=False)
+                self.bytes_codificadas -= len(descartado)
+
+    def registrar(self, duracion, origen=None):
+        ahora = time.monotonic()
+        with self._lock:
+            self.pedidos += 1
+            if origen is None:
+                self.errores += 1
+            else:
+                self.origenes[origen] += 1
+            self.latencia.registrar(duracion)
+            self._recientes.append(ahora)
+            if len(self._recientes) > 4096 and self._recientes[0] < ahora - self.ventana:
+                self._recientes = [x for x in self._recientes if x >= ahora - self.ventana]
+
+    def metricas(self):
+        ahora = time.monotonic()
+        with self._lock:
+            recientes = sum(1 for x in self._recientes if x >= ahora - self.ventana)
+            latencia = self.latencia.resumen()
+        activo = ahora - self.inicio
+        return dict(pedidos=self.pedidos, errores=self.errores, origenes=dict(self.origenes), segundos_activo=activo,
+                    pedidos_por_segundo=self.pedidos / activo if activo else 0.0,
+                    pedidos_por_segundo_recientes=recientes / min(self.ventana, activo) if activo else 0.0,
+                    latencia=latencia, respuestas_codificadas=len(self._codificadas), bytes_codificadas=self.bytes_codificadas,
+                    simuladores={nombre: dict(cache=self.caches[nombre].estadisticas(), **agrupador.estadisticas())
+                                 for nombre, agrupador in self.agrupadores.items()})
+
+# --- HTTP ---
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    servicio = None
+
+    def _enviar(self, codigo, cuerpo):
+        datos = cuerpo if isinstance(cuerpo, bytes) else json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == "/metricas":
+            self._enviar(200, self.servicio.metricas())
+        elif self.path == "/salud":
+            self._enviar(200, dict(ok=True))
+        else:
+            self._enviar(404, dict(error=f"Ruta desconocida: {self.path}"))
+
+    def do_POST(self):
+        if self.path != "/simular":
+            self._enviar(404, dict(error=f"Ruta desconocida: {self.path}"))
+            return
+        inicio = time.perf_counter()
+        try:
+            largo = int(self.headers.get("Content-Length", 0))
+            pedido = json.loads(self.rfile.read(largo) or b"{}")
+            respuesta, origen = self.servicio.responder(pedido)
+            codigo = 200
+        except (ValueError, TypeError, AttributeError) as error:
+            respuesta, origen, codigo = dict(error=str(error)), None, 400
+        except Exception as error:
+            respuesta, origen, codigo = dict(error=f"{type(error).__name__}: {error}"), None, 500
+        self.servicio.registrar(time.perf_counter() - inicio, origen)
+        self._enviar(codigo, respuesta)
+
+    def log_message(self, formato, *args):
+        pass
+
+# Cola de conexiones más larga que la de socketserver (5), para muchos clientes a la vez
+class _Servidor(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+# Crea el servidor HTTP (sin arrancarlo) en 127.0.0.1:puerto; con puerto=0 elige uno libre
+def crear_servidor(puerto=8765, servicio=None):
+    manejador = type("Manejador", (_Manejador,), dict(servicio=servicio or ServicioSimulacion()))
+    servidor = _Servidor(("127.0.0.1", puerto), manejador)
+    return servidor
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP/JSON local de simulación.")
+    parser.add_argument("--puerto", type=int, default=8765, help="puerto en 127.0.0.1 (0 elige uno libre)")
+    parser.add_argument("--espera", type=float, default=2.0, help="ventana para armar un lote (ms)")
+    parser.add_argument("--max-lote", type=int, default=256, help="escenarios por lote como máximo")
+    parser.add_argument("--cache-mb", type=float, default=256, help="memoria de la cache de resultados (MB)")
+    parser.add_argument("--horizonte", type=float, default=None, help="duración de la simulación (s)")
+    parser.add_argument("--muestras", type=int, default=None, help="cantidad de muestras de t")
+    args = parser.parse_args(argv)
+
+    if args.horizonte is not None or args.muestras is not None:
+        nucleo.configurar_tiempo(args.horizonte if args.horizonte is not None else nucleo.t[-1],
+                                 args.muestras if args.muestras is not None else len(nucleo.t))
+    servicio = ServicioSimulacion(args.espera / 1e3, args.max_lote, int(args.cache_mb * 2**20))
+    servidor = crear_servidor(args.puerto, servicio)
+    print(f"Escuchando en http://127.0.0.1:{servidor.server_address[1]}", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,97 +1,58 @@
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from ipywidgets import FloatSlider, IntSlider, Checkbox, Label, VBox, GridBox, Layout, interactive_output, Button
+from ipywidgets import FloatSlider, IntSlider, Checkbox, Label, VBox, GridBox, Layout, interactive_output, Button, Output
 from IPython.display import display
-
-# --- Parámetros del sistema (modelo de planta de primer orden para humedad) ---
-K_hum = 1.0        # Ganancia del sistema de humedad
-tau_hum = 10.0     # Constante de tiempo del sistema de humedad
-HR_amb_base = 60 # Humedad ambiente base (%)
-
-# --- Configuración inicial de la simulación ---
-t = np.linspace(0, 100, 1000)
-dt = t[1] - t[0]
-
-# --- Función de simulación del controlador Proporcional (P) para humedad ---
-def simulate_proportional_humidity(Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion,fl_ajustar_controlador,cota_error):
-    HR = np.zeros_like(t)         # Humedad relativa
-    e = np.zeros_like(t)          # Error
-    output = np.zeros_like(t)     # Señal de control (salida del controlador P)
-
-    P_term = np.zeros_like(t)     # Solo término Proporcional
-    Kp_ajustado=np.zeros_like(t) 
-    Kp=Kp_c
-    HR_amb_values = np.zeros_like(t)
-    HR_amb_base = HR_inicial
-    if Kp==0:
-        HR_ref=HR_inicial
-    
-    # Si la perturbación no está habilitada
-    if not fl_perturbacion:
-        HR_amb_perturb = HR_amb_base # La perturbación de humedad es la base
-        # Set perturbation range to effectively zero duration
-        perturbation_start = 0
-        perturbation_end = 0       
-
-    for i in range(len(t)):
-        # Perturbación de humedad ambiente
-        if perturbation_start <= t[i] <= perturbation_end:
-            HR_amb = HR_amb_perturb
-        else:
-            HR_amb = HR_amb_base
-        HR_amb_values[i] = HR_amb # Guardar HR_amb para graficar
-
-        if i == 0:
-            HR[i] = HR_inicial # Usamos HR_inicial para el primer punto
-            e[i] = HR_ref - HR[i]
-            continue
-
-        e[i] = HR_ref - HR[i-1] # Error actual
-
-        
-
-        # Ajuste del controlador
-        if fl_ajustar_controlador and Kp!=0:
-            lvl_e=cota_error/5
-            if abs(e[i])<=lvl_e:
-                Kp=Kp_c*6
-            elif abs(e[i])<=lvl_e*2:
-                Kp=Kp_c*5
-            elif abs(e[i])<=lvl_e*3:
-                Kp=Kp_c*4
-            elif abs(e[i])<=lvl_e*4:
-                Kp=Kp_c*3
-            elif abs(e[i])<=lvl_e*5:
-                Kp=Kp_c*2
-            else:
-                Kp=Kp_c
-
-        Kp_ajustado[i]=Kp
-        
-        # Componente Proporcional (P)
-        P_term[i] = Kp * e[i]
-        
-        # Señal de control total (solo P)
-        output[i] = P_term[i]
-
-        # Modelo de la planta (respuesta a la señal de control y perturbación en HR_amb)
-        dHRdt = (K_hum * output[i] - (HR[i-1] - HR_amb)) / tau_hum
-        HR[i] = HR[i-1] + dHRdt * dt
-    
-    return HR, P_term, output, HR_amb_values, e, Kp_ajustado
-
-# --- Función para actualizar el gráfico ---
-def update_plot(Kp, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion, rango_error,fl_ajustar_controlador):
-
+from cache import CacheLRU, vecinos_sliders
+from interfaz import Coalescedor, SubmuestreoGrafico
+from perfilado import perfilador
+
+# --- Simulación (núcleo sin interfaz) ---
+# Los modelos, simuladores y los análisis Monte Carlo y de sensibilidad viven en nucleo.py,
+# montecarlo.py y sensibilidad.py;
+# se importan aquí para que sigan disponibles en el notebook con los mismos nombres.
+# Para cambiar K_hum, tau_hum o el horizonte hay que modificar nucleo (p. ej. nucleo.configurar_tiempo).
+# La grilla (t, dt) no se importa: configurar_tiempo la reasigna, así que se lee como
+# nucleo.t en cada actualización y el cambio se ve sin reimportar.
+import nucleo
+from nucleo import (K_hum, tau_hum, HR_amb_base, simulate_proportional_humidity,
+                    simulate_proportional_humidity_batch, SimuladorHumedad, franjas_fuera_de_banda)
+from montecarlo import montecarlo_humedad, distribuciones_humedad
+from sensibilidad import mapa_sensibilidad, describir_ahorro, figura_mapa, marcar_actual
+
+# --- Cache de resultados para la interfaz ---
+# Argumentos con los que el gráfico llama a simulate_proportional_humidity a partir de los sliders
+def _argumentos_simulacion(Kp, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion, rango_error, fl_ajustar_controlador):
     if HR_amb_perturb==HR_ref:
         fl_perturbacion=False
 
-    HR, P_term, output, HR_amb_values, s_error, Kp_ajustado = simulate_proportional_humidity(Kp, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion,fl_ajustar_controlador,rango_error)
+    return Kp, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion, fl_ajustar_controlador, rango_error
 
-    error_max=HR_ref+rango_error
-    error_min=HR_ref-rango_error
-    
+# Clave de la cache: valores redondeados y parámetros que no influyen en el resultado
+# llevados a un valor fijo (perturbación deshabilitada, cota de error sin ajuste, HR_ref con Kp en cero),
+# más la grilla de tiempo actual, que simulate_proportional_humidity no recibe como argumento
+def _clave_humedad(Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion, fl_ajustar_controlador, cota_error):
+    Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, cota_error = (
+        round(float(x), 9) for x in (Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, cota_error))
+    if Kp_c==0:
+        HR_ref=HR_inicial
+    if not fl_perturbacion:
+        perturbation_start, perturbation_end, HR_amb_perturb = 0.0, 0.0, HR_inicial
+    if not (fl_ajustar_controlador and Kp_c!=0):
+        cota_error = 0.0
+    return Kp_c, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, bool(fl_perturbacion), bool(fl_ajustar_controlador and Kp_c!=0), cota_error, nucleo.grilla_actual()
+
+cache_humedad = CacheLRU(lambda *clave: simulate_proportional_humidity(*clave[:-1]), _clave_humedad, max_bytes=64 * 2**20)
+precargar_vecinos = True   # Simular en segundo plano las posiciones vecinas de los sliders
+
+# --- Construcción de la figura ---
+# Crea los 4 subgráficos con sus trazas y formato, todavía sin datos. Con widget=True
+# devuelve un go.FigureWidget persistente, que después solo se actualiza con
+# actualizar_figura en lugar de reconstruirse y reenviarse completo en cada cambio.
+lim_inf_y_g1=30
+lim_sup_y_g1=70
+
+def construir_figura(widget=False):
     fig = make_subplots(rows=4, cols=1,
                         shared_xaxes=False,
                         vertical_spacing=0.08,
@@ -103,72 +64,30 @@ def update_plot(Kp, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR
                         ))
 
     # Subplot 1: Humedad Relativa
-    fig.add_trace(go.Scatter(x=t, y=HR, mode='lines', name='Humedad Actual (HR)', line=dict(color='blue')), row=1, col=1)
-    fig.add_trace(go.Scatter(x=t, y=[HR_ref]*len(t), mode='lines', name='Valor Nominal',
+    fig.add_trace(go.Scatter(mode='lines', name='Humedad Actual (HR)', line=dict(color='blue')), row=1, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='Valor Nominal',
                              line=dict(dash='dash', color='red')), row=1, col=1)
     
     # Add acceptable range lines
-    fig.add_trace(go.Scatter(x=t, y=[error_max]*len(t), mode='lines', name='Límite Superior Aceptable (55%)',
+    fig.add_trace(go.Scatter(mode='lines', name='Límite Superior Aceptable (55%)',
                              line=dict(dash='dot', color='green')), row=1, col=1) # Changed to dot for consistency
-    fig.add_trace(go.Scatter(x=t, y=[error_min]*len(t), mode='lines', name='Límite Inferior Aceptable (45%)',
+    fig.add_trace(go.Scatter(mode='lines', name='Límite Inferior Aceptable (45%)',
                              line=dict(dash='dot', color='green')), row=1, col=1) # Changed to dot for consistency
 
-    lim_inf_y_g1=30
-    lim_sup_y_g1=70
     fig.update_layout(yaxis1=dict(
         range=[lim_inf_y_g1, lim_sup_y_g1],
         tickvals=[30, 35, 40, 45, 50, 55, 60, 65, 70],
         ticktext=["30", "35", "40", "45", "50", "55", "60", "65", "70"]
     ))
 
-
-    # Detectar franjas de falla (Temperatura por fuera del rango de error)
- 
-    franjas = []
-    en_fr = False
-    inicio = None
-    
-    for i in range(len(HR)):
-        if HR[i] > error_max:
-            if not en_fr:
-                en_fr = True
-                inicio = t[i]
-        elif HR[i] < error_min:
-            if not en_fr:
-                en_fr = True
-                inicio = t[i]
-        else:
-            if en_fr:
-                en_fr = False
-                fin = t[i]
-                franjas.append((inicio, fin))
-
-    # Captura el último tramo si termina en la última posición
-    if en_fr:
-        franjas.append((inicio, t[-1]))
-    
-    # Agregar las franjas de falla
-    for start, end in franjas:
-        fig.add_shape(
-            type="rect",
-            xref="x1", yref="y1",  # paper en y para cubrir todo el eje Y
-            x0=start, x1=end,
-            y0=lim_inf_y_g1, y1=lim_sup_y_g1,
-            fillcolor="rgba(255, 0, 0, 0.2)",  # rojo transparente
-            line_width=0,
-            layer="below"
-        )
-
-    
-
     # Subplot 2: Señal de control (output)
-    fig.add_trace(go.Scatter(x=t, y=output, mode='lines', name='Señal de Control (P)', line=dict(color='brown')), row=2, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='Señal de Control (P)', line=dict(color='brown')), row=2, col=1)
 
     # Subplot 3: Error
-    fig.add_trace(go.Scatter(x=t, y=s_error, mode='lines', name='Error', line=dict(color='grey')), row=3, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='Error', line=dict(color='grey')), row=3, col=1)
     
     # Subplot 4: Kp
-    fig.add_trace(go.Scatter(x=t, y=Kp_ajustado, mode='lines', name='Kp', line=dict(color='black')), row=4, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='Kp', line=dict(color='black')), row=4, col=1)
     
     fig.update_layout(
         height=800,
@@ -185,7 +104,75 @@ def update_plot(Kp, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR
     
     fig.update_xaxes(title_text="Tiempo (s)", row=4, col=1)
 
-    fig.show()
+    return go.FigureWidget(fig) if widget else fig
+
+# --- Submuestreo para el gráfico ---
+# Las señales se reducen a grafico.puntos_max puntos dentro del rango visible de cada eje
+# y se vuelven a submuestrear al hacer zoom (ver interfaz.SubmuestreoGrafico).
+grafico = SubmuestreoGrafico(['Humedad Actual (HR)', 'Valor Nominal', 'Límite Superior Aceptable (55%)',
+                              'Límite Inferior Aceptable (45%)', 'Señal de Control (P)', 'Error', 'Kp'])
+
+# --- Carga de los datos en la figura ---
+# Solo cambia los datos de las trazas y los rectángulos de las franjas de falla;
+# dentro de batch_update un FigureWidget envía todos los cambios en un único mensaje.
+def actualizar_figura(fig, HR, output, s_error, Kp_ajustado, HR_ref, error_min, error_max, franjas):
+    with fig.batch_update(), perfilador.etapa("construir"):
+        grafico.cargar(fig, nucleo.t, HR, HR_ref, error_max, error_min, output, s_error, Kp_ajustado)
+
+        # Agregar las franjas de falla
+        fig.layout.shapes = [
+            dict(
+                type="rect",
+                xref="x1", yref="y1",  # paper en y para cubrir todo el eje Y
+                x0=start, x1=end,
+                y0=lim_inf_y_g1, y1=lim_sup_y_g1,
+                fillcolor="rgba(255, 0, 0, 0.2)",  # rojo transparente
+                line_width=0,
+                layer="below"
+            )
+            for start, end in franjas
+        ]
+
+# --- Función para actualizar el gráfico ---
+# modo_render = "widget": la figura se crea una vez y cada cambio de los sliders solo
+# actualiza sus datos (los eventos rápidos se agrupan con un Coalescedor).
+# modo_render = "figura": se arma una figura nueva y se muestra con fig.show() en cada cambio.
+# Si FigureWidget no está disponible (falta anywidget) se usa "figura".
+modo_render = "widget"
+
+# --- Perfilado de la interfaz ---
+# Con perfilar = True cada evento de los sliders se mide por etapas (simular, detectar,
+# construir, renderizar) y debajo del gráfico se muestra el panel de percentiles. También
+# se puede activar después con perfilador.activar() y exportar con perfilador.guardar_json()
+# o perfilador.guardar_traza() (ver perfilado.py). Desactivado no agrega costo apreciable.
+perfilar = False
+
+@perfilador.evento
+def update_plot(Kp, HR_ref, HR_inicial, perturbation_start, perturbation_end, HR_amb_perturb, fl_perturbacion, rango_error,fl_ajustar_controlador):
+    valores = dict(Kp=Kp, HR_ref=HR_ref, HR_inicial=HR_inicial, perturbation_start=perturbation_start, perturbation_end=perturbation_end,
+                   HR_amb_perturb=HR_amb_perturb, fl_perturbacion=fl_perturbacion, rango_error=rango_error, fl_ajustar_controlador=fl_ajustar_controlador)
+    with perfilador.etapa("simular"):
+        HR, P_term, output, HR_amb_values, s_error, Kp_ajustado = cache_humedad(*_argumentos_simulacion(**valores))
+        if precargar_vecinos:
+            cache_humedad.precargar([_argumentos_simulacion(**v) for v in vecinos_sliders(valores, sliders_simulacion)])
+
+    error_max=HR_ref+rango_error
+    error_min=HR_ref-rango_error
+
+    # Detectar franjas de falla (Humedad por fuera del rango de error)
+    with perfilador.etapa("detectar"):
+        franjas = franjas_fuera_de_banda(nucleo.t, HR, error_min, error_max)
+
+    if modo_render == "widget":
+        # Al salir del batch_update externo el FigureWidget serializa y envía los cambios
+        with perfilador.etapa("renderizar"), figura_widget.batch_update():
+            actualizar_figura(figura_widget, HR, output, s_error, Kp_ajustado, HR_ref, error_min, error_max, franjas)
+    else:
+        with perfilador.etapa("construir"):
+            fig = construir_figura()
+            actualizar_figura(fig, HR, output, s_error, Kp_ajustado, HR_ref, error_min, error_max, franjas)
+        with perfilador.etapa("renderizar"):
+            fig.show()
 
 # --- Crear los controles interactivos con ipywidgets ---
 
@@ -212,6 +199,7 @@ HR_amb_perturb_slider = FloatSlider(min=10.0, max=90.0, step=1.0, value=75.0, de
 chk_perturbacion_hum = Checkbox(value=False, description='Perturbación', disabled=False, indent=False)
 rango_error = IntSlider(min=0, max=20, step=1, value=5, description='Rango Error (+/-):', continuous_update=True)
 boton_reset_controlador = Button(description="Reiniciar Controlador Proporcional", button_style="")
+boton_mapa_hum = Button(description="Mapa de sensibilidad", button_style="")
 chk_ajustar_Kp = Checkbox(value=False, description='Ajustar controlador', disabled=False, indent=False,continuous_update=True)
 
 # Función que se ejecutará al hacer clic
@@ -280,7 +268,7 @@ on_perturbation_end_change_hum({'new': perturbation_end_slider_hum.value})
 
 
 # Columnas para los controles
-c1_hum = VBox([Label("🎛️ Control Proporcional"), Kp_slider_hum, boton_reset_controlador, chk_ajustar_Kp])
+c1_hum = VBox([Label("🎛️ Control Proporcional"), Kp_slider_hum, boton_reset_controlador, chk_ajustar_Kp, boton_mapa_hum])
 c2_hum = VBox([Label("💧 Perturbación Humedad"), perturbation_start_slider_hum, perturbation_end_slider_hum, HR_amb_perturb_slider, chk_perturbacion_hum])
 c3_hum = VBox([Label("⚙️ Configuraciones Adicionales"), HR_ref_slider, HR_inicial_slider, rango_error])
 
@@ -295,7 +283,18 @@ layoutControles_hum = GridBox(
     )
 )
 
-interactive_plot_hum = interactive_output(update_plot, {
+# Sliders que influyen en la simulación (para precargar sus posiciones vecinas)
+sliders_simulacion = {
+    'Kp': Kp_slider_hum,
+    'HR_ref': HR_ref_slider,
+    'HR_inicial': HR_inicial_slider,
+    'perturbation_start': perturbation_start_slider_hum,
+    'perturbation_end': perturbation_end_slider_hum,
+    'HR_amb_perturb': HR_amb_perturb_slider,
+    'rango_error': rango_error,
+}
+
+controles_grafico_hum = {
     'Kp': Kp_slider_hum,
     'HR_ref': HR_ref_slider,
     'HR_inicial': HR_inicial_slider,
@@ -305,7 +304,78 @@ interactive_plot_hum = interactive_output(update_plot, {
     'fl_perturbacion': chk_perturbacion_hum,
     'rango_error': rango_error,
     'fl_ajustar_controlador': chk_ajustar_Kp
-})
-
-# Mostrar controles y gráfico juntos
-display(VBox([layoutControles_hum, interactive_plot_hum]))
\ No newline at end of file
+}
+
+# --- Mapa de sensibilidad Kp × rango de error ---
+# El botón calcula el tiempo fuera de banda y el sobrepico sobre Kp × rango de error (ver
+# sensibilidad.mapa_sensibilidad) con el resto de los controles en sus valores actuales y
+# lo muestra debajo del gráfico. En modo widget, un clic en el mapa carga esos valores en
+# los sliders y la marca roja sigue a los sliders.
+etiqueta_mapa_hum = Label("")
+panel_mapa_hum = VBox([])
+
+def _elegir_del_mapa_hum(traza, puntos, estado):
+    if puntos.xs:
+        Kp_slider_hum.value = puntos.xs[0]
+        rango_error.value = int(round(puntos.ys[0]))
+
+def _mover_marca_mapa_hum(change):
+    if len(panel_mapa_hum.children) == 2 and isinstance(panel_mapa_hum.children[1], go.FigureWidget):
+        marcar_actual(panel_mapa_hum.children[1], Kp_slider_hum.value, rango_error.value)
+
+def calcular_mapa_hum(b):
+    boton_mapa_hum.disabled = True
+    boton_mapa_hum.description = "Calculando mapa..."
+    try:
+        fijos = {nombre: control.value for nombre, control in controles_grafico_hum.items()}
+        resultado = mapa_sensibilidad("humedad", ("Kp", "rango_error"), fijos)
+        etiqueta_mapa_hum.value = describir_ahorro(resultado)
+        actual = (Kp_slider_hum.value, rango_error.value)
+        if modo_render == "widget":
+            fig = figura_mapa(resultado, actual, widget=True)
+            for traza in fig.data:
+                if isinstance(traza, go.Heatmap):
+                    traza.on_click(_elegir_del_mapa_hum)
+            panel_mapa_hum.children = [etiqueta_mapa_hum, fig]
+        else:
+            salida = Output()
+            with salida:
+                figura_mapa(resultado, actual).show()
+            panel_mapa_hum.children = [etiqueta_mapa_hum, salida]
+    finally:
+        boton_mapa_hum.disabled = False
+        boton_mapa_hum.description = "Mapa de sensibilidad"
+
+boton_mapa_hum.on_click(calcular_mapa_hum)
+Kp_slider_hum.observe(_mover_marca_mapa_hum, names='value')
+rango_error.observe(_mover_marca_mapa_hum, names='value')
+
+if modo_render == "widget":
+    try:
+        figura_widget = construir_figura(widget=True)
+        grafico.conectar(figura_widget)
+    except ImportError:
+        modo_render = "figura"
+
+if modo_render == "widget":
+    coalescedor_hum = Coalescedor(espera=0.05, espera_max=0.25, lock=grafico.lock)
+
+    # Redibuja con los valores que tengan los sliders en el momento de ejecutar
+    def redibujar_hum():
+        update_plot(**{nombre: control.value for nombre, control in controles_grafico_hum.items()})
+
+    for control in controles_grafico_hum.values():
+        control.observe(lambda change: coalescedor_hum.llamar(redibujar_hum), names='value')
+
+    # Mostrar controles y gráfico juntos
+    if perfilar:
+        perfilador.activar()
+    redibujar_hum()
+    display(VBox([layoutControles_hum, figura_widget, panel_mapa_hum] + ([perfilador.widget()] if perfilar else [])))
+else:
+    if perfilar:
+        perfilador.activar()
+    interactive_plot_hum = interactive_output(update_plot, controles_grafico_hum)
+
+    # Mostrar controles y gráfico juntos
+    display(VBox([layoutControles_hum, interactive_plot_hum, panel_mapa_hum] + ([perfilador.widget()] if perfilar else [])))
\ No newline at end of file
@@ -1,72 +1,27 @@
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from ipywidgets import FloatSlider, IntSlider, Checkbox, Label, VBox, GridBox, Layout, interactive_output, Button
+from ipywidgets import FloatSlider, IntSlider, Checkbox, Label, VBox, GridBox, Layout, interactive_output, Button, Output
 from IPython.display import display
-
-# --- Parámetros del sistema (modelo de planta de primer orden) ---
-K = 1.0       # Ganancia
-tau = 10.0    # Constante de tiempo del sistema
-
-# --- Configuración inicial de la simulación ---
-t = np.linspace(0, 100, 1000)
-dt = t[1] - t[0]
-
-# --- Función de simulación PID ---
-def simulate_pid(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial):
-    T = np.zeros_like(t)        # Temperatura
-    e = np.zeros_like(t)        # Error
-    output = np.zeros_like(t)  # Señal de control
-
-    P_term = np.zeros_like(t)
-    I_term = np.zeros_like(t)
-    D_term = np.zeros_like(t)
-
-    integral = 0.0
-    prev_error = 0.0
-
-    T_amb_values = np.zeros_like(t)
-    T_amb_base=T_initial
-
-    if Kp==Ki==Kd==0:
-        T_ref=T_initial
-
-    if not fl_perturbacion:
-        T_amb_perturb = T_amb_base
-        perturbation_start = 0
-        perturbation_end = 0        
-
-    for i in range(len(t)):
-        if perturbation_start <= t[i] <= perturbation_end:
-            T_amb = T_amb_perturb
-        else:
-            T_amb = T_amb_base
-        T_amb_values[i] = T_amb
-
-        if i == 0:
-            T[i] = T_initial
-            e[i] = T_ref - T[i]
-            continue
-
-        e[i] = T_ref - T[i-1]
-
-        P_term[i] = Kp * e[i]
-        integral += e[i] * dt
-        I_term[i] = Ki * integral
-        derivativo = (e[i] - prev_error) / dt
-        D_term[i] = Kd * derivativo
-
-        output[i] = P_term[i] + I_term[i] + D_term[i]
-
-        dTdt = (K * output[i] - (T[i-1] - T_amb)) / tau
-        T[i] = T[i-1] + dTdt * dt
-
-        prev_error = e[i]
-    
-    return T, P_term, I_term, D_term, output, T_amb_values, e
-
-# --- Función para actualizar el gráfico ---
-def update_plot(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial, rango_error):
+from cache import CacheLRU, vecinos_sliders
+from interfaz import Coalescedor, SubmuestreoGrafico
+from perfilado import perfilador
+
+# --- Simulación (núcleo sin interfaz) ---
+# Los modelos, simuladores y análisis viven en nucleo.py, montecarlo.py, sintonizacion.py y sensibilidad.py;
+# se importan aquí para que sigan disponibles en el notebook con los mismos nombres.
+# Para cambiar K, tau o el horizonte hay que modificar nucleo (p. ej. nucleo.configurar_tiempo).
+# La grilla (t, dt) no se importa: configurar_tiempo la reasigna, así que se lee como
+# nucleo.t en cada actualización y el cambio se ve sin reimportar.
+import nucleo
+from nucleo import K, tau, simulate_pid, simulate_pid_batch, SimuladorPID, metricas_control, franjas_fuera_de_banda
+from montecarlo import montecarlo_pid, distribuciones_pid
+from sintonizacion import sintonizar_pid, objetivos_sintonizacion, pesos_sintonizacion
+from sensibilidad import mapa_sensibilidad, describir_ahorro, figura_mapa, marcar_actual
+
+# --- Cache de resultados para la interfaz ---
+# Argumentos con los que el gráfico llama a simulate_pid a partir de los sliders
+def _argumentos_simulacion(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial):
     if Kp==Ki==Kd==0:
         T_div=T_initial
         n=1
@@ -76,12 +31,32 @@ def update_plot(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_p
 
     if T_amb_perturb==T_ref:
         fl_perturbacion=False
-        
-    T, P_term, I_term, D_term, output, T_amb_values, e = simulate_pid(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb**n/T_div**(n-1), fl_perturbacion, T_initial)
 
-    error_max=T_ref+rango_error
-    error_min=T_ref-rango_error
-    
+    return Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb**n/T_div**(n-1), fl_perturbacion, T_initial
+
+# Clave de la cache: valores redondeados y parámetros que no influyen en el resultado
+# llevados a un valor fijo (perturbación deshabilitada, T_ref con las ganancias en cero),
+# más la grilla de tiempo actual, que simulate_pid no recibe como argumento
+def _clave_pid(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial):
+    Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, T_initial = (
+        round(float(x), 9) for x in (Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, T_initial))
+    if Kp==Ki==Kd==0:
+        T_ref=T_initial
+    if not fl_perturbacion:
+        perturbation_start, perturbation_end, T_amb_perturb = 0.0, 0.0, T_initial
+    return Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, bool(fl_perturbacion), T_initial, nucleo.grilla_actual()
+
+cache_pid = CacheLRU(lambda *clave: simulate_pid(*clave[:-1]), _clave_pid, max_bytes=64 * 2**20)
+precargar_vecinos = True   # Simular en segundo plano las posiciones vecinas de los sliders
+
+# --- Construcción de la figura ---
+# Crea los 4 subgráficos con sus trazas y formato, todavía sin datos. Con widget=True
+# devuelve un go.FigureWidget persistente, que después solo se actualiza con
+# actualizar_figura en lugar de reconstruirse y reenviarse completo en cada cambio.
+lim_sup_y_g1=28
+lim_inf_y_g1=15
+
+def construir_figura(widget=False):
     fig = make_subplots(rows=4, cols=1,
                         shared_xaxes=False, # Changed to False to allow individual x-axis titles
                         vertical_spacing=0.08,
@@ -92,16 +67,14 @@ def update_plot(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_p
                             "Error (e(t))"
                         ))
 
-    fig.add_trace(go.Scatter(x=t, y=T, mode='lines', name='Temperatura (T)', line=dict(color='blue')), row=1, col=1)
-    fig.add_trace(go.Scatter(x=t, y=[T_ref]*len(t), mode='lines', name='Valor nominal',
+    fig.add_trace(go.Scatter(mode='lines', name='Temperatura (T)', line=dict(color='blue')), row=1, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='Valor nominal',
                              line=dict(dash='dash', color='red')), row=1, col=1)
 
-    fig.add_trace(go.Scatter(x=t, y=[error_min]*len(t), mode='lines', name='Límite Inferior (18°C)',
+    fig.add_trace(go.Scatter(mode='lines', name='Límite Inferior (18°C)',
                              line=dict(dash='dot', color='green')), row=1, col=1)
-    fig.add_trace(go.Scatter(x=t, y=[error_max]*len(t), mode='lines', name='Límite Superior (26°C)',
+    fig.add_trace(go.Scatter(mode='lines', name='Límite Superior (26°C)',
                              line=dict(dash='dot', color='green')), row=1, col=1)
-    lim_sup_y_g1=28
-    lim_inf_y_g1=15
     
     fig.update_layout(yaxis1=dict(
         range=[lim_inf_y_g1, lim_sup_y_g1],
@@ -109,51 +82,13 @@ def update_plot(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_p
         ticktext=["15", "17", "18", "20", "22", "24", "25", "26", "28"]
     ))
 
+    fig.add_trace(go.Scatter(mode='lines', name='P (Proporcional)', line=dict(color='orange')), row=2, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='I (Integral)', line=dict(color='green')), row=2, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='D (Derivativo)', line=dict(color='purple')), row=2, col=1)
 
-    # Detectar franjas de falla (Temperatura por fuera del rango de error)
- 
-    franjas = []
-    en_fr = False
-    inicio = None
-    
-    for i in range(len(T)):
-        if T[i] > error_max:
-            if not en_fr:
-                en_fr = True
-                inicio = t[i]
-        elif T[i] < error_min:
-            if not en_fr:
-                en_fr = True
-                inicio = t[i]
-        else:
-            if en_fr:
-                en_fr = False
-                fin = t[i]
-                franjas.append((inicio, fin))
-
-    # Captura el último tramo si termina en la última posición
-    if en_fr:
-        franjas.append((inicio, t[-1]))
-    
-    # Agregar las franjas de falla
-    for start, end in franjas:
-        fig.add_shape(
-            type="rect",
-            xref="x1", yref="y1",  # paper en y para cubrir todo el eje Y
-            x0=start, x1=end,
-            y0=lim_inf_y_g1, y1=lim_sup_y_g1,
-            fillcolor="rgba(255, 0, 0, 0.2)",  # rojo transparente
-            line_width=0,
-            layer="below"
-        )
-    
-    fig.add_trace(go.Scatter(x=t, y=P_term, mode='lines', name='P (Proporcional)', line=dict(color='orange')), row=2, col=1)
-    fig.add_trace(go.Scatter(x=t, y=I_term, mode='lines', name='I (Integral)', line=dict(color='green')), row=2, col=1)
-    fig.add_trace(go.Scatter(x=t, y=D_term, mode='lines', name='D (Derivativo)', line=dict(color='purple')), row=2, col=1)
-
-    fig.add_trace(go.Scatter(x=t, y=output, mode='lines', name='Señal de control (output)', line=dict(color='brown')), row=3, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='Señal de control (output)', line=dict(color='brown')), row=3, col=1)
 
-    fig.add_trace(go.Scatter(x=t, y=e, mode='lines', name='Error', line=dict(color='magenta')), row=4, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='Error', line=dict(color='magenta')), row=4, col=1)
     
     fig.update_layout(
         height=1000,
@@ -171,7 +106,75 @@ def update_plot(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_p
     # Set x-axis title for each subplot
     fig.update_xaxes(title_text="Tiempo (s)", row=4, col=1)
 
-    fig.show()
+    return go.FigureWidget(fig) if widget else fig
+
+# --- Submuestreo para el gráfico ---
+# Las señales se reducen a grafico.puntos_max puntos dentro del rango visible de cada eje
+# y se vuelven a submuestrear al hacer zoom (ver interfaz.SubmuestreoGrafico).
+grafico = SubmuestreoGrafico(['Temperatura (T)', 'Valor nominal', 'Límite Inferior (18°C)', 'Límite Superior (26°C)',
+                              'P (Proporcional)', 'I (Integral)', 'D (Derivativo)', 'Señal de control (output)', 'Error'])
+
+# --- Carga de los datos en la figura ---
+# Solo cambia los datos de las trazas y los rectángulos de las franjas de falla;
+# dentro de batch_update un FigureWidget envía todos los cambios en un único mensaje.
+def actualizar_figura(fig, T, P_term, I_term, D_term, output, e, T_ref, error_min, error_max, franjas):
+    with fig.batch_update(), perfilador.etapa("construir"):
+        grafico.cargar(fig, nucleo.t, T, T_ref, error_min, error_max, P_term, I_term, D_term, output, e)
+
+        # Agregar las franjas de falla
+        fig.layout.shapes = [
+            dict(
+                type="rect",
+                xref="x1", yref="y1",  # paper en y para cubrir todo el eje Y
+                x0=start, x1=end,
+                y0=lim_inf_y_g1, y1=lim_sup_y_g1,
+                fillcolor="rgba(255, 0, 0, 0.2)",  # rojo transparente
+                line_width=0,
+                layer="below"
+            )
+            for start, end in franjas
+        ]
+
+# --- Función para actualizar el gráfico ---
+# modo_render = "widget": la figura se crea una vez y cada cambio de los sliders solo
+# actualiza sus datos (los eventos rápidos se agrupan con un Coalescedor).
+# modo_render = "figura": se arma una figura nueva y se muestra con fig.show() en cada cambio.
+# Si FigureWidget no está disponible (falta anywidget) se usa "figura".
+modo_render = "widget"
+
+# --- Perfilado de la interfaz ---
+# Con perfilar = True cada evento de los sliders se mide por etapas (simular, detectar,
+# construir, renderizar) y debajo del gráfico se muestra el panel de percentiles. También
+# se puede activar después con perfilador.activar() y exportar con perfilador.guardar_json()
+# o perfilador.guardar_traza() (ver perfilado.py). Desactivado no agrega costo apreciable.
+perfilar = False
+
+@perfilador.evento
+def update_plot(Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial, rango_error):
+    valores = dict(Kp=Kp, Ki=Ki, Kd=Kd, T_ref=T_ref, perturbation_start=perturbation_start, perturbation_end=perturbation_end,
+                   T_amb_perturb=T_amb_perturb, fl_perturbacion=fl_perturbacion, T_initial=T_initial)
+    with perfilador.etapa("simular"):
+        T, P_term, I_term, D_term, output, T_amb_values, e = cache_pid(*_argumentos_simulacion(**valores))
+        if precargar_vecinos:
+            cache_pid.precargar([_argumentos_simulacion(**v) for v in vecinos_sliders(valores, sliders_simulacion)])
+
+    error_max=T_ref+rango_error
+    error_min=T_ref-rango_error
+
+    # Detectar franjas de falla (Temperatura por fuera del rango de error)
+    with perfilador.etapa("detectar"):
+        franjas = franjas_fuera_de_banda(nucleo.t, T, error_min, error_max)
+
+    if modo_render == "widget":
+        # Al salir del batch_update externo el FigureWidget serializa y envía los cambios
+        with perfilador.etapa("renderizar"), figura_widget.batch_update():
+            actualizar_figura(figura_widget, T, P_term, I_term, D_term, output, e, T_ref, error_min, error_max, franjas)
+    else:
+        with perfilador.etapa("construir"):
+            fig = construir_figura()
+            actualizar_figura(fig, T, P_term, I_term, D_term, output, e, T_ref, error_min, error_max, franjas)
+        with perfilador.etapa("renderizar"):
+            fig.show()
 
 # --- Crear los controles interactivos con ipywidgets ---
 
@@ -199,6 +202,8 @@ perturbation_end_slider = IntSlider(
 T_amb_perturb_slider = FloatSlider(min=10.0, max=35.0, step=0.5, value=15.0, description='T_amb Perturbación (°C):')
 chk_perturbacion = Checkbox(value=False, description='Perturbación', disabled=False, indent=False)
 boton_reset_controlador = Button(description="Reiniciar PID", button_style="")
+boton_sintonizar = Button(description="Sintonizar PID", button_style="")
+boton_mapa = Button(description="Mapa de sensibilidad", button_style="")
 
 rango_error = IntSlider(min=0, max=10, step=1, value=4, description='Rango Error (+/-):', continuous_update=True)
 
@@ -211,6 +216,22 @@ def reset_PID(b):
 # Asignar la función al evento click
 boton_reset_controlador.on_click(reset_PID)
 
+# Busca las ganancias para el escenario que está configurado en los sliders
+def sintonizar_PID(b):
+    boton_sintonizar.disabled = True
+    boton_sintonizar.description = "Sintonizando..."
+    try:
+        resultado = sintonizar_pid(T_ref_slider.value, perturbation_start_slider.value, perturbation_end_slider.value,
+                                   T_amb_perturb_slider.value, chk_perturbacion.value, T_initial_slider.value, rango_error.value)
+        Kp_slider.value = resultado["Kp"]
+        Ki_slider.value = resultado["Ki"]
+        Kd_slider.value = resultado["Kd"]
+    finally:
+        boton_sintonizar.disabled = False
+        boton_sintonizar.description = "Sintonizar PID"
+
+boton_sintonizar.on_click(sintonizar_PID)
+
 
 T_initial_slider = FloatSlider(min=10.0, max=30.0, step=0.5, value=20.0, description='Temp. Inicial (°C):')
 
@@ -240,7 +261,7 @@ toggle_perturbation_sliders({'new': chk_perturbacion.value})
 on_perturbation_start_change({'new': perturbation_start_slider.value})
 on_perturbation_end_change({'new': perturbation_end_slider.value})
 
-c1 = VBox([Label("🎛️ Control PID"), Kp_slider, Ki_slider, Kd_slider, boton_reset_controlador])
+c1 = VBox([Label("🎛️ Control PID"), Kp_slider, Ki_slider, Kd_slider, boton_reset_controlador, boton_sintonizar, boton_mapa])
 c2 = VBox([Label("🌡️ Perturbación"), perturbation_start_slider, perturbation_end_slider, T_amb_perturb_slider, chk_perturbacion])
 c3 = VBox([Label("⚙️ Configuraciones Adicionales"), T_initial_slider, T_ref_slider, rango_error])
 
@@ -254,7 +275,19 @@ layoutControles = GridBox(
     )
 )
 
-interactive_plot = interactive_output(update_plot, {
+# Sliders que influyen en la simulación (para precargar sus posiciones vecinas)
+sliders_simulacion = {
+    'Kp': Kp_slider,
+    'Ki': Ki_slider,
+    'Kd': Kd_slider,
+    'T_ref': T_ref_slider,
+    'perturbation_start': perturbation_start_slider,
+    'perturbation_end': perturbation_end_slider,
+    'T_amb_perturb': T_amb_perturb_slider,
+    'T_initial': T_initial_slider,
+}
+
+controles_grafico = {
     'Kp': Kp_slider,
     'Ki': Ki_slider,
     'Kd': Kd_slider,
@@ -265,6 +298,76 @@ interactive_plot = interactive_output(update_plot, {
     'fl_perturbacion': chk_perturbacion,
     'T_initial': T_initial_slider,
     'rango_error': rango_error
-})
-
-display(VBox([layoutControles, interactive_plot]))
+}
+
+# --- Mapa de sensibilidad Kp × Ki ---
+# El botón calcula el tiempo fuera de banda y el sobrepico sobre Kp × Ki (ver
+# sensibilidad.mapa_sensibilidad) con el resto de los controles en sus valores actuales y
+# lo muestra debajo del gráfico. En modo widget, un clic en el mapa carga esas ganancias
+# en los sliders y la marca roja sigue a los sliders.
+etiqueta_mapa = Label("")
+panel_mapa = VBox([])
+
+def _elegir_del_mapa(traza, puntos, estado):
+    if puntos.xs:
+        Kp_slider.value = puntos.xs[0]
+        Ki_slider.value = puntos.ys[0]
+
+def _mover_marca_mapa(change):
+    if len(panel_mapa.children) == 2 and isinstance(panel_mapa.children[1], go.FigureWidget):
+        marcar_actual(panel_mapa.children[1], Kp_slider.value, Ki_slider.value)
+
+def calcular_mapa(b):
+    boton_mapa.disabled = True
+    boton_mapa.description = "Calculando mapa..."
+    try:
+        fijos = {nombre: control.value for nombre, control in controles_grafico.items()}
+        resultado = mapa_sensibilidad("pid", ("Kp", "Ki"), fijos)
+        etiqueta_mapa.value = describir_ahorro(resultado)
+        actual = (Kp_slider.value, Ki_slider.value)
+        if modo_render == "widget":
+            fig = figura_mapa(resultado, actual, widget=True)
+            for traza in fig.data:
+                if isinstance(traza, go.Heatmap):
+                    traza.on_click(_elegir_del_mapa)
+            panel_mapa.children = [etiqueta_mapa, fig]
+        else:
+            salida = Output()
+            with salida:
+                figura_mapa(resultado, actual).show()
+            panel_mapa.children = [etiqueta_mapa, salida]
+    finally:
+        boton_mapa.disabled = False
+        boton_mapa.description = "Mapa de sensibilidad"
+
+boton_mapa.on_click(calcular_mapa)
+Kp_slider.observe(_mover_marca_mapa, names='value')
+Ki_slider.observe(_mover_marca_mapa, names='value')
+
+if modo_render == "widget":
+    try:
+        figura_widget = construir_figura(widget=True)
+        grafico.conectar(figura_widget)
+    except ImportError:
+        modo_render = "figura"
+
+if modo_render == "widget":
+    coalescedor = Coalescedor(espera=0.05, espera_max=0.25, lock=grafico.lock)
+
+    # Redibuja con los valores que tengan los sliders en el momento de ejecutar
+    def redibujar():
+        update_plot(**{nombre: control.value for nombre, control in controles_grafico.items()})
+
+    for control in controles_grafico.values():
+        control.observe(lambda change: coalescedor.llamar(redibujar), names='value')
+
+    if perfilar:
+        perfilador.activar()
+    redibujar()
+    display(VBox([layoutControles, figura_widget, panel_mapa] + ([perfilador.widget()] if perfilar else [])))
+else:
+    if perfilar:
+        perfilador.activar()
+    interactive_plot = interactive_output(update_plot, controles_grafico)
+
+    display(VBox([layoutControles, interactive_plot, panel_mapa] + ([perfilador.widget()] if perfilar else [])))
@@ -0,0 +1,180 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import nucleo
+from nucleo import simulate_pid_batch, simulate_proportional_humidity_batch, metricas_control, ProgramaGanancias
+from estabilidad import criterios_estabilidad, criterios_margenes, filtrar_pid, filtrar_proporcional
+from interfaz import a_valor
+
+# Simulación por lotes desde la línea de comandos, sin interfaz gráfica.
+#
+#   python simular_lote.py escenarios.csv salida/ [--simulador pid|humedad] [--float32]
+#
+# El archivo de escenarios es un CSV con encabezado o un JSON con una lista de objetos;
+# cada fila es un escenario y las columnas son los parámetros del simulador por lotes
+# (los que falten toman los valores iniciales de la interfaz). Una columna `simulador`
+# elige "pid" o "humedad" por fila; si no está, se usa --simulador.
+# Por cada simulador se escribe en salida/<simulador>/ un .npy por señal con forma
+# (escenarios, len(t)), t.npy, indices.npy (fila del archivo de cada escenario) y
+# metricas.csv con metricas_control de cada escenario respecto de ref ± rango_error.
+# Los parámetros se pasan tal cual a los simuladores: no se aplica la transformación de
+# T_amb_perturb que hace el gráfico de temperatura (T_amb_perturb**3 / T_ref**2).
+# Con --prefiltro no se simulan los escenarios inestables (con --margenes, tampoco los de
+# poco margen de ganancia o de fase, ver estabilidad.criterios_margenes); indices.npy
+# indica qué filas quedaron.
+
+# --- Parámetros y valores por defecto de cada simulador ---
+simuladores = {
+    "pid": {
+        "funcion": simulate_pid_batch,
+        "parametros": {"Kp": 2.0, "Ki": 5.0, "Kd": 1.0, "T_ref": 22.0, "perturbation_start": 30.0,
+                       "perturbation_end": 50.0, "T_amb_perturb": 15.0, "fl_perturbacion": False,
+                       "T_initial": 20.0, "K_planta": nucleo.K, "tau_planta": nucleo.tau},
+        "senales": ("T", "P_term", "I_term", "D_term", "output", "T_amb_values", "e"),
+        "referencia": "T_ref",
+    },
+    "humedad": {
+        "funcion": simulate_proportional_humidity_batch,
+        "parametros": {"Kp_c": 2.0, "HR_ref": 50.0, "HR_inicial": 46.0, "perturbation_start": 30.0,
+                       "perturbation_end": 50.0, "HR_amb_perturb": 75.0, "fl_perturbacion": False,
+                       "fl_ajustar_controlador": False, "cota_error": 5.0,
+                       "K_planta": nucleo.K_hum, "tau_planta": nucleo.tau_hum},
+        "senales": ("HR", "P_term", "output", "HR_amb_values", "e", "Kp_ajustado"),
+        "referencia": "HR_ref",
+    },
+}
+rango_error_defecto = {"pid": 4.0, "humedad": 5.0}
+
+# --- Lectura de escenarios ---
+def leer_escenarios(ruta):
+    with open(ruta, newline="", encoding="utf-8") as f:
+        if ruta.lower().endswith(".json"):
+            filas = json.load(f)
+        else:
+            filas = [{k: (v if k == "simulador" else a_valor(v)) for k, v in fila.items() if v not in (None, "")}
+                     for fila in csv.DictReader(f)]
+    return filas
+
+# Agrupa las filas por simulador y arma un arreglo por parámetro (incluido rango_error)
+def agrupar_escenarios(filas, simulador_defecto):
+    grupos = {}
+    for indice, fila in enumerate(filas):
+        nombre = fila.get("simulador", simulador_defecto)
+        if nombre not in simuladores:
+            raise ValueError(f"Fila {indice}: simulador desconocido: {nombre}")
+        parametros = simuladores[nombre]["parametros"]
+        desconocidos = set(fila) - set(parametros) - {"simulador", "rango_error"}
+        if desconocidos:
+            raise ValueError(f"Fila {indice}: parámetros desconocidos para {nombre}: {sorted(desconocidos)}")
+        grupos.setdefault(nombre, []).append((indice, fila))
+
+    arreglos = {}
+    for nombre, grupo in grupos.items():
+        columnas = dict(simuladores[nombre]["parametros"], rango_error=rango_error_defecto[nombre])
+        arreglos[nombre] = {"indices": np.array([i for i, _ in grupo])}
+        for parametro, defecto in columnas.items():
+            arreglos[nombre][parametro] = np.array([fila.get(parametro, defecto) for _, fila in grupo],
+                                                   dtype=bool if isinstance(defecto, bool) else float)
+    return arreglos
+
+# --- Prefiltro de estabilidad ---
+# Devuelve los arreglos solo con los escenarios que cumplen `criterios` y la cantidad de
+# descartados. En humedad, con el ajuste del controlador se analiza la ganancia máxima del
+# programa (el peor caso del lazo P: todos los márgenes bajan al subir Kp).
+def filtrar_estables(nombre, arreglos, criterios=criterios_estabilidad):
+    planta = dict(K_planta=arreglos["K_planta"], tau_planta=arreglos["tau_planta"])
+    if nombre == "pid":
+        pasa = filtrar_pid(arreglos["Kp"], arreglos["Ki"], arreglos["Kd"], **planta, **criterios)
+    else:
+        factor_max = ProgramaGanancias.desde_cota(1.0).factores.max()
+        Kp = arreglos["Kp_c"] * np.where(arreglos["fl_ajustar_controlador"], factor_max, 1.0)
+        pasa = filtrar_proporcional(Kp, **planta, **criterios)
+    return {clave: valores[pasa] for clave, valores in arreglos.items()}, int((~pasa).sum())
+
+# --- Ejecución por bloques ---
+# Simula los escenarios de a tam_bloque y escribe cada señal directamente en un .npy
+# mapeado en memoria, así que el uso de memoria depende del bloque y no del total.
+def simular_grupo(nombre, arreglos, directorio, tam_bloque=1000, dtype=np.float64):
+    definicion = simuladores[nombre]
+    os.makedirs(directorio, exist_ok=True)
+    n_escenarios = len(arreglos["indices"])
+    n = len(nucleo.t)
+
+    np.save(os.path.join(directorio, "t.npy"), nucleo.t.astype(dtype))
+    np.save(os.path.join(directorio, "indices.npy"), arreglos["indices"])
+    salidas = {senal: np.lib.format.open_memmap(os.path.join(directorio, f"{senal}.npy"), mode="w+",
+                                                dtype=dtype, shape=(n_escenarios, n))
+               for senal in definicion["senales"]}
+
+    nombres_parametros = list(definicion["parametros"])
+    filas_metricas = []
+    for inicio in range(0, n_escenarios, tam_bloque):
+        bloque = slice(inicio, min(inicio + tam_bloque, n_escenarios))
+        with np.errstate(over="ignore", invalid="ignore"):
+            resultados = definicion["funcion"](*(arreglos[p][bloque] for p in nombres_parametros))
+            for senal, valores in zip(definicion["senales"], resultados):
+                salidas[senal][bloque] = valores
+
+            senales = dict(zip(definicion["senales"], resultados))
+            y = resultados[0]
+            ref = arreglos[definicion["referencia"]][bloque]
+            rango_error = arreglos["rango_error"][bloque]
+            metricas = metricas_control(nucleo.t, y, ref, ref - rango_error, ref + rango_error, e=senales["e"], output=senales["output"])
+        for j in range(bloque.stop - bloque.start):
+            fila = {"indice": int(arreglos["indices"][bloque.start + j])}
+            fila.update({clave: float(valor[j]) for clave, valor in metricas.items()})
+            filas_metricas.append(fila)
+
+    for memoria in salidas.values():
+        memoria.flush()
+    del salidas
+
+    with open(os.path.join(directorio, "metricas.csv"), "w", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=list(filas_metricas[0]))
+        escritor.writeheader()
+        escritor.writerows(filas_metricas)
+    return n_escenarios
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simula por lotes los escenarios de un archivo CSV o JSON.")
+    parser.add_argument("escenarios", help="archivo .csv o .json con un escenario por fila")
+    parser.add_argument("salida", help="directorio de salida")
+    parser.add_argument("--simulador", choices=sorted(simuladores), default="pid",
+                        help="simulador para las filas sin columna 'simulador' (por defecto pid)")
+    parser.add_argument("--tam-bloque", type=int, default=1000, help="escenarios simulados a la vez")
+    parser.add_argument("--float32", action="store_true", help="guardar las señales en float32")
+    parser.add_argument("--horizonte", type=float, default=None, help="duración de la simulación (s)")
+    parser.add_argument("--muestras", type=int, default=None, help="cantidad de muestras de t")
+    parser.add_argument("--prefiltro", action="store_true", help="no simular los escenarios inestables")
+    parser.add_argument("--margenes", action="store_true",
+                        help="con --prefiltro, tampoco simular los de poco margen de ganancia o de fase")
+    args = parser.parse_args(argv)
+
+    if args.horizonte is not None or args.muestras is not None:
+        nucleo.configurar_tiempo(args.horizonte if args.horizonte is not None else nucleo.t[-1],
+                                 args.muestras if args.muestras is not None else len(nucleo.t))
+
+    filas = leer_escenarios(args.escenarios)
+    if not filas:
+        parser.error("el archivo de escenarios no tiene filas")
+    dtype = np.float32 if args.float32 else np.float64
+    for nombre, arreglos in agrupar_escenarios(filas, args.simulador).items():
+        inicio = time.perf_counter()
+        if args.prefiltro:
+            arreglos, descartados = filtrar_estables(nombre, arreglos, criterios_margenes if args.margenes else criterios_estabilidad)
+            print(f"{nombre}: {descartados} escenarios descartados por el prefiltro de estabilidad")
+            if not len(arreglos["indices"]):
+                continue
+        n_escenarios = simular_grupo(nombre, arreglos, os.path.join(args.salida, nombre), args.tam_bloque, dtype)
+        duracion = time.perf_counter() - inicio
+        print(f"{nombre}: {n_escenarios} escenarios en {duracion:.2f} s -> {os.path.join(args.salida, nombre)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
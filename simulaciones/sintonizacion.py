@@ -0,0 +1,144 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import nucleo
+from nucleo import simulate_pid_batch, metricas_control
+from estabilidad import criterios_estabilidad, filtrar_pid
+
+# --- Sintonización automática del PID ---
+# Objetivos disponibles (todos se minimizan, ver metricas.metricas_control):
+#   tiempo_fuera: tiempo total con T fuera de T_ref ± rango_error (s)
+#   sobrepico: máximo exceso de T más allá de T_ref en el sentido del escalón (°C)
+#   tiempo_asentamiento: instante a partir del cual T queda dentro de la banda (s)
+#   iae: integral del error absoluto
+#   esfuerzo: integral del valor absoluto de la señal de control (output)
+# El costo de cada candidato es la suma ponderada de los objetivos según `pesos`.
+objetivos_sintonizacion = ("tiempo_fuera", "sobrepico", "tiempo_asentamiento", "iae", "esfuerzo")
+pesos_sintonizacion = {"tiempo_fuera": 1.0, "sobrepico": 1.0, "tiempo_asentamiento": 0.1, "iae": 0.1, "esfuerzo": 0.0}
+
+# Evalúa un bloque de candidatos (filas Kp, Ki, Kd) con el simulador por lotes y
+# devuelve una matriz (candidatos, objetivos). Usa la misma perturbación efectiva que
+# update_plot para que el resultado coincida con lo que se ve en el gráfico.
+def _evaluar_candidatos(candidatos, T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial, rango_error):
+    Kp, Ki, Kd = candidatos.T
+    sin_control = (Kp == 0) & (Ki == 0) & (Kd == 0)
+    T_amb_efectiva = np.where(sin_control, T_amb_perturb, T_amb_perturb**3 / T_ref**2)
+    fl_perturbacion = fl_perturbacion and T_amb_perturb != T_ref
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        T, P_term, I_term, D_term, output, T_amb_values, e = simulate_pid_batch(
+            Kp, Ki, Kd, T_ref, perturbation_start, perturbation_end, T_amb_efectiva, fl_perturbacion, T_initial)
+
+        calculadas = metricas_control(nucleo.t, T, T_ref, T_ref - rango_error, T_ref + rango_error, e=e, output=output)
+        metricas = np.stack([calculadas[nombre] for nombre in objetivos_sintonizacion], axis=1)
+    # Los lazos que divergen se descartan con costo infinito
+    metricas[~np.isfinite(T).all(axis=1)] = np.inf
+    return metricas
+
+# Índices de los candidatos no dominados (frontera de Pareto) para las columnas dadas
+def _frontera_pareto(valores):
+    orden = np.lexsort(valores.T[::-1])
+    frontera = []
+    for i in orden:
+        if not np.isfinite(valores[i]).all():
+            continue
+        if not any(np.all(valores[j] <= valores[i]) for j in frontera):
+            frontera.append(i)
+    return np.array(frontera, dtype=int)
+
+# Busca Kp, Ki, Kd en una grilla gruesa y la refina alrededor de los mejores candidatos.
+# Las ganancias se redondean al paso de los sliders (0.1), de modo que el resultado se
+# puede cargar directamente en la interfaz. La búsqueda se detiene antes de agotar los
+# niveles si el mejor costo mejora menos que `tolerancia` (relativa) entre niveles.
+# Con procesos > 1 los bloques de candidatos se reparten en un pool de procesos.
+# Antes de simular, los candidatos que no cumplen `estabilidad` (criterios de
+# estabilidad.filtrar_pid: radio espectral y, con estabilidad.criterios_margenes, los
+# márgenes de ganancia y de fase del lazo discreto) se descartan con costo infinito;
+# por defecto solo los inestables. estabilidad=None los simula a todos.
+# Devuelve un diccionario con las mejores ganancias, su costo y métricas, todos los
+# candidatos evaluados (con `descartados` marcando los que no se simularon) y los
+# índices de la frontera de Pareto entre los objetivos con peso.
+def sintonizar_pid(T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial, rango_error,
+                   pesos=None, rangos=((0.0, 10.0), (0.0, 10.0), (0.0, 9.0)), paso=0.1,
+                   puntos=7, niveles=4, n_mejores=3, tolerancia=1e-3, tam_lote=2000, procesos=None,
+                   estabilidad=criterios_estabilidad):
+    pesos = dict(pesos_sintonizacion, **(pesos or {}))
+    w = np.array([pesos[nombre] for nombre in objetivos_sintonizacion])
+    escenario = (T_ref, perturbation_start, perturbation_end, T_amb_perturb, fl_perturbacion, T_initial, rango_error)
+    minimos = np.array([r[0] for r in rangos])
+    maximos = np.array([r[1] for r in rangos])
+
+    # Con "fork" los hijos heredan nucleo.t aunque se haya cambiado con configurar_tiempo
+    pool = None
+    if procesos and procesos > 1:
+        metodo = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        pool = ProcessPoolExecutor(procesos, mp_context=multiprocessing.get_context(metodo))
+
+    def evaluar(candidatos):
+        bloques = [candidatos[i:i + tam_lote] for i in range(0, len(candidatos), tam_lote)]
+        if pool is not None:
+            resultados = pool.map(_evaluar_candidatos, bloques, *[[p] * len(bloques) for p in escenario])
+        else:
+            resultados = (_evaluar_candidatos(b, *escenario) for b in bloques)
+        return np.concatenate(list(resultados))
+
+    evaluados = np.empty((0, 3))
+    metricas = np.empty((0, len(objetivos_sintonizacion)))
+    descartados = np.empty(0, dtype=bool)
+    centros = [(minimos + maximos) / 2]
+    semiancho = (maximos - minimos) / 2
+    mejor_costo = np.inf
+
+    try:
+        for nivel in range(niveles):
+            ejes = [np.linspace(-1, 1, puntos)[:, None] * semiancho + c for c in centros]
+            grilla = np.concatenate([np.stack(np.meshgrid(*eje.T, indexing="ij"), axis=-1).reshape(-1, 3) for eje in ejes])
+            grilla = np.round(np.round(np.clip(grilla, minimos, maximos) / paso) * paso, 10)
+            grilla = np.unique(grilla, axis=0)
+            # Con las tres ganancias en cero el simulador apaga el control (T_ref = T_initial)
+            grilla = grilla[grilla.any(axis=1)]
+            # No se vuelven a simular candidatos ya evaluados en niveles anteriores
+            if len(evaluados):
+                ya_evaluado = (np.abs(grilla[:, None, :] - evaluados[None, :, :]) < paso / 2).all(axis=2).any(axis=1)
+                grilla = grilla[~ya_evaluado]
+            if len(grilla):
+                pasa = np.ones(len(grilla), dtype=bool) if estabilidad is None else filtrar_pid(*grilla.T, **estabilidad)
+                nuevas = np.full((len(grilla), len(objetivos_sintonizacion)), np.inf)
+                if pasa.any():
+                    nuevas[pasa] = evaluar(grilla[pasa])
+                evaluados = np.concatenate((evaluados, grilla))
+                metricas = np.concatenate((metricas, nuevas))
+                descartados = np.concatenate((descartados, ~pasa))
+
+            with np.errstate(invalid="ignore"):
+                costos = metricas @ w
+            costos[np.isnan(costos)] = np.inf
+            orden = np.argsort(costos, kind="stable")
+            nuevo_costo = costos[orden[0]]
+            mejora = mejor_costo - nuevo_costo
+            mejor_costo = nuevo_costo
+            if mejora <= tolerancia * abs(mejor_costo) or mejor_costo == 0:
+                break
+
+            semiancho = semiancho * 2 / (puntos - 1)
+            if np.all(semiancho < paso):
+                break
+            centros = [evaluados[i] for i in orden[:n_mejores]]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    mejor = evaluados[orden[0]]
+    con_peso = w > 0
+    return {
+        "Kp": float(mejor[0]), "Ki": float(mejor[1]), "Kd": float(mejor[2]),
+        "costo": float(mejor_costo),
+        "metricas": dict(zip(objetivos_sintonizacion, metricas[orden[0]])),
+        "candidatos": evaluados,
+        "descartados": descartados,
+        "valores": dict(zip(objetivos_sintonizacion, metricas.T)),
+        "costos": costos,
+        "frontera": _frontera_pareto(metricas[:, con_peso]) if con_peso.any() else np.array([], dtype=int),
+    }
@@ -0,0 +1,56 @@
+import numpy as np
+
+# --- Submuestreo de señales para graficar ---
+# Reducen una señal (x, y) a unos pocos miles de puntos conservando su forma, para no
+# enviar al navegador todas las muestras de horizontes largos o pasos finos. Siempre se
+# conservan la primera y la última muestra.
+
+# Mínimo y máximo de cada bucket (en orden temporal): conserva picos y valles exactos.
+# Es completamente vectorizado, por eso es el método por defecto de la interfaz.
+def minmax(x, y, puntos):
+    n = len(y)
+    if puntos >= n or puntos < 4:
+        return x, y
+    ancho = -(-n // ((puntos - 2) // 2))
+    buckets = -(-n // ancho)
+    relleno = np.empty(buckets * ancho)
+    relleno[:n] = y
+    relleno[n:] = y[-1]
+    matriz = relleno.reshape(buckets, ancho)
+    base = np.arange(buckets) * ancho
+    minimos = base + np.argmin(np.where(np.isnan(matriz), np.inf, matriz), axis=1)
+    maximos = base + np.argmax(np.where(np.isnan(matriz), -np.inf, matriz), axis=1)
+    indices = np.unique(np.concatenate(([0, n - 1], np.minimum(minimos, n - 1), np.minimum(maximos, n - 1))))
+    return x[indices], y[indices]
+
+# Largest-Triangle-Three-Buckets: elige en cada bucket el punto que forma el triángulo de
+# mayor área con el punto elegido en el bucket anterior y el promedio del siguiente.
+# Da curvas visualmente más fieles que minmax, pero recorre los buckets en Python.
+def lttb(x, y, puntos):
+    n = len(y)
+    if puntos >= n or puntos < 3:
+        return x, y
+    bordes = np.linspace(1, n - 1, puntos - 1).astype(int)
+    bordes = np.append(bordes, n)
+    elegidos = np.empty(puntos, dtype=int)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    a = 0
+    for i in range(puntos - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        cx = x[bordes[i + 1]:bordes[i + 2]].mean()
+        cy = y[bordes[i + 1]:bordes[i + 2]].mean()
+        area = np.abs((x[a] - cx) * (y[inicio:fin] - y[a]) - (x[a] - x[inicio:fin]) * (cy - y[a]))
+        a = inicio + int(np.argmax(area)) if fin > inicio else a
+        elegidos[i + 1] = a
+    return x[elegidos], y[elegidos]
+
+metodos_submuestreo = {"minmax": minmax, "lttb": lttb}
+
+# Recorta (x, y) al rango visible [x0, x1] (con una muestra de margen a cada lado) y lo
+# reduce a `puntos` con el método indicado. Con rango=None usa la señal completa.
+def submuestrear(x, y, puntos, metodo="minmax", rango=None):
+    if rango is not None:
+        inicio = max(int(np.searchsorted(x, rango[0], side="left")) - 1, 0)
+        fin = min(int(np.searchsorted(x, rango[1], side="right")) + 1, len(x))
+        x, y = x[inicio:fin], y[inicio:fin]
+    return metodos_submuestreo[metodo](np.asarray(x), np.asarray(y), puntos)
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+
+import nucleo
+from nucleo import ControladorPID, ControladorProporcional, PlantaPrimerOrden
+
+# Ejecución en tiempo real de muchos lazos de control sobre un mismo bucle asyncio. Cada
+# lazo es una tarea que, cada `periodo` segundos de reloj, lee la salida de un emulador
+# de planta local, calcula la ley de control (ControladorPID o ControladorProporcional,
+# las mismas de simulate_pid y simulate_proportional_humidity) y actúa sobre la planta.
+# Por cada muestra se registra:
+#   - jitter: cuánto tarde se despertó la tarea respecto del instante programado,
+#   - latencia: desde el instante programado hasta que se aplicó la actuación,
+#   - vencimientos: muestras cuya actuación llegó después del fin del período,
+#   - omitidos: períodos enteros que no se llegaron a ejecutar.
+# Con dimensionar() se busca cuántos lazos soporta el equipo a un período dado antes de
+# empezar a perder muestras.
+#
+#   lazos = crear_lazos(200, periodo=0.01)
+#   resultado = correr(lazos, duracion=10)
+
+# --- Histograma logarítmico ---
+# Cubre de `minimo` a `maximo` segundos con `por_decada` cajas por década (20 cajas: ~12%
+# de resolución). Los valores fuera de rango van a las cajas de los extremos. Los
+# percentiles devuelven el borde superior de la caja (el máximo registrado en la última,
+# que no tiene borde), así que nunca subestiman.
+class Histograma:
+    def __init__(self, minimo=1e-6, maximo=10.0, por_decada=20):
+        self.minimo = minimo
+        self.por_decada = por_decada
+        self.cajas = int(math.ceil(math.log10(maximo / minimo) * por_decada)) + 2
+        self.cuentas = [0] * self.cajas
+        self.total = 0
+        self.suma = 0.0
+        self.max = 0.0
+
+    def registrar(self, valor):
+        if valor < self.minimo:
+            i = 0
+        else:
+            i = min(int(math.log10(valor / self.minimo) * self.por_decada) + 1, self.cajas - 1)
+        self.cuentas[i] += 1
+        self.total += 1
+        self.suma += valor
+        if valor > self.max:
+            self.max = valor
+
+    def combinar(self, otro):
+        self.cuentas = [a + b for a, b in zip(self.cuentas, otro.cuentas)]
+        self.total += otro.total
+        self.suma += otro.suma
+        self.max = max(self.max, otro.max)
+
+    # Borde superior de la caja i (la caja 0 es todo lo menor que `minimo`)
+    def _borde(self, i):
+        return self.minimo * 10 ** (i / self.por_decada)
+
+    def percentil(self, p):
+        if not self.total:
+            return math.nan
+        objetivo = p / 100 * self.total
+        acumulado = 0
+        for i, cuenta in enumerate(self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo and cuenta:
+                return self.max if i == self.cajas - 1 else min(self._borde(i), self.max)
+        return self.max
+
+    # Percentiles, media y máximo en milisegundos
+    def resumen(self):
+        if not self.total:
+            return dict(muestras=0)
+        return dict(muestras=self.total, media_ms=self.suma / self.total * 1e3,
+                    p50_ms=self.percentil(50) * 1e3, p90_ms=self.percentil(90) * 1e3,
+                    p99_ms=self.percentil(99) * 1e3, p999_ms=self.percentil(99.9) * 1e3, max_ms=self.max * 1e3)
+
+    # Cajas no vacías como [(borde_superior_s, cuenta), ...]
+    def cajas_no_vacias(self):
+        return [(self._borde(i), c) for i, c in enumerate(self.cuentas) if c]
+
+# --- Lazo de control ---
+# Un controlador (cualquier objeto con calcular(medicion)) y su planta (con `y` y
+# avanzar(u)), ejecutados cada `periodo` segundos a partir del desfase `fase`. La planta
+# avanza un `periodo` de tiempo simulado por muestra, así que evoluciona en tiempo real.
+# Si se saltean períodos, la planta avanza igual esos pasos con la última actuación
+# (retención de orden cero), como lo haría la planta física. `retardo_io` simula la
+# lectura del sensor y la escritura del actuador: se espera ese tiempo (sin ocupar el
+# bucle) antes de cada una.
+class Lazo:
+    def __init__(self, controlador, planta, periodo, fase=0.0, retardo_io=0.0, nombre=None):
+        self.controlador = controlador
+        self.planta = planta
+        self.periodo = periodo
+        self.fase = fase
+        self.retardo_io = retardo_io
+        self.nombre = nombre
+        self.u = 0.0
+        self.muestras = 0
+        self.vencidos = 0
+        self.omitidos = 0
+
+    async def correr(self, inicio, fin, jitter, latencia):
+        bucle = asyncio.get_running_loop()
+        reloj = bucle.time
+        k = 0
+        while True:
+            programado = inicio + self.fase + k * self.periodo
+            if programado >= fin:
+                break
+            espera = programado - reloj()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            despertar = reloj()
+            jitter.registrar(despertar - programado)
+
+            if self.retardo_io:
+                await asyncio.sleep(self.retardo_io)
+            medicion = self.planta.y
+            self.u = self.controlador.calcular(medicion)
+            if self.retardo_io:
+                await asyncio.sleep(self.retardo_io)
+            self.planta.avanzar(self.u)
+
+            actuado = reloj()
+            latencia.registrar(actuado - programado)
+            self.muestras += 1
+            if actuado > programado + self.periodo:
+                self.vencidos += 1
+            # Siguiente período que todavía no empezó; los salteados avanzan la planta
+            siguiente = max(k + 1, int((actuado - inicio - self.fase) / self.periodo) + 1)
+            for _ in range(siguiente - k - 1):
+                self.planta.avanzar(self.u)
+            self.omitidos += siguiente - k - 1
+            k = siguiente
+
+# --- Creación de lazos ---
+# `cantidad` lazos de tipo "pid" (temperatura), "humedad" o "mixto" (alternados), con los
+# valores iniciales de las interfaces y las fases repartidas uniformemente en el período
+# para que no se despierten todos juntos.
+def crear_lazos(cantidad, periodo=0.1, tipo="mixto", retardo_io=0.0, repartir_fases=True):
+    if tipo not in ("pid", "humedad", "mixto"):
+        raise ValueError(f"Tipo de lazo desconocido: {tipo}")
+    lazos = []
+    for i in range(cantidad):
+        fase = i * periodo / cantidad if repartir_fases else 0.0
+        if tipo == "pid" or (tipo == "mixto" and i % 2 == 0):
+            controlador = ControladorPID(2, 5, 1, 22, paso=periodo)
+            planta = PlantaPrimerOrden(20.0, 20.0, nucleo.K, nucleo.tau, paso=periodo)
+            nombre = f"pid-{i}"
+        else:
+            controlador = ControladorProporcional(2, 50, fl_ajustar_controlador=True, cota_error=5)
+            planta = PlantaPrimerOrden(46.0, 46.0, nucleo.K_hum, nucleo.tau_hum, paso=periodo)
+            nombre = f"humedad-{i}"
+        lazos.append(Lazo(controlador, planta, periodo, fase, retardo_io, nombre))
+    return lazos
+
+# --- Ejecución ---
+# Corre los lazos durante `duracion` segundos de reloj y devuelve un diccionario con los
+# histogramas de jitter y latencia, las muestras, vencimientos y omitidos totales, la
+# carga del bucle (fracción del tiempo de reloj que se usó CPU del proceso) y la CPU por
+# muestra, que da el techo teórico de lazos: periodo / cpu_por_muestra.
+async def ejecutar(lazos, duracion, arranque=None):
+    bucle = asyncio.get_running_loop()
+    jitter, latencia = Histograma(), Histograma()
+    # Margen para crear las tareas antes de la primera muestra (unos 100 µs por lazo)
+    arranque = 0.05 + 1e-4 * len(lazos) if arranque is None else arranque
+    inicio = bucle.time() + arranque
+    fin = inicio + duracion
+    cpu_inicial = time.process_time()
+    await asyncio.gather(*(lazo.correr(inicio, fin, jitter, latencia) for lazo in lazos))
+    cpu = time.process_time() - cpu_inicial
+    muestras = sum(lazo.muestras for lazo in lazos)
+    vencidos = sum(lazo.vencidos for lazo in lazos)
+    omitidos = sum(lazo.omitidos for lazo in lazos)
+    esperadas = muestras + omitidos
+    return dict(lazos=len(lazos), periodo=lazos[0].periodo if lazos else None, duracion=duracion,
+                muestras=muestras, vencidos=vencidos, omitidos=omitidos,
+                fraccion_perdida=(vencidos + omitidos) / esperadas if esperadas else 0.0,
+                carga_cpu=cpu / (bucle.time() - inicio), cpu_por_muestra_us=cpu / muestras * 1e6 if muestras else math.nan,
+                jitter=jitter, latencia=latencia)
+
+def correr(lazos, duracion):
+    return asyncio.run(ejecutar(lazos, duracion))
+
+# --- Dimensionamiento ---
+# Corre sucesivamente cada cantidad de lazos de `cantidades` (en orden creciente) y se
+# detiene en la primera cuya fracción de muestras perdidas (vencidas u omitidas) supera
+# `tolerancia`. Devuelve (máxima cantidad que cumplió, lista de resultados).
+def dimensionar(cantidades, periodo=0.1, duracion=5.0, tolerancia=1e-3, tipo="mixto", retardo_io=0.0, informar=None):
+    maxima = 0
+    resultados = []
+    for cantidad in sorted(cantidades):
+        resultado = correr(crear_lazos(cantidad, periodo, tipo, retardo_io), duracion)
+        resultados.append(resultado)
+        if informar is not None:
+            informar(resultado)
+        if resultado["fraccion_perdida"] > tolerancia:
+            break
+        maxima = cantidad
+    return maxima, resultados
+
+def _linea(resultado):
+    j, l = resultado["jitter"].resumen(), resultado["latencia"].resumen()
+    return (f"{resultado['lazos']:6d} lazos  muestras {resultado['muestras']:8d}  vencidas {resultado['vencidos']:6d}  "
+            f"omitidas {resultado['omitidos']:6d}  CPU {resultado['carga_cpu']:5.1%} ({resultado['cpu_por_muestra_us']:.1f} µs/muestra)  "
+            f"jitter p50/p99/máx {j.get('p50_ms', math.nan):.3f}/{j.get('p99_ms', math.nan):.3f}/{j.get('max_ms', math.nan):.3f} ms  "
+            f"latencia p99 {l.get('p99_ms', math.nan):.3f} ms")
+
+def _a_json(resultado):
+    return dict({k: v for k, v in resultado.items() if k not in ("jitter", "latencia")},
+                jitter=dict(resultado["jitter"].resumen(), cajas=resultado["jitter"].cajas_no_vacias()),
+                latencia=dict(resultado["latencia"].resumen(), cajas=resultado["latencia"].cajas_no_vacias()))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Corre lazos de control en tiempo real contra plantas emuladas.")
+    parser.add_argument("--lazos", type=int, default=100, help="cantidad de lazos (por defecto 100)")
+    parser.add_argument("--periodo", type=float, default=0.1, help="período de muestreo (s)")
+    parser.add_argument("--duracion", type=float, default=5.0, help="duración de cada corrida (s)")
+    parser.add_argument("--tipo", choices=("pid", "humedad", "mixto"), default="mixto")
+    parser.add_argument("--retardo-io", type=float, default=0.0, help="retardo simulado de sensor y actuador (s)")
+    parser.add_argument("--dimensionar", default=None,
+                        help="lista de cantidades separadas por comas: corre cada una hasta que se pierdan muestras")
+    parser.add_argument("--tolerancia", type=float, default=1e-3, help="fracción de muestras perdidas admitida")
+    parser.add_argument("--json", default=None, help="guardar los resultados (con los histogramas) en este archivo")
+    args = parser.parse_args(argv)
+
+    if args.dimensionar:
+        cantidades = [int(c) for c in args.dimensionar.split(",")]
+        maxima, resultados = dimensionar(cantidades, args.periodo, args.duracion, args.tolerancia, args.tipo,
+                                         args.retardo_io, informar=lambda r: print(_linea(r)))
+        print(f"Máximo sin superar la tolerancia a {args.periodo * 1e3:g} ms: {maxima} lazos")
+    else:
+        resultados = [correr(crear_lazos(args.lazos, args.periodo, args.tipo, args.retardo_io), args.duracion)]
+        print(_linea(resultados[0]))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([_a_json(r) for r in resultados], f, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
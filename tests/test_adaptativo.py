@@ -0,0 +1,12 @@
+import numpy as np
+
+from adaptativo import simulate_pid_adaptativo, simulate_proportional_humidity_adaptativo
+
+# Con horizonte nulo no hay pasos: las señales son las de la condición inicial
+def test_horizonte_nulo_devuelve_la_condicion_inicial():
+    (T, _, _, _, _, _, e), info = simulate_pid_adaptativo(2, 5, 1, 22, 30, 50, 15, True, 20, t_salida=[0.0])
+    assert info["pasos"] == 0
+    np.testing.assert_array_equal(T, [20.0])
+    np.testing.assert_array_equal(e, [2.0])
+    (HR, *_), info = simulate_proportional_humidity_adaptativo(2, 50, 46, 30, 50, 75, True, True, 5, t_salida=[0.0, 0.0])
+    np.testing.assert_array_equal(HR, [46.0, 46.0])
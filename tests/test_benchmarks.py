@@ -0,0 +1,35 @@
+import importlib.util
+import json
+import os
+
+import nucleo
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+def _cargar(nombre):
+    spec = importlib.util.spec_from_file_location(nombre, os.path.join(BENCHMARKS, f"{nombre}.py"))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+# Cada caso de rendimiento.py corre una vez con el horizonte y el lote más chicos de la
+# configuración, para que un benchmark que ya no puede correr falle aquí y no recién al medir
+def test_casos_de_rendimiento_corren():
+    rendimiento = _cargar("rendimiento")
+    with open(os.path.join(BENCHMARKS, "configuracion.json"), encoding="utf-8") as f:
+        configuracion = json.load(f)
+    configuracion["horizontes"] = [min(configuracion["horizontes"])]
+    configuracion["lotes"] = [min(configuracion["lotes"])]
+    horizonte, muestras = float(nucleo.t[-1]), len(nucleo.t)
+    try:
+        nombres = []
+        for nombre, _, preparar in rendimiento.casos(configuracion):
+            preparar()()
+            nombres.append(nombre)
+    finally:
+        nucleo.configurar_tiempo(horizonte, muestras)
+    assert any(n.startswith("figura/") for n in nombres) and any(n.startswith("update_plot/") for n in nombres)
+
+def test_carga_servicio_corre():
+    carga_servicio = _cargar("carga_servicio")
+    assert carga_servicio.main(["--pedidos", "20", "--concurrencia", "2", "--calientes", "5"]) in (None, 0)
@@ -0,0 +1,39 @@
+import numpy as np
+
+import inspect
+
+from estabilidad import polos_pid, estable_pid, polos_proporcional, filtrar_pid, filtrar_proporcional, criterios_estabilidad
+from interfaz import controles, valor_inicial
+from sintonizacion import sintonizar_pid
+from simular_lote import filtrar_estables
+
+# El criterio de Jury coincide con el radio espectral de los polos en toda una grilla de
+# ganancias, salvo los puntos que quedan sobre el círculo unidad
+def test_jury_coincide_con_los_polos():
+    Kp, Ki, Kd = (g.reshape(-1) for g in np.meshgrid(np.linspace(0, 400, 41), np.linspace(0, 20, 21), np.linspace(0, 20, 21)))
+    radio = np.max(np.abs(polos_pid(Kp, Ki, Kd)), axis=1)
+    lejos_del_borde = np.abs(radio - 1) > 1e-9
+    assert lejos_del_borde.mean() > 0.99
+    estables = estable_pid(Kp, Ki, Kd)
+    np.testing.assert_array_equal(estables[lejos_del_borde], (radio < 1)[lejos_del_borde])
+    assert estables.any() and not estables.all()
+
+# El filtro del lazo P de humedad (Jury con Ki = Kd = 0) coincide con su único polo
+def test_filtro_proporcional_coincide_con_el_polo():
+    Kp = np.linspace(0, 400, 801)
+    radio = np.abs(polos_proporcional(Kp)[:, 0])
+    lejos_del_borde = np.abs(radio - 1) > 1e-9
+    aceptados = filtrar_proporcional(Kp)
+    np.testing.assert_array_equal(aceptados[lejos_del_borde], (radio < 1)[lejos_del_borde])
+    assert aceptados.any() and not aceptados.all()
+
+# El prefiltro por defecto no descarta las ganancias con las que arrancan las interfaces
+def test_prefiltro_por_defecto_acepta_las_ganancias_de_la_interfaz():
+    pid = {nombre: valor_inicial(controles["pid"][nombre]) for nombre in ("Kp", "Ki", "Kd")}
+    assert filtrar_pid(pid["Kp"], pid["Ki"], pid["Kd"], **criterios_estabilidad).all()
+    assert inspect.signature(sintonizar_pid).parameters["estabilidad"].default == criterios_estabilidad
+    arreglos = {"Kp": np.array([pid["Kp"]]), "Ki": np.array([pid["Ki"]]), "Kd": np.array([pid["Kd"]]),
+                "K_planta": np.array([1.0]), "tau_planta": np.array([10.0])}
+    assert filtrar_estables("pid", arreglos)[1] == 0
+    humedad = valor_inicial(controles["humedad"]["Kp"])
+    assert filtrar_proporcional(humedad, fl_ajustar_controlador=True, cota_error=valor_inicial(controles["humedad"]["rango_error"])).all()
@@ -0,0 +1,17 @@
+import numpy as np
+
+from montecarlo import montecarlo_pid
+
+# Con la misma semilla el resultado no depende de la cantidad de procesos (procesos=None
+# usa todos los núcleos) ni del orden en que terminan los bloques
+def test_montecarlo_no_depende_de_los_procesos():
+    corridas = [montecarlo_pid(2.0, 5.0, 1.0, 22.0, 4, n_muestras=1200, tam_bloque=200, semilla=3, procesos=procesos)
+                for procesos in (1, 3, None)]
+    serie = corridas[0]
+    for resultado in corridas[1:]:
+        assert resultado["corridas"] == serie["corridas"] == 1200
+        np.testing.assert_array_equal(resultado["media"], serie["media"])
+        np.testing.assert_array_equal(resultado["prob_fuera_por_tiempo"], serie["prob_fuera_por_tiempo"])
+        for p in serie["percentiles"]:
+            np.testing.assert_array_equal(resultado["percentiles"][p], serie["percentiles"][p])
+        assert resultado["prob_fuera"] == serie["prob_fuera"]
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from reproduccion import remuestrear, _bloques_de_arreglo
+
+# Registro irregular de 3 columnas con huecos de NaN, incluidos uno al principio y uno al
+# final de columna
+def _registro(m=3000, semilla=1):
+    rng = np.random.default_rng(semilla)
+    t = np.cumsum(rng.uniform(0.2, 1.8, m))
+    valores = rng.normal(size=(m, 3))
+    for j in range(3):
+        for _ in range(15):
+            a = rng.integers(0, m)
+            valores[a:a + rng.integers(1, 200), j] = np.nan
+    valores[:40, 1] = np.nan
+    valores[-30:, 2] = np.nan
+    return np.column_stack([t, valores])
+
+def _remuestrear_todo(datos, tam_bloque, metodo):
+    bloques = list(remuestrear(_bloques_de_arreglo(datos, tam_bloque, None), 1.0, metodo))
+    return np.concatenate([b[0] for b in bloques]), np.concatenate([b[1] for b in bloques])
+
+@pytest.mark.parametrize("metodo", ["lineal", "anterior"])
+def test_remuestrear_no_depende_del_tamano_de_bloque(metodo):
+    datos = _registro()
+    t_ref, v_ref = _remuestrear_todo(datos, len(datos), metodo)
+    for tam_bloque in (1, 7, 64, 1000):
+        t_grilla, valores = _remuestrear_todo(datos, tam_bloque, metodo)
+        np.testing.assert_array_equal(t_grilla, t_ref)
+        np.testing.assert_array_equal(valores, v_ref)
+
+def test_remuestrear_lineal_interpola_los_huecos_como_el_registro_completo():
+    datos = _registro()
+    t_grilla, valores = _remuestrear_todo(datos, 50, "lineal")
+    for j in range(3):
+        validos = np.isfinite(datos[:, 1 + j])
+        np.testing.assert_array_equal(valores[:, j], np.interp(t_grilla, datos[validos, 0], datos[validos, 1 + j]))
+
+def test_remuestrear_columna_sin_muestras_validas():
+    datos = _registro()
+    datos[:, 3] = np.nan
+    _, valores = _remuestrear_todo(datos, 100, "lineal")
+    assert np.isnan(valores[:, 2]).all()
+    assert np.isfinite(valores[:, :2]).all()
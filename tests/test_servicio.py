@@ -0,0 +1,32 @@
+import json
+
+import nucleo
+from servicio import ServicioSimulacion
+
+def _cargar_estricto(cuerpo):
+    def rechazar(constante):
+        raise ValueError(f"JSON inválido: {constante}")
+    return json.loads(cuerpo, parse_constant=rechazar)
+
+# Un escenario que diverge responde JSON válido, con null en lugar de Infinity/NaN
+def test_respuesta_de_escenario_divergente_es_json_valido():
+    servicio = ServicioSimulacion()
+    for pedido in ({"parametros": {"Kp": 1000, "Kd": 50}}, {"parametros": {"Kp": 1000, "Kd": 50}, "puntos": 100}):
+        cuerpo, _ = servicio.responder(pedido)
+        respuesta = _cargar_estricto(cuerpo)
+        assert None in respuesta["senales"]["T"]
+
+# Después de configurar_tiempo no se sirve la respuesta guardada para la grilla anterior
+def test_cache_distingue_la_grilla_de_tiempo():
+    servicio = ServicioSimulacion()
+    horizonte, muestras = float(nucleo.t[-1]), len(nucleo.t)
+    try:
+        antes = _cargar_estricto(servicio.responder({"parametros": {"Kp": 3}})[0])
+        nucleo.configurar_tiempo(horizonte / 2, muestras // 2)
+        cuerpo, origen = servicio.responder({"parametros": {"Kp": 3}})
+        despues = _cargar_estricto(cuerpo)
+    finally:
+        nucleo.configurar_tiempo(horizonte, muestras)
+    assert origen == "simulada"
+    assert len(antes["t"]) == len(antes["senales"]["T"]) == muestras
+    assert len(despues["t"]) == len(despues["senales"]["T"]) == muestras // 2
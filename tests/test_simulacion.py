@@ -0,0 +1,250 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+import nucleo
+from cache import CacheLRU
+from cosimulacion import cosimular
+from metricas import franjas_fuera_de_banda, metricas_control
+from exportar_html import _codificar
+from interfaz import interfaces
+from perfilado import Perfilador
+from sensibilidad import mapa_sensibilidad
+from tiempo_real import Histograma
+from multizona import acoplamiento_grilla, simulate_pid_multizona, simulate_proportional_humidity_multizona
+from nucleo import simulate_pid, simulate_pid_batch, SimuladorPID
+from nucleo import simulate_proportional_humidity, simulate_proportional_humidity_batch
+
+REFERENCIAS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "referencias.npz")
+
+# Escenarios por defecto de las interfaces, como en benchmarks/rendimiento.py
+ESCENARIO_PID = (2.0, 5.0, 1.0, 22.0, 30, 50, 15.0, True, 20.0)
+ESCENARIO_HUMEDAD = (2.0, 50.0, 46.0, 30, 50, 75.0, True, True, 5)
+
+# Las referencias se calcularon sobre la grilla original de nucleo (100 s, 1000 muestras)
+@pytest.fixture
+def grilla_original():
+    horizonte, muestras = float(nucleo.t[-1]), len(nucleo.t)
+    nucleo.configurar_tiempo(100, 1000)
+    yield
+    nucleo.configurar_tiempo(horizonte, muestras)
+
+# El lazo de Euler sigue dando las salidas guardadas en benchmarks/referencias.npz
+def test_euler_coincide_con_las_referencias(grilla_original):
+    referencias = np.load(REFERENCIAS)
+    programa = nucleo.ProgramaGanancias.desde_cota(3)
+    salidas = {
+        "pid": simulate_pid(*ESCENARIO_PID),
+        "pid_sin_perturbacion": simulate_pid(*ESCENARIO_PID[:7], False, ESCENARIO_PID[8]),
+        "pid_ganancias_nulas": simulate_pid(0, 0, 0, *ESCENARIO_PID[3:]),
+        "pid_programa": simulate_pid(*ESCENARIO_PID, programa=programa),
+        "humedad": simulate_proportional_humidity(*ESCENARIO_HUMEDAD),
+        "humedad_sin_ajuste": simulate_proportional_humidity(*ESCENARIO_HUMEDAD[:7], False, ESCENARIO_HUMEDAD[8]),
+        "humedad_programa": simulate_proportional_humidity(*ESCENARIO_HUMEDAD, programa=programa),
+    }
+    for nombre, senales in salidas.items():
+        np.testing.assert_allclose(np.array(senales), referencias[nombre], rtol=1e-12, atol=1e-12, err_msg=nombre)
+
+# Los caminos por lotes y paso a paso dan lo mismo que la simulación individual
+def test_lotes_y_paso_a_paso_coinciden_con_euler(grilla_original):
+    pid = np.array(simulate_pid(*ESCENARIO_PID))
+    lote = np.array(simulate_pid_batch(np.array([ESCENARIO_PID[0], 1.0]), *ESCENARIO_PID[1:]))
+    np.testing.assert_allclose(lote[:, 0], pid, rtol=1e-12, atol=1e-12)
+    sim = SimuladorPID(*ESCENARIO_PID[:4], ESCENARIO_PID[8])
+    np.testing.assert_allclose(sim.bloque(len(nucleo.t), pid[5]), pid, rtol=1e-12, atol=1e-12)
+
+    humedad = np.array(simulate_proportional_humidity(*ESCENARIO_HUMEDAD))
+    lote = np.array(simulate_proportional_humidity_batch(np.array([ESCENARIO_HUMEDAD[0], 3.0]), *ESCENARIO_HUMEDAD[1:]))
+    np.testing.assert_allclose(lote[:, 0], humedad, rtol=1e-12, atol=1e-12)
+
+# El método lti (solución exacta por tramos del lazo discreto) coincide con Euler
+def test_lti_coincide_con_euler(grilla_original):
+    for escenario in (ESCENARIO_PID, ESCENARIO_PID[:7] + (False,) + ESCENARIO_PID[8:], (0, 0, 0) + ESCENARIO_PID[3:]):
+        np.testing.assert_allclose(simulate_pid(*escenario, metodo="lti"), simulate_pid(*escenario), rtol=1e-9, atol=1e-9)
+    sin_ajuste = ESCENARIO_HUMEDAD[:7] + (False,) + ESCENARIO_HUMEDAD[8:]
+    np.testing.assert_allclose(simulate_proportional_humidity(*sin_ajuste, metodo="lti"),
+                               simulate_proportional_humidity(*sin_ajuste), rtol=1e-9, atol=1e-9)
+
+# La cache comparte la entrada entre argumentos con la misma clave y, al pasar de
+# max_bytes, descarta primero la usada hace más tiempo
+def test_cache_lru_por_clave_y_memoria():
+    llamadas = []
+    def simular(x):
+        llamadas.append(x)
+        return (np.full(100, x),)   # 800 bytes
+    cache = CacheLRU(simular, lambda x: (round(float(x), 9),), max_bytes=2000)
+    assert cache(1.0)[0][0] == 1.0 and cache(1.0000000001)[0][0] == 1.0
+    assert llamadas == [1.0] and (cache.aciertos, cache.fallos) == (1, 1)
+    cache(2.0)
+    cache(1.0)
+    cache(3.0)                     # 2400 bytes: sale 2.0, el menos usado
+    assert (1.0,) in cache and (3.0,) in cache and (2.0,) not in cache
+    assert cache.bytes == 1600
+    assert not cache(3.0)[0].flags.writeable
+
+# Las franjas vectorizadas coinciden con un recorrido muestra a muestra, y las métricas
+# de un lote son las de cada corrida por separado
+def test_franjas_y_metricas_de_control():
+    t = np.arange(5000) * 0.1
+    rng = np.random.default_rng(0)
+    y = 22 + 5 * np.sin(t / 7) + rng.normal(0, 0.5, len(t))
+    # Un valor no finito en medio de la banda es una franja de una muestra
+    i_nan = int(np.flatnonzero((y[1:-1] > 21) & (y[:-2] > 21) & (y[2:] > 21) & (y[1:-1] < 23) & (y[:-2] < 23) & (y[2:] < 23))[0]) + 1
+    y[i_nan] = np.nan
+    esperadas, inicio = [], None
+    for i, valor in enumerate(y):
+        fuera = not (18 <= valor <= 26)
+        if fuera and inicio is None:
+            inicio = i
+        elif not fuera and inicio is not None:
+            esperadas.append((t[inicio], t[i]))
+            inicio = None
+    if inicio is not None:
+        esperadas.append((t[inicio], t[-1]))
+    franjas = franjas_fuera_de_banda(t, y, 18, 26)
+    assert franjas == esperadas
+    assert (t[i_nan], t[i_nan + 1]) in franjas
+
+    Y = np.stack([y, 22 + 3 * np.exp(-t / 20), np.full(len(t), 25.0)])
+    ref = np.array([22.0, 22.0, 20.0])
+    lote = metricas_control(t, Y, ref, ref - 4, ref + 4)
+    for k in range(len(Y)):
+        una = metricas_control(t, Y[k], ref[k], ref[k] - 4, ref[k] + 4)
+        for nombre, valores in lote.items():
+            np.testing.assert_allclose(valores[k], una[nombre], rtol=1e-12, err_msg=nombre)
+    assert lote["tiempo_fuera"][1] == 0 and lote["tiempo_fuera"][2] == pytest.approx(t[-1])
+    assert lote["tiempo_fuera"][0] == pytest.approx(sum(b - a for a, b in esperadas))
+
+# Sin acoplamiento cada zona es un simulate_pid independiente; con zonas idénticas el
+# acoplamiento no transfiere calor y tampoco cambia nada
+def test_multizona_sin_diferencias_entre_zonas_es_el_lazo_simple(grilla_original):
+    Kp = np.array([1.0, 2.0, 4.0])
+    _, senales = simulate_pid_multizona(Kp, *ESCENARIO_PID[1:], senales=("T", "output"))
+    for k in range(len(Kp)):
+        T, _, _, _, output, _, _ = simulate_pid(Kp[k], *ESCENARIO_PID[1:])
+        np.testing.assert_allclose(senales["T"][k], T, rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(senales["output"][k], output, rtol=1e-9, atol=1e-9)
+
+    _, acoplado = simulate_pid_multizona(*ESCENARIO_PID, acople=acoplamiento_grilla(2, 3, 0.5), n_zonas=6)
+    np.testing.assert_allclose(acoplado["T"], np.tile(simulate_pid(*ESCENARIO_PID)[0], (6, 1)), rtol=1e-9, atol=1e-9)
+    _, humedad = simulate_proportional_humidity_multizona(*ESCENARIO_HUMEDAD, acople=acoplamiento_grilla(2, 2, 0.5), n_zonas=4)
+    np.testing.assert_allclose(humedad["HR"], np.tile(simulate_proportional_humidity(*ESCENARIO_HUMEDAD)[0], (4, 1)),
+                               rtol=1e-9, atol=1e-9)
+
+# Una zona más caliente le pasa calor a su vecina: sin control, la vecina se calienta
+def test_multizona_acoplamiento_transfiere_calor(grilla_original):
+    _, aislado = simulate_pid_multizona(0, 0, 0, 20.0, 0, 0, 20.0, False, np.array([30.0, 20.0]), T_amb=20.0)
+    _, acoplado = simulate_pid_multizona(0, 0, 0, 20.0, 0, 0, 20.0, False, np.array([30.0, 20.0]), T_amb=20.0,
+                                         acople=([0], [1], 1.0))
+    np.testing.assert_allclose(aislado["T"][1], 20.0)
+    assert (acoplado["T"][1, 1:] > 20.0).all()
+    assert (acoplado["T"][0, 1:] < aislado["T"][0, 1:]).all()
+
+# Con la temperatura constante la humedad cosimulada es la de simulate_proportional_humidity,
+# y la temperatura es siempre la de simulate_pid
+def test_cosimulacion_coincide_con_los_lazos_separados(grilla_original):
+    r = cosimular(0, 0, 0, 20.0, 0, 0, 20.0, False, 20.0, *ESCENARIO_HUMEDAD)
+    np.testing.assert_allclose(r["temperatura"]["T"], 20.0)
+    HR, P_term, output, HR_amb, e, Kp_ajustado = simulate_proportional_humidity(*ESCENARIO_HUMEDAD)
+    for nombre, esperado in (("HR", HR), ("output", output), ("e", e), ("Kp_ajustado", Kp_ajustado)):
+        np.testing.assert_allclose(r["humedad"][nombre], esperado, rtol=1e-9, atol=1e-9, err_msg=nombre)
+
+    r = cosimular(*ESCENARIO_PID, *ESCENARIO_HUMEDAD)
+    np.testing.assert_allclose(r["temperatura"]["T"], simulate_pid(*ESCENARIO_PID)[0], rtol=1e-12, atol=1e-12)
+
+# Sin control de humedad, calentar la sala baja la HR aunque no cambie el agua del aire;
+# una corrida que diverge termina con valores no finitos en lugar de fallar
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_cosimulacion_fisica_y_divergencia(grilla_original):
+    r = cosimular(2.0, 0.5, 0.0, 26.0, 0, 0, 20.0, False, 20.0, 0, 50.0, 50.0, 0, 0, 50.0, False, False, 5)
+    assert r["temperatura"]["T"][-1] > 25 and r["humedad"]["HR"][-1] < 50 - 5
+    r = cosimular(200, 0, 0, 22.0, 30, 50, 15.0, True, 20.0, *ESCENARIO_HUMEDAD)
+    assert np.abs(r["temperatura"]["T"]).max() > 1e3 and not np.isfinite(r["humedad"]["HR"]).all()
+
+# En etapas anidadas, el tiempo propio de la externa no incluye el de las internas; una
+# etapa dentro de otra del mismo nombre no se cuenta aparte
+def test_perfilador_tiempo_propio_de_etapas_anidadas():
+    perfilador = Perfilador()
+    with perfilador.etapa("externa"):
+        pass
+    assert perfilador.etapas == {}
+    perfilador.activar()
+    with perfilador.etapa("externa"):
+        time.sleep(0.02)
+        with perfilador.etapa("interna"):
+            time.sleep(0.05)
+            with perfilador.etapa("interna"):
+                time.sleep(0.01)
+    resumen = perfilador.resumen()
+    externa, interna = resumen["externa"], resumen["interna"]
+    assert interna["llamadas"] == 1 and interna["propio_s"] >= 0.06
+    assert externa["total_s"] >= externa["propio_s"] + interna["total_s"] - 1e-9
+    assert 0.02 <= externa["propio_s"] < interna["total_s"]
+
+# Bytes de _codificar -> (escenarios, señales, muestras), deshaciendo la agrupación por
+# planos de bytes y, con "delta", las diferencias entre muestras
+def _decodificar(datos, forma, codificacion, resolucion):
+    escenarios, nombres, muestras = forma
+    planos = np.frombuffer(datos, dtype=np.uint8).reshape(escenarios, 4, nombres * muestras).transpose(0, 2, 1)
+    valores = np.ascontiguousarray(planos).view("<f4" if codificacion == "float32" else "<i4").reshape(forma)
+    return valores.astype(float) if codificacion == "float32" else np.cumsum(valores, axis=2) * resolucion
+
+# Con "delta" cada señal vuelve dentro de resolucion/2 (sin acumular error a lo largo del
+# tiempo) y los lazos divergentes quedan saturados; con "float32" vuelve en float32
+def test_exportar_html_codificacion_ida_y_vuelta():
+    rng = np.random.default_rng(0)
+    t = np.linspace(0, 100, 1000)
+    senales = {"T": 22 + rng.normal(0, 3, (5, len(t))).cumsum(axis=1) * 0.1, "e": rng.normal(0, 1, (5, len(t)))}
+    senales["T"][4, 500:] = np.inf
+    indices = np.arange(0, len(t), 3)
+    Y = np.stack([senales[nombre][:, indices] for nombre in ("T", "e")], axis=1)
+    for resolucion in (1e-3, 0.05):
+        decodificado = _decodificar(_codificar(senales, ("T", "e"), indices, "delta", resolucion), Y.shape, "delta", resolucion)
+        finitos = np.isfinite(Y)
+        assert np.abs(decodificado - Y)[finitos].max() <= resolucion / 2 * (1 + 1e-9)
+        assert (decodificado[~finitos] == (2**30 - 1) * resolucion).all()
+    decodificado = _decodificar(_codificar(senales, ("T", "e"), indices, "float32", None), Y.shape, "float32", None)
+    np.testing.assert_array_equal(decodificado, Y.astype(np.float32))
+
+# El percentil del histograma (borde superior de la caja) nunca queda por debajo del
+# percentil exacto de las muestras y lo excede como mucho en el ancho de una caja
+@pytest.mark.parametrize("semilla", range(5))
+def test_histograma_percentil_no_subestima(semilla):
+    rng = np.random.default_rng(semilla)
+    bordes = Histograma().minimo * 10 ** (np.arange(0, 140, 7) / Histograma().por_decada)
+    muestras = np.concatenate([rng.lognormal(np.log(1e-3), 1.5, 5000), bordes, [1e-9, 20.0]])
+    histograma = Histograma()
+    for valor in muestras:
+        histograma.registrar(float(valor))
+    for p in (1, 50, 90, 99, 99.9, 100):
+        exacto = np.percentile(muestras, p, method="inverted_cdf")
+        estimado = histograma.percentil(p)
+        assert exacto <= estimado
+        assert exacto < histograma.minimo or estimado <= exacto * 10 ** (1 / histograma.por_decada) * (1 + 1e-12) or estimado == histograma.max
+
+# En los puntos que el mapa simuló, sus métricas son las de simular ese punto directamente
+# (con las reglas de la interfaz); los descartados por inestables quedan en inf
+@pytest.mark.parametrize("simulador, ejes, fijos", [
+    ("pid", {"Kp": np.arange(0, 60.1, 2.0), "Kd": np.arange(0, 20.1, 1.0)}, {"fl_perturbacion": True}),
+    ("humedad", None, {"fl_perturbacion": True, "fl_ajustar_controlador": True}),
+])
+def test_mapa_sensibilidad_coincide_con_la_fuerza_bruta(grilla_original, simulador, ejes, fijos):
+    resultado = mapa_sensibilidad(simulador, ejes=ejes, fijos=fijos, paso_inicial=4, metricas=("tiempo_fuera", "sobrepico", "iae"))
+    assert 0 < resultado["simulaciones"] < resultado["total"]
+    nombre_x, nombre_y = resultado["ejes"]
+    ii, jj = np.nonzero(resultado["evaluado"])
+    puntos = {nombre: np.full(len(ii), valor) for nombre, valor in resultado["fijos"].items()}
+    puntos[nombre_x], puntos[nombre_y] = resultado["x"][ii], resultado["y"][jj]
+    with np.errstate(over="ignore", invalid="ignore"):
+        senales = interfaces[simulador]["simular"](puntos)
+    y = senales["T" if simulador == "pid" else "HR"]
+    ref, rango = puntos[interfaces[simulador]["referencia"]], puntos["rango_error"]
+    esperadas = metricas_control(nucleo.t, y, ref, ref - rango, ref + rango, e=senales["e"], output=senales["output"])
+    inestable = resultado["inestable"][ii, jj]
+    for nombre, valores in resultado["metricas"].items():
+        np.testing.assert_allclose(valores[ii, jj][~inestable], esperadas[nombre][~inestable], rtol=1e-12, err_msg=nombre)
+        assert np.isinf(valores[ii, jj][inestable]).all()
+    if simulador == "pid":
+        assert inestable.any() and not np.isfinite(y[inestable]).all()